@@ -0,0 +1,37 @@
+import os
+import sys
+import pytest
+
+'''
+The modules of a figure directory import each other by name, as when a script is run from that directory, and several figure
+directories ship modules of the same name. Before a test module is imported and before every test, its figure directory (the
+parent of its tests directory) is put first on sys.path and the modules loaded from the other figure directories are swapped
+out of sys.modules. They are kept aside and swapped back in later, so a module object, e.g. the class PauliSum, stays the same
+for all tests of one directory.
+'''
+
+_stashedModules={}
+
+def _figureDirectory(path):
+    return os.path.dirname(os.path.dirname(os.path.abspath(str(path))))
+
+def _activate(directory):
+    for other in _stashedModules:
+        if other in sys.path:
+            sys.path.remove(other)
+    _stashedModules.setdefault(directory,{})
+    sys.path.insert(0,directory)
+    for name,module in list(sys.modules.items()):
+        path=getattr(module,'__file__',None)
+        moduleDirectory=os.path.dirname(os.path.abspath(path)) if path is not None else None
+        if moduleDirectory in _stashedModules and moduleDirectory!=directory:
+            _stashedModules[moduleDirectory][name]=sys.modules.pop(name)
+    sys.modules.update(_stashedModules[directory])
+    _stashedModules[directory].clear()
+
+def pytest_collectstart(collector):
+    if isinstance(collector,pytest.Module):
+        _activate(_figureDirectory(collector.path))
+
+def pytest_runtest_setup(item):
+    _activate(_figureDirectory(item.path))
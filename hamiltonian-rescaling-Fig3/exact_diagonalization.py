@@ -1,4 +1,10 @@
 import numpy as np
+import hashlib
+import os
+from scipy import sparse as sp
+from scipy.sparse import linalg as spla
+from scipy import special
+from pauli_sum import PauliSum,popcount,parity,pauliStringToMasks
 
 '''
 Exact Diagonalization
@@ -6,163 +12,264 @@ Exact Diagonalization
 Note: We rewrite the ED code to match the Pauli string.
 '''
 
-def inttobin(number,n):
+def hamiltonianMatrix(hamiltonian,n,sparse=False):
     '''
-    Return length n binary string.
-    '''
-    form='0'+str(n)+'b'
-    return format(number,form)
+    Return the matrix of the Hamiltonian in the computational basis, built from the Pauli bitmasks.
 
-def xLocal(i,j,k,n):
-    '''
-    Return <i_k|X|j_k> where X is local Pauli X matrix.
-    ---------
+    A Pauli string P=i^{|x&z|} X^x Z^z maps |j> to i^{|x&z|}(-1)^{|z&j|}|j^x>, so every term fills
+    one permuted diagonal of the matrix with +-1 or +-i phases.
+
+    Parameters
+    ----------
+    hamiltonian: `dict` or `PauliSum` which store the Hamiltonian.
     n: number of qubits.
-    k: Define i=2**(n-1)*i_0+2**(n-2)*i_1+2**(n-3)*i_2+..., the kth qubit is i_k.
+    sparse: return a scipy.sparse CSR matrix instead of a dense numpy array.
+
+    Return
+    ----------
+    The (2**n,2**n) complex Hamiltonian matrix.
     '''
-    return int(inttobin(i^j,n)[k])
+    if not isinstance(hamiltonian,PauliSum):
+        hamiltonian=PauliSum.fromDict(hamiltonian,n)
+    columns=np.arange(2**n,dtype=np.uint64)
+    yPhases=np.array([1,1.j,-1,-1.j])[popcount(hamiltonian.xMasks&hamiltonian.zMasks)%4]
 
-def iLocal(i,j,k,n):
+    # Terms with the same X mask share the nonzero pattern (j^x,j); accumulate them in term order.
+    diagonals={}
+    for x,z,c,yPhase in zip(hamiltonian.xMasks,hamiltonian.zMasks,hamiltonian.coefficients,yPhases):
+        if x not in diagonals:
+            diagonals[x]=np.zeros(2**n,dtype=complex)
+        diagonals[x]+=c*(yPhase*(1-2*parity(columns&z)))
+
+    if sparse:
+        if len(diagonals)==0:
+            return sp.csr_matrix((2**n,2**n),dtype=complex)
+        rows=np.concatenate([columns^x for x in diagonals.keys()]).astype(np.int64)
+        allColumns=np.tile(columns.astype(np.int64),len(diagonals))
+        return sp.csr_matrix((np.concatenate(list(diagonals.values())),(rows,allColumns)),shape=(2**n,2**n))
+
+    hamMatrix=np.zeros((2**n,2**n),dtype=complex)
+    for x,data in diagonals.items():
+        hamMatrix[columns^x,columns]=data
+
+    return hamMatrix
+
+def shiftedFactorization(hamMatrix,sigma,attempts=4):
     '''
-    Return <i_k|I|j_k> where I is local identity matrix.
+    Return the factorization of H - sigma I and the number of eigenvalues of H below sigma.
+
+    splu without row pivoting (symmetric mode) gives P (H - sigma I) P^T = L U with a unit lower triangular L, so for a
+    Hermitian H the pivots diag(U) are the D of an L D L^dagger decomposition and, by Sylvester's law of inertia, the number
+    of negative pivots is the number of eigenvalues below sigma. If SuperLU still has to pivot (a zero pivot), sigma is moved
+    slightly.
+
+    Parameters
+    ----------
+    hamMatrix: sparse Hermitian matrix.
+    sigma: real shift.
+
+    Return
+    ----------
+    factorization: scipy.sparse.linalg.SuperLU of H - sigma I, e.g. for the shift-invert operator of eigsh.
+    count: # of eigenvalues below sigma.
     '''
-    ik=inttobin(i,n)[k]
-    jk=inttobin(j,n)[k]
-    if ik==jk:
-        return 1
-    else:
-        return 0
+    d=hamMatrix.shape[0]
+    scale=max(1,np.abs(hamMatrix).max())
+    for attempt in range(attempts):
+        try:
+            factorization=spla.splu((hamMatrix-sigma*sp.identity(d,dtype=complex,format='csc')).tocsc(),permc_spec='MMD_AT_PLUS_A',diag_pivot_thresh=0,options={'SymmetricMode':True})
+        except RuntimeError:
+            factorization=None
+        if factorization is not None and np.array_equal(factorization.perm_r,factorization.perm_c):
+            return factorization,int(np.sum(factorization.U.diagonal().real<0))
+        sigma=sigma+1e-9*scale*(attempt+1)
+    raise RuntimeError("H - sigma I could not be factorized without pivoting near sigma="+str(sigma)+".")
 
-def zLocal(i,j,k,n):
+def spectrumMoments(hamiltonian,n):
     '''
-    Return <i_k|Z|j_k> where Z is local Pauli Z matrix.
+    Return the mean Tr(H)/d and the width sqrt(Tr(H^2)/d - mean^2) of the spectrum from the Pauli coefficients.
     '''
-    ik=inttobin(i,n)[k]
-    jk=inttobin(j,n)[k]
-    if ik==jk:
-        if ik=='0':
-            return 1
-        else:
-            return -1
-    else:
-        return 0
-    
-def yLocal(i,j,k,n):
-    '''
-    Return <i_k|Y|j_k> where Y is local Pauli Y matrix.
-    '''
-    ik=inttobin(i,n)[k]
-    jk=inttobin(j,n)[k]
-    if ik==jk:
-        return 0
-    else:
-        if ik=='0':
-            return -1.j
-        else:
-            return 1.j
+    if not isinstance(hamiltonian,PauliSum):
+        hamiltonian=PauliSum.fromDict(hamiltonian,n)
+    hamiltonian=hamiltonian.simplify()
+    identity=(hamiltonian.xMasks==0)&(hamiltonian.zMasks==0)
+    return np.real(np.sum(hamiltonian.coefficients[identity])),np.sqrt(np.sum(np.abs(hamiltonian.coefficients[~identity])**2))
 
-def pauliMatrixElement(pauliString,i,j,k,n):
+def levelEigenpairs(hamMatrix,levels,mean,width,window=8,tol=0,maxIterations=60):
     '''
-    Return <i_k|P_k|j_k>.
+    Return {level: eigenvalue} and {level: eigenvector} for the given full-spectrum level indices by shift-invert Lanczos.
+
+    For every level the shift sigma starts at the Gaussian estimate of the density of states, mean+width*Phi^-1((level+1/2)/d),
+    and is refined by an interpolation search on the eigenvalue count of shiftedFactorization, bracketed by all counts seen so
+    far. Once the level is among the window eigenvalues nearest to sigma, these are computed with eigsh on the same
+    factorization. The nearest eigenvalues are contiguous in the spectrum, so the count below sigma gives their full-spectrum
+    indices.
     '''
-    if pauliString[k]=='I':
-        return iLocal(i,j,k,n)
-    elif pauliString[k]=='X':
-        return xLocal(i,j,k,n)
-    elif pauliString[k]=='Y':
-        return yLocal(i,j,k,n)
-    elif pauliString[k]=='Z':
-        return zLocal(i,j,k,n)
-    else:
-        print('ED local Pauli matrix element error.')
-        quit(1)
+    d=hamMatrix.shape[0]
+    bound=np.abs(hamMatrix).sum(axis=0).max()+1
+    samples={-bound:0,bound:d}
+    eigenvalues={}
+    eigenvectors={}
+    for level in sorted(set(int(level) for level in levels)):
+        if level in eigenvalues:
+            continue
+        if not 0<=level<d:
+            raise ValueError("Level "+str(level)+" is outside the spectrum of "+str(d)+" levels.")
+        sigma=min(max(mean+width*special.ndtri((level+0.5)/d),-bound),bound)
+        for iteration in range(maxIterations):
+            lo=max(s for s,count in samples.items() if count<=level)
+            hi=min(s for s,count in samples.items() if count>level)
+            if not lo<sigma<hi:
+                # interpolation of the count between the bracket, kept away from its ends
+                fraction=(level+0.5-samples[lo])/(samples[hi]-samples[lo])
+                sigma=lo+min(max(fraction,0.1),0.9)*(hi-lo)
+            factorization,count=shiftedFactorization(hamMatrix,sigma)
+            samples[sigma]=count
+            k=max(window,samples[hi]-samples[lo]+2 if hi-lo<=1e-10*bound else 0)
+            if np.abs(level+0.5-count)<=k/2 or k>=d-1:
+                if k>=d-1:
+                    values,vectors=np.linalg.eigh(hamMatrix.toarray())
+                else:
+                    OPinv=spla.LinearOperator((d,d),matvec=factorization.solve,dtype=complex)
+                    values,vectors=spla.eigsh(hamMatrix,k=k,sigma=sigma,which='LM',OPinv=OPinv,tol=tol)
+                order=np.argsort(values)
+                values=values[order]
+                vectors=vectors[:,order]
+                first=count-int(np.sum(values<sigma)) if k<d-1 else 0
+                for j in range(len(values)):
+                    eigenvalues.setdefault(first+j,values[j])
+                    eigenvectors.setdefault(first+j,vectors[:,j])
+                if level in eigenvalues:
+                    break
+            sigma=np.nan
+        else:
+            raise RuntimeError("Level "+str(level)+" was not resolved in "+str(maxIterations)+" shift-invert steps.")
+    return {level:eigenvalues[level] for level in levels},{level:eigenvectors[level] for level in levels}
 
-def matrixElement(hamiltonian:dict,i,j,n):
+def sparseEigenSolver(hamiltonian,n,levels=None,energyWindow=None,k=6,tol=0,window=8,denseDimension=256):
     '''
-    Return the matrix element <i|H|j>.
-    
+    Return selected eigenvalues and eigenstates of given hamiltonian by shift-invert Lanczos (eigsh) instead of full
+    diagonalization, under their full-spectrum level indices.
+
     Parameters
     ----------
-    hamiltonian: `dict` which store the Hamiltonian.
-    i: `int`
-    j: `int`
+    hamiltonian: `dict` or `PauliSum` which store the Hamiltonian.
     n: number of qubits.
-    
+    levels: indices of the levels we need, e.g. (a,b), counted from the ground state as in eigenSolver. Every level is
+        computed around its own shift, see levelEigenpairs, so the cost does not grow with the index.
+    energyWindow: (E_min,E_max). Return all eigenpairs inside the window, computed by shift-invert around its centre.
+    k: largest # of eigenpairs in the window; a window with more levels raises ValueError.
+    tol: eigsh tolerance, 0 means machine precision.
+    window: # of eigenpairs computed around every shift in levels mode.
+    denseDimension: largest 2**n which is diagonalized densely by eigenSolver instead.
+
     Return
     ----------
-    The matrix element of the Hamiltonian.
+    eigenvalues, eigenvectors: `dict` from the full-spectrum level index to the eigenvalue and to the eigenvector, so that
+        eigenvalues[a] and eigenvectors[a] have the same meaning as the output of eigenSolver. With energyWindow the keys are
+        the levels inside the window, the number of eigenvalues below E_min plus their rank in the window.
     '''
-    element=0
+    if (levels is None)==(energyWindow is None):
+        raise ValueError("Exactly one of levels and energyWindow must be given.")
 
-    for pauliString in hamiltonian.keys():
-        tempElement=1
+    d=2**n
+    if d<=denseDimension:
+        allEigenvalues,allEigenvectors=eigenSolver(hamiltonian,n)
+        if levels is None:
+            levels=np.flatnonzero((allEigenvalues>=energyWindow[0])&(allEigenvalues<=energyWindow[1]))
+            if len(levels)>k:
+                raise ValueError("The energy window holds "+str(len(levels))+" levels, more than k="+str(k)+".")
+        return {int(level):allEigenvalues[level] for level in levels},{int(level):allEigenvectors[level] for level in levels}
 
-        for k in range(n):
-            tempElement*=pauliMatrixElement(pauliString,i,j,k,n)
-        
-        element+=hamiltonian[pauliString]*tempElement
+    hamMatrix=hamiltonianMatrix(hamiltonian,n,sparse=True)
+    if levels is not None:
+        mean,width=spectrumMoments(hamiltonian,n)
+        return levelEigenpairs(hamMatrix,levels,mean,width,window=window,tol=tol)
 
-    return element
+    # the levels inside the window are exactly the m eigenvalues nearest to its centre
+    first=shiftedFactorization(hamMatrix,energyWindow[0])[1]
+    m=shiftedFactorization(hamMatrix,energyWindow[1])[1]-first
+    if m>k:
+        raise ValueError("The energy window holds "+str(m)+" levels, more than k="+str(k)+".")
+    if m==0:
+        return {},{}
+    sigma=(energyWindow[0]+energyWindow[1])/2
+    factorization=shiftedFactorization(hamMatrix,sigma)[0]
+    OPinv=spla.LinearOperator((d,d),matvec=factorization.solve,dtype=complex)
+    eigenvalues,eigenvectors=spla.eigsh(hamMatrix,k=m,sigma=sigma,which='LM',OPinv=OPinv,tol=tol)
+    order=np.argsort(eigenvalues)
+    return {first+j:eigenvalues[i] for j,i in enumerate(order)},{first+j:eigenvectors[:,i] for j,i in enumerate(order)}
 
-def eigenSolver(hamiltonian:dict,n):
+def eigenSolver(hamiltonian:dict,n,levels=None,energyWindow=None):
     '''
     Return the eigenvalues and eigenstates of given hamiltonian.
+    If levels or energyWindow is given, only the requested eigenpairs are computed by sparseEigenSolver and returned as dicts
+    keyed by the level index of the full spectrum, so eigenvalues[a] and eigenstates[a] mean the same with and without them.
     '''
-    hamMatrix=np.zeros((2**n,2**n),dtype=complex)
+    if levels is not None or energyWindow is not None:
+        return sparseEigenSolver(hamiltonian,n,levels=levels,energyWindow=energyWindow)
 
-    for i in range(2**n):
-        for j in range(2**n):
-            hamMatrix[i][j]=matrixElement(hamiltonian,i,j,n)
+    hamMatrix=hamiltonianMatrix(hamiltonian,n)
 
     eigenvalues, eigenvectors = np.linalg.eigh(hamMatrix)
     eigenvectors=np.transpose(eigenvectors)
     return eigenvalues,eigenvectors
 
-def localTransform(bit,pauli):
-    if pauli=='I':
-        return bit,1
-    elif pauli=='X':
-        return bin(1^int(bit,2))[2],1
-    elif pauli=='Y':
-        return bin(1^int(bit,2))[2],(-1)**int(bit,2)*1.j
-    elif pauli=='Z':
-        return bit,(-1)**int(bit,2)
-    else:
-        print("Local pauli transform error.")
-        quit(1)
-
-def basisTransform(phi_i:int,pauliString):
-    '''
-    Return the basis and coefficient after Pauli transform.
-    
-    Parameters
-    ----------
-    phi_i: `int` which stand for the basis before Pauli transform.
-    pauliString: the Pauli transform.
-    
-    Return
-    ----------
-    phi_f: `int` which stand for the basis after transform.
-    c: coefficient after transform.
-    
-    Example
-    ----------
-    >>> basisTransform(3,'XZ')
-    3 -> '11'
-    '11' -> 'XZ' -> -1*'01'
-    return (1,-1)
-    '''
-    c=1
-    phi_f_str=""
-    n=len(pauliString)
-    basisString=inttobin(phi_i,n)
-
-    for k in range(n):
-        phi_k_str,c_k=localTransform(basisString[k],pauliString[k])
-        phi_f_str+=phi_k_str
-        c*=c_k
-    
-    return int(phi_f_str,2),c
+def hamiltonianHash(hamiltonian:dict,n)->str:
+    '''
+    Return a canonical SHA-256 hash of a Pauli-dict Hamiltonian and n.
+    The terms are sorted and the coefficients are written with float.hex, so the hash does not depend on the order of the
+    dictionary and any change of a coefficient gives a different hash.
+    '''
+    canonical=str(n)
+    for pauliString in sorted(hamiltonian.keys()):
+        c=complex(hamiltonian[pauliString])
+        canonical+=';'+pauliString+':'+c.real.hex()+','+c.imag.hex()
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def cachedEigenSolver(hamiltonian:dict,n,cacheDir='ed_cache',levels=None,energyWindow=None):
+    '''
+    Return the output of eigenSolver, stored on disk and reused in later runs.
+
+    The eigenvalues and eigenvectors are saved as .npy files named by hamiltonianHash (and the levels/energyWindow request)
+    in cacheDir. Cached arrays are opened with mmap_mode='r', so loading is nearly free and the eigenvectors are only read
+    from disk when they are used. With levels or energyWindow the level indices are saved as well and the dicts of
+    sparseEigenSolver are rebuilt from the three files.
+    '''
+    key=hamiltonianHash(hamiltonian,n)
+    if levels is not None:
+        key+='_levels'+'-'.join(str(level) for level in sorted(levels))
+    if energyWindow is not None:
+        key+='_window'+float(energyWindow[0]).hex()+'-'+float(energyWindow[1]).hex()
+    eigenvaluesPath=os.path.join(cacheDir,key+'_eigenvalues.npy')
+    eigenvectorsPath=os.path.join(cacheDir,key+'_eigenvectors.npy')
+    indicesPath=os.path.join(cacheDir,key+'_indices.npy')
+    selected=levels is not None or energyWindow is not None
+    paths=(eigenvectorsPath,eigenvaluesPath)+((indicesPath,) if selected else ())
+
+    if not all(os.path.exists(path) for path in paths):
+        eigenvalues,eigenvectors=eigenSolver(hamiltonian,n,levels=levels,energyWindow=energyWindow)
+        if selected:
+            indices=sorted(eigenvalues.keys())
+            arrays=(np.array([eigenvectors[i] for i in indices]).reshape(len(indices),2**n),np.array([eigenvalues[i] for i in indices]),np.array(indices,dtype=int))
+        else:
+            arrays=(eigenvectors,eigenvalues)
+
+        # Write to temporary files first so that an interrupted run never leaves a truncated cache entry.
+        # The indices are written last, so a complete entry always has all three files.
+        os.makedirs(cacheDir,exist_ok=True)
+        for path,array in zip(paths,arrays):
+            temporaryPath=path+'.'+str(os.getpid())+'.tmp'
+            with open(temporaryPath,'wb') as file:
+                np.save(file,np.ascontiguousarray(array))
+            os.replace(temporaryPath,path)
+
+    eigenvalues=np.load(eigenvaluesPath,mmap_mode='r')
+    eigenvectors=np.load(eigenvectorsPath,mmap_mode='r')
+    if not selected:
+        return eigenvalues,eigenvectors
+    indices=np.load(indicesPath)
+    return {int(level):eigenvalues[j] for j,level in enumerate(indices)},{int(level):eigenvectors[j] for j,level in enumerate(indices)}
 
 def stateTransform(state,pauliString):
     '''
@@ -177,14 +284,54 @@ def stateTransform(state,pauliString):
     -----------
     finalState: numpy array which stand for the state after transformation
     '''
-    n=len(pauliString)
-    finalState=np.zeros((2**n),dtype=complex)
+    return stateTransformBatch(state,[pauliString])[0]
+
+def pauliPermutationPhases(pauliStrings,n):
+    '''
+    Return the action of many Pauli strings on the computational basis, P|j> = phases[j]|j^x>.
+
+    Parameters
+    ----------
+    pauliStrings: list of K Pauli strings.
+    n: number of qubits.
+
+    Return
+    ----------
+    xMasks: (K,) array of the X masks.
+    phases: (K,2**n) array i^{|x&z|}(-1)^{|z&j|}.
+    '''
+    masks=np.array([pauliStringToMasks(pauliString) for pauliString in pauliStrings],dtype=np.uint64).reshape(-1,2)
+    xMasks=masks[:,0]
+    zMasks=masks[:,1]
+    columns=np.arange(2**n,dtype=np.uint64)
+    yPhases=np.array([1,1.j,-1,-1.j])[popcount(xMasks&zMasks)%4]
+    phases=yPhases[:,None]*(1-2*parity(columns[None,:]&zMasks[:,None]))
+    return xMasks,phases
 
-    for i in range(2**n):
-        phi_f,c_f=basisTransform(i,pauliString)
-        finalState[phi_f]=c_f*state[i]
-    
-    return finalState
+def stateTransformBatch(states,pauliStrings):
+    '''
+    Transform one or many states with many Pauli strings at once.
+
+    Parameters
+    -----------
+    states: numpy array of shape (2**n,) or (M,2**n).
+    pauliStrings: list of K Pauli strings.
+
+    Return
+    -----------
+    numpy array of shape (K,2**n) (or (K,M,2**n)) with the states after transformation, i.e. P_k|state>.
+    Since P|j>=phases[j]|j^x>, the kth output is the phase-multiplied state permuted by XOR with the X mask.
+    '''
+    states=np.asarray(states)
+    n=len(pauliStrings[0])
+    xMasks,phases=pauliPermutationPhases(pauliStrings,n)
+    columns=np.arange(2**n,dtype=np.uint64)
+    # finalState[k]=phases[k^x]*state[k^x]
+    sourceIndices=(columns[None,:]^xMasks[:,None]).astype(np.int64)
+    phased=np.take_along_axis(phases,sourceIndices,axis=1)
+    if states.ndim==1:
+        return phased*states[sourceIndices]
+    return phased[:,None,:]*states[:,sourceIndices].transpose(1,0,2)
 
 
 if __name__=="__main__":
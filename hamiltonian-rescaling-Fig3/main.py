@@ -1,7 +1,8 @@
 import numpy as np
-from models import ringModel,localSumCollapseList,errHamLocalSumZ
-from utils import rescalingMitigation
-from exact_diagonalization import eigenSolver
+from models import ringModel,errHamLocalSumZ
+from noise_model import noiseModel
+from utils import rescalingMitigation,SignalCache
+from exact_diagonalization import cachedEigenSolver
 from qutip.solver import Options
 import time
 
@@ -64,9 +65,14 @@ L=2000
 deltaT0=0.0001
 beta=0.01
 
+# 'mesolve' simulates every signal; 'perturbative' takes the gaps from weak-noise perturbation theory and only simulates the
+# signal (with solverOptions['solver']) where the error estimate is above solverOptions['threshold'], see utils.rescaledEigenData.
+solver='mesolve'
+solverOptions={'threshold':1e-3,'solver':'propagator'} if solver=='perturbative' else None
+
 hamiltonian=ringModel(4,1,4,n)
 # print(hamiltonian)
-eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+eigenvalues,eigenstates=cachedEigenSolver(hamiltonian,n)
 # print(eigenvalues)
 
 it=1
@@ -82,9 +88,12 @@ for randomtNums in randomtStatesList[0:100]:
     first_order=[]
     second_order=[]
 
+    # Rescaled runs at c*gamma reuse the unrescaled runs at the same effective noise, see SignalCache.
+    signalCache=SignalCache()
+
     for gamma in gammaList:
         start_time = time.time()
-        energyGapsMitigation=rescalingMitigation(kappa=gamma*np.abs(deltaE),ham_err_strength=gamma*beta*np.abs(deltaE),n=n,hamiltonian=hamiltonian,phiA=eigenstates[a],phiB=eigenstates[b],collapseOperatorsFunc=lambda kappa: [oper*np.sqrt(kappa) for oper in localSumCollapseList(n,np.pi/2)],hamSysErrorFunc=errHamLocalSumZ,options=options,deltaT=deltaT0,L=L,c_1=2,c_2=1.5,N_poles=100)
+        energyGapsMitigation=rescalingMitigation(kappa=gamma*np.abs(deltaE),ham_err_strength=gamma*beta*np.abs(deltaE),n=n,hamiltonian=hamiltonian,phiA=eigenstates[a],phiB=eigenstates[b],collapseOperatorsFunc=lambda kappa: noiseModel(n,'localSum',np.pi/2).collapseOperators(kappa),hamSysErrorFunc=errHamLocalSumZ,options=options,deltaT=deltaT0,L=L,c_1=2,c_2=1.5,N_poles=100,signalCache=signalCache,solver=solver,solverOptions=solverOptions)
 
         print(f"Noisy rate gamma={gamma}","result:",energyGapsMitigation[0])
         noisy.append(energyGapsMitigation[0][0])
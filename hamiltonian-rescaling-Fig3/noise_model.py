@@ -0,0 +1,208 @@
+import numpy as np
+from functools import lru_cache
+from scipy import sparse as sp
+from qutip import Qobj
+from pauli_sum import PauliSum
+from exact_diagonalization import hamiltonianMatrix
+
+'''
+Noise models with one local collapse operator per qubit, C_i = I x ... x C_local x ... x I.
+
+Superoperators use the column-stacking convention of qutip, vec(A rho B) = (B^T kron A) vec(rho), so they can be wrapped as
+qutip super operators and passed to mesolve as a Liouvillian.
+'''
+
+def localOperatorOnSite(localOperator,i,n):
+    '''
+    Return the sparse matrix of a 2x2 operator acting on qubit i of n qubits.
+    '''
+    return sp.kron(sp.kron(sp.identity(2**i,format='csr'),sp.csr_matrix(localOperator)),sp.identity(2**(n-1-i),format='csr'),format='csr').astype(complex)
+
+def hamiltonianSuperoperator(hamiltonian,n):
+    '''
+    Return the sparse superoperator -i[H, . ] of a Hamiltonian given as a `dict`, `PauliSum` or (sparse) matrix.
+    '''
+    if isinstance(hamiltonian,(dict,PauliSum)):
+        hamiltonian=hamiltonianMatrix(hamiltonian,n,sparse=True)
+    hamiltonian=sp.csr_matrix(hamiltonian)
+    identity=sp.identity(2**n,dtype=complex,format='csr')
+    return (-1.j*(sp.kron(identity,hamiltonian)-sp.kron(hamiltonian.T,identity))).tocsr()
+
+def dissipatorSuperoperator(collapseMatrices,n):
+    '''
+    Return the sparse superoperator sum_k D[C_k], D[C]rho = C rho C^dagger - 1/2 {C^dagger C, rho}.
+    '''
+    identity=sp.identity(2**n,dtype=complex,format='csr')
+    dissipator=sp.csr_matrix((4**n,4**n),dtype=complex)
+    for C in collapseMatrices:
+        CdagC=(C.conj().T@C).tocsr()
+        dissipator=dissipator+sp.kron(C.conj(),C)-0.5*sp.kron(identity,CdagC)-0.5*sp.kron(CdagC.T,identity)
+    return dissipator.tocsr()
+
+def dissipatorAction(rho,collapseMatrices:list,anticommutator):
+    '''
+    Return sum_k C_k rho C_k^dagger - {anticommutator, rho} with anticommutator=1/2 sum_k C_k^dagger C_k.
+    The collapse operators are sparse and local, so this costs O(nnz(C) 2^n) per operator.
+    '''
+    drho=-(anticommutator@rho)
+    drho-=(anticommutator@rho.conj().T).conj().T
+    for C in collapseMatrices:
+        X=C@rho
+        drho+=(C@X.conj().T).conj().T
+    return drho
+
+def superoperatorToQobj(superoperator,n)->Qobj:
+    '''
+    Wrap a sparse superoperator (column-stacking convention) as a qutip super operator on n qubits.
+    '''
+    return Qobj(superoperator,dims=[[[2]*n,[2]*n],[[2]*n,[2]*n]],type='super')
+
+class NoiseModel:
+    '''
+    Local noise on every qubit, with the collapse operators and the dissipator built once and reused.
+
+    Parameters
+    ----------
+    n: # of qubits.
+    localOperator: 2x2 collapse operator acting on every qubit.
+
+    Usage
+    ----------
+    noise=noiseModel(n,'localSum',phi=np.pi/2)
+    noise.collapseOperators(kappa)        # [sqrt(kappa) C_i] as `Qobj`, for mesolve
+    noise.localCollapseOperators(kappa)   # [(i, sqrt(kappa) C_local)], for the MPDO solver
+    noise.liouvillian(hamiltonian,kappa)  # -i[H, . ] + kappa sum_i D[C_i], sparse
+    noise.parametricLiouvillian(hamiltonian,localSumZ(n),beta).at(s)  # the same with kappa=s plus the error beta*s*sum_j Z_j
+    '''
+    def __init__(self,n,localOperator):
+        self.n=n
+        self.localOperator=np.array(localOperator,dtype=complex)
+        self._collapseMatrices=None
+        self._collapseQobjs=None
+        self._dissipator=None
+
+    @property
+    def collapseMatrices(self):
+        '''
+        Unscaled collapse operators as scipy CSR matrices.
+        '''
+        if self._collapseMatrices is None:
+            self._collapseMatrices=[localOperatorOnSite(self.localOperator,i,self.n) for i in range(self.n)]
+        return self._collapseMatrices
+
+    @property
+    def dissipator(self):
+        '''
+        Unscaled dissipator sum_i D[C_i] as a sparse superoperator.
+        '''
+        if self._dissipator is None:
+            self._dissipator=dissipatorSuperoperator(self.collapseMatrices,self.n)
+        return self._dissipator
+
+    def collapseOperators(self,kappa=1)->list:
+        '''
+        Return the collapse operators sqrt(kappa) C_i as a list of `Qobj`.
+        '''
+        if self._collapseQobjs is None:
+            self._collapseQobjs=[Qobj(C,dims=[[2]*self.n,[2]*self.n]) for C in self.collapseMatrices]
+        if kappa==1:
+            return list(self._collapseQobjs)
+        return [np.sqrt(kappa)*C for C in self._collapseQobjs]
+
+    def localCollapseOperators(self,kappa=1)->list:
+        '''
+        Return the collapse operators as (site, sqrt(kappa) C_local) pairs, which the MPDO solver takes for any n.
+        '''
+        return [(i,np.sqrt(kappa)*self.localOperator) for i in range(self.n)]
+
+    def liouvillian(self,hamiltonian,kappa):
+        '''
+        Return the Lindbladian -i[H, . ] + kappa sum_i D[C_i] as a sparse superoperator.
+
+        Parameters
+        ----------
+        hamiltonian: `dict`, `PauliSum`, matrix, or a superoperator already returned by hamiltonianSuperoperator
+            (a (4**n,4**n) matrix), in which case only the sparse axpy with the cached dissipator is done.
+        kappa: noise strength.
+        '''
+        if not isinstance(hamiltonian,(dict,PauliSum)) and hamiltonian.shape==(4**self.n,4**self.n):
+            hamiltonianPart=hamiltonian
+        else:
+            hamiltonianPart=hamiltonianSuperoperator(hamiltonian,self.n)
+        return (hamiltonianPart+kappa*self.dissipator).tocsr()
+
+    def liouvillianQobj(self,hamiltonian,kappa)->Qobj:
+        '''
+        Return NoiseModel.liouvillian as a qutip super operator, which mesolve accepts in place of H and the collapse operators.
+        '''
+        return superoperatorToQobj(self.liouvillian(hamiltonian,kappa),self.n)
+
+    def parametricLiouvillian(self,hamiltonian,errorHamiltonian=None,errorRatio=0):
+        '''
+        Return the ParametricLiouvillian L(s) = -i[H + errorRatio*s*H_err, . ] + s sum_i D[C_i].
+
+        Parameters
+        ----------
+        hamiltonian: ideal Hamiltonian H (`dict`, `PauliSum` or matrix).
+        errorHamiltonian: systematic error H_err, e.g. models.localSumZ(n).
+        errorRatio: ratio between the systematic error strength and the noise strength kappa=s.
+        '''
+        generator=self.dissipator
+        if errorHamiltonian is not None and errorRatio!=0:
+            generator=generator+errorRatio*hamiltonianSuperoperator(errorHamiltonian,self.n)
+        return ParametricLiouvillian(hamiltonianSuperoperator(hamiltonian,self.n),generator,self.n)
+
+class ParametricLiouvillian:
+    '''
+    Lindbladian which is affine in a single parameter, L(s) = L0 + s L1.
+
+    In the generate scripts kappa=gamma*|deltaE| and error_strength=gamma*beta*|deltaE| are both linear in s=gamma*|deltaE|,
+    so L0=-i[H, . ] and L1=sum_i D[C_i]-i beta[sum_j Z_j, . ] are assembled once and every gamma costs one sparse axpy.
+
+    Parameters
+    ----------
+    L0, L1: sparse superoperators.
+    n: # of qubits.
+    '''
+    def __init__(self,L0,L1,n):
+        self.L0=sp.csr_matrix(L0)
+        self.L1=sp.csr_matrix(L1)
+        self.n=n
+
+    def at(self,s):
+        '''
+        Return L0 + s L1 as a sparse superoperator.
+        '''
+        return (self.L0+s*self.L1).tocsr()
+
+    def atQobj(self,s)->Qobj:
+        return superoperatorToQobj(self.at(s),self.n)
+
+    def withHamiltonian(self,hamiltonian):
+        '''
+        Return the ParametricLiouvillian with L0 replaced by -i[hamiltonian, . ] and the same L1 (shared, not copied),
+        e.g. for the Pauli-transformed Hamiltonians of the reshaping method.
+        '''
+        return ParametricLiouvillian(hamiltonianSuperoperator(hamiltonian,self.n),self.L1,self.n)
+
+LOCAL_OPERATORS={
+    'localSum':lambda phi: np.array([[1.j*np.sin(phi)+np.cos(phi),0],[0,1]],dtype=complex),
+    't1':lambda phi: np.array([[0,1],[0,0]],dtype=complex),
+}
+
+def noiseModel(n,noiseType='localSum',phi=np.pi/2)->NoiseModel:
+    '''
+    Return the (memoized) NoiseModel for n qubits.
+
+    Parameters
+    ----------
+    noiseType: 'localSum' for C_local=diag(e^{i phi},1) as in models.localSumCollapseList, 't1' for C_local=|0><1| as in models.t1LocalJumpList.
+    phi: phase of the 'localSum' noise (ignored for 't1').
+    '''
+    if noiseType not in LOCAL_OPERATORS:
+        raise ValueError("Unknown noise type "+str(noiseType)+", expected one of "+str(list(LOCAL_OPERATORS.keys()))+".")
+    return _noiseModel(n,noiseType,None if noiseType=='t1' else float(phi))
+
+@lru_cache(maxsize=32)
+def _noiseModel(n,noiseType,phi):
+    return NoiseModel(n,LOCAL_OPERATORS[noiseType](phi))
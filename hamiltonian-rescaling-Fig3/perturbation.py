@@ -0,0 +1,130 @@
+import numpy as np
+from scipy import sparse as sp
+from scipy.linalg import eig
+from qutip import Qobj
+from pauli_sum import PauliSum
+from exact_diagonalization import hamiltonianMatrix
+
+'''
+Weak-noise perturbation theory for the noisy energy gap, without time evolution.
+
+In the eigenbasis of the ideal Hamiltonian, L0 = -i[H, . ] has the eigenvectors |j><k| with eigenvalues i(E_k-E_j), and the signal
+<2|phi_b><phi_a|>(t) follows the eigenvalue lambda0 = i(E_b-E_a) of |a><b|. The perturbation V = -i[H_err, . ] + sum_k D[C_k]
+shifts it to
+lambda = lambda0 + mu + sum_{(j,k) outside the block} <<l|V|jk>> <<jk|V|r>> / (lambda0 - i(E_k-E_j)),
+where the block holds the pairs (j,k) with E_k-E_j = E_b-E_a, and mu, r, l are the eigenvalue and eigenvectors of V restricted
+to the block (first-order degenerate perturbation theory), chosen by their weight in the signal. The noisy gap is Im(lambda),
+as returned by the matrix pencil.
+
+V(|j><k|) and its adjoint are sums of rank-one matrices u v^dagger (e.g. C|j><k|C^dagger = (C j)(C k)^dagger), so every
+matrix element in the eigenbasis costs O(d^2) per collapse operator once the eigenvectors are known.
+'''
+
+def _sparseOperator(operator,n):
+    if isinstance(operator,(dict,PauliSum)):
+        return hamiltonianMatrix(operator,n,sparse=True)
+    if isinstance(operator,Qobj):
+        return sp.csr_matrix(operator.data)
+    return sp.csr_matrix(operator)
+
+def rankOneTerms(phiJ,phiK,collapseMatrices:list,errorMatrix=None,adjoint=False):
+    '''
+    Return the list of (u, v) with V(|j><k|) = sum u v^dagger, or V^dagger(|j><k|) if adjoint.
+    '''
+    terms=[]
+    if errorMatrix is not None:
+        # -i[H_err, X] and its adjoint i[H_err, X]
+        sign=1.j if adjoint else -1.j
+        terms.append((sign*(errorMatrix@phiJ),phiK))
+        terms.append((-sign*phiJ,errorMatrix@phiK))
+    for C in collapseMatrices:
+        if adjoint:
+            # C^dagger X C - 1/2 {C^dagger C, X}
+            terms.append((C.conj().T@phiJ,C.conj().T@phiK))
+        else:
+            # C X C^dagger - 1/2 {C^dagger C, X}
+            terms.append((C@phiJ,C@phiK))
+        terms.append((-0.5*(C.conj().T@(C@phiJ)),phiK))
+        terms.append((-0.5*phiJ,C.conj().T@(C@phiK)))
+    return terms
+
+def eigenbasisMatrix(terms,eigenstates):
+    '''
+    Return <j|sum u v^dagger|k> for all eigenstates j, k (one per row).
+    '''
+    basisConj=np.conj(eigenstates)
+    matrix=np.zeros((len(eigenstates),len(eigenstates)),dtype=complex)
+    for u,v in terms:
+        matrix+=np.outer(basisConj@u,np.conj(basisConj@v))
+    return matrix
+
+def perturbativeGap(n,eigenvalues,eigenstates,a,b,collapseOperators:list,errorHamiltonian=None,order=2,degeneracyTol=1e-8,maxBlock=64):
+    '''
+    Return the noisy energy gap Im(lambda), the Lindbladian eigenvalue lambda near i(E_b-E_a) and an estimate of the error of
+    the perturbation series.
+
+    Parameters
+    ----------
+    n: # of qubits.
+    eigenvalues, eigenstates: output of eigenSolver (eigenstates one per row). The second order needs all of them;
+        with a partial spectrum the error estimate is infinite.
+    a, b: indices of phi_a and phi_b.
+    collapseOperators: a list of (already scaled) collapse operators as `Qobj` or sparse matrices.
+    errorHamiltonian: systematic error H_err, e.g. models.localSumZ(n,error_strength), as `dict`, `PauliSum` or matrix.
+    order: 1 or 2.
+    degeneracyTol: pairs (j,k) with |(E_k-E_j)-(E_b-E_a)| below degeneracyTol*max(1,|E_b-E_a|) form the degenerate block.
+    maxBlock: largest block handled; a larger one gives an infinite error estimate.
+
+    Return
+    ----------
+    energyGap: Im(lambda).
+    eigenvalue: lambda.
+    errorEstimate: conservative estimate of |lambda-lambda_exact|. With the ratio q = max|coupling| / min|denominator| of the
+        second-order sum, the error of the second order is taken as |second-order term|*(1+q): the last term kept plus the
+        next one, since close to the radius of convergence (q ~ 1) the last term is not small compared to the error. The
+        error of the first order is |second-order term| plus that. Over the gamma sweep of the generate scripts (ringModel,
+        'localSum' noise) it bounds the error of both orders against the exact Lindbladian eigenvalue.
+    '''
+    eigenvalues=np.asarray(eigenvalues)
+    eigenstates=np.asarray(eigenstates)
+    m=len(eigenvalues)
+    collapseMatrices=[_sparseOperator(C,n) for C in collapseOperators]
+    errorMatrix=None if errorHamiltonian is None else _sparseOperator(errorHamiltonian,n)
+    omega=eigenvalues[b]-eigenvalues[a]
+    frequencies=eigenvalues[None,:]-eigenvalues[:,None]          # E_k-E_j
+    inBlock=np.abs(frequencies-omega)<=degeneracyTol*max(1,np.abs(omega))
+    block=[(a,b)]+[(j,k) for j,k in zip(*np.nonzero(inBlock)) if (j,k)!=(a,b)]
+    if len(block)>maxBlock:
+        return np.imag(1.j*omega),1.j*omega,np.inf
+
+    rightMatrices=[eigenbasisMatrix(rankOneTerms(eigenstates[j],eigenstates[k],collapseMatrices,errorMatrix),eigenstates) for j,k in block]
+    blockMatrix=np.array([[M[j,k] for M in rightMatrices] for j,k in block])
+    values,left,right=eig(blockMatrix,left=True,right=True)
+    # the initial state and the measurement only overlap with |a><b| in the block
+    overlaps=np.einsum('qi,qi->i',left.conj(),right)
+    weights=right[0]*np.conj(left[0])/overlaps
+    index=np.argmax(np.abs(weights))
+    r=right[:,index]
+    l=left[:,index]/np.conj(overlaps[index])
+    eigenvalue=1.j*omega+values[index]
+
+    if m<eigenstates.shape[1]:
+        return np.imag(eigenvalue),eigenvalue,np.inf
+    Vr=sum(rq*M for rq,M in zip(r,rightMatrices))
+    Vdl=sum(lq*eigenbasisMatrix(rankOneTerms(eigenstates[j],eigenstates[k],collapseMatrices,errorMatrix,adjoint=True),eigenstates) for lq,(j,k) in zip(l,block))
+    numerators=np.conj(Vdl)*Vr
+    denominators=1.j*(omega-frequencies)
+    numerators[inBlock]=0
+    denominators[inBlock]=1
+    secondOrder=np.sum(numerators/denominators)
+    coupled=(np.abs(Vr)+np.abs(Vdl)>0)&~inBlock
+    ratio=0
+    if np.any(coupled):
+        coupling=max(np.max(np.abs(Vr[coupled])),np.max(np.abs(Vdl[coupled])))
+        ratio=coupling/np.min(np.abs(denominators[coupled]))
+    errorEstimate=np.abs(secondOrder)*(1+ratio)
+    if order>=2:
+        eigenvalue=eigenvalue+secondOrder
+    else:
+        errorEstimate=errorEstimate+np.abs(secondOrder)
+    return np.imag(eigenvalue),eigenvalue,errorEstimate
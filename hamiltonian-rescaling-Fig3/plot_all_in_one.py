@@ -1,6 +1,6 @@
 from matplotlib import pyplot as plt
 import numpy as np
-from exact_diagonalization import eigenSolver
+from exact_diagonalization import cachedEigenSolver
 from models import ringModel
 
 '''
@@ -31,7 +31,7 @@ with open(csv_file_path, mode='r') as file:
 n=6
 hamiltonian=ringModel(4,1,4,n)
 # print(hamiltonian)
-eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+eigenvalues,eigenstates=cachedEigenSolver(hamiltonian,n)
 
 
 '''
@@ -0,0 +1,166 @@
+import numpy as np
+import hashlib
+from collections import OrderedDict
+from scipy import sparse as sp
+from scipy.linalg import eig,lu_factor,lu_solve
+from scipy.sparse import linalg as spla
+from pauli_sum import PauliSum
+from exact_diagonalization import hamiltonianMatrix
+from propagator import lindbladian,pureStateVector,rankOneFunctional
+
+'''
+Closed-form signals from the eigendecomposition of a time-independent Lindbladian.
+
+With L = R diag(lambda) R^{-1}, the signal of an observable with functional w (see propagator.rankOneFunctional) is
+<O>(t) = sum_k w.R_k (R^{-1} vec(rho0))_k e^{lambda_k t}, so once L is diagonalized any time grid, initial state and observable
+only cost a few matrix-vector products.
+
+spectralGap skips the signal altogether: the pole recovered by the matrix pencil is the Lindbladian eigenvalue continuously
+connected to i(E_b-E_a), which is found directly by shift-invert Arnoldi on the sparse Lindbladian.
+'''
+
+class LiouvillianSpectrum:
+    '''
+    Eigendecomposition of a Lindbladian superoperator.
+
+    Parameters
+    ----------
+    liouvillian: (sparse) superoperator in the column-stacking convention.
+
+    Usage
+    ----------
+    spectrum=LiouvillianSpectrum(lindbladian(hamiltonian,collapseOperators,n))
+    spectrum.signal(rho0,functional,tlist)   # <O>(t) for every t in tlist
+    spectrum.modes(rho0,functional)          # (eigenvalues, weights) of the signal
+    '''
+    def __init__(self,liouvillian):
+        matrix=liouvillian.toarray() if sp.issparse(liouvillian) else np.asarray(liouvillian)
+        self.eigenvalues,self.rightEigenvectors=eig(matrix)
+        self._lu=lu_factor(self.rightEigenvectors)
+
+    def modes(self,rho0,functional):
+        '''
+        Return the Liouvillian eigenvalues and the weights of the modes in the signal functional.vec(rho(t)).
+        '''
+        coefficients=lu_solve(self._lu,np.asarray(rho0,dtype=complex).reshape(-1))
+        weights=(np.asarray(functional,dtype=complex).reshape(-1)@self.rightEigenvectors)*coefficients
+        return self.eigenvalues,weights
+
+    def signal(self,rho0,functional,tlist,atol=0):
+        '''
+        Return functional.vec(rho(t)) for every t in tlist. Modes with |weight|<=atol are dropped.
+        '''
+        eigenvalues,weights=self.modes(rho0,functional)
+        if atol>0:
+            keep=np.abs(weights)>atol
+            eigenvalues=eigenvalues[keep]
+            weights=weights[keep]
+        return np.exp(np.outer(np.asarray(tlist),eigenvalues))@weights
+
+def liouvillianHash(liouvillian)->str:
+    '''
+    Return a hash of a sparse superoperator, used to key the spectrum cache.
+    '''
+    liouvillian=sp.csr_matrix(liouvillian)
+    liouvillian.sort_indices()
+    digest=hashlib.sha1()
+    digest.update(np.asarray(liouvillian.shape,dtype=np.int64).tobytes())
+    for array in (liouvillian.indptr,liouvillian.indices,liouvillian.data):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+_spectrumCache=OrderedDict()
+
+def liouvillianSpectrum(liouvillian,maxEntries=4)->LiouvillianSpectrum:
+    '''
+    Return the (memoized) LiouvillianSpectrum of a superoperator. The maxEntries most recently used spectra are kept.
+    '''
+    key=liouvillianHash(liouvillian)
+    if key in _spectrumCache:
+        _spectrumCache.move_to_end(key)
+        return _spectrumCache[key]
+    spectrum=LiouvillianSpectrum(liouvillian)
+    _spectrumCache[key]=spectrum
+    while len(_spectrumCache)>maxEntries:
+        _spectrumCache.popitem(last=False)
+    return spectrum
+
+def spectralSignal(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,deltaT,L,liouvillian=None):
+    '''
+    Return tlist and the signal <2|phi_b><phi_a|>(t) started from (|phi_a>+|phi_b>)/sqrt(2), evaluated in closed form from
+    the Lindbladian spectrum. Same arguments as utils.simulateSignal.
+    '''
+    tlist=np.linspace(0,L*deltaT,L+1)
+    if liouvillian is None:
+        liouvillian=lindbladian(noisyHamiltonian,collapseOperators,n)
+    spectrum=liouvillianSpectrum(liouvillian)
+    rho0=pureStateVector(1/np.sqrt(2)*(np.asarray(phiA)+np.asarray(phiB)))
+    return tlist,spectrum.signal(rho0,rankOneFunctional(phiA,phiB),tlist)
+
+def shiftInvertModes(liouvillian,rho0,functional,sigma,k=6,tol=0,factorization=None):
+    '''
+    Return the k Lindbladian eigenvalues closest to sigma and their weights in the signal functional.vec(rho(t)).
+
+    The weight of mode j is (functional.r_j)(l_j^dagger rho0)/(l_j^dagger r_j) with r_j, l_j the right and left eigenvectors,
+    both obtained by shift-invert Arnoldi (scipy.sparse.linalg.eigs). (L-sigma)^{-1} and its adjoint are applied with one
+    sparse LU factorization, which can be passed as factorization (splu of L-sigma) to reuse it between calls.
+    '''
+    liouvillian=sp.csc_matrix(liouvillian)
+    dimension=liouvillian.shape[0]
+    if factorization is None:
+        factorization=spla.splu((liouvillian-sigma*sp.identity(dimension,dtype=complex,format='csc')).tocsc())
+    k=min(k,dimension-2)
+    inverse=spla.LinearOperator((dimension,dimension),matvec=factorization.solve,dtype=complex)
+    adjointInverse=spla.LinearOperator((dimension,dimension),matvec=lambda x: factorization.solve(x,trans='H'),dtype=complex)
+    eigenvalues,right=spla.eigs(liouvillian,k=k,sigma=sigma,OPinv=inverse,tol=tol)
+    leftEigenvalues,left=spla.eigs(liouvillian.conj().T.tocsc(),k=k,sigma=np.conj(sigma),OPinv=adjointInverse,tol=tol)
+    rho0=np.asarray(rho0,dtype=complex).reshape(-1)
+    functional=np.asarray(functional,dtype=complex).reshape(-1)
+    weights=np.empty(len(eigenvalues),dtype=complex)
+    for j in range(len(eigenvalues)):
+        l=left[:,np.argmin(np.abs(np.conj(leftEigenvalues)-eigenvalues[j]))]
+        weights[j]=(functional@right[:,j])*(l.conj()@rho0)/(l.conj()@right[:,j])
+    return eigenvalues,weights
+
+def spectralGap(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,k=6,target=None,liouvillian=None,maxK=64,weightTol=0.5):
+    '''
+    Return the noisy energy gap Im(lambda) and the Lindbladian eigenvalue lambda that dominates the signal <2|phi_b><phi_a|>(t),
+    without simulating the signal.
+
+    The k modes closest to the target are accepted once the weight they miss, |sum_j weights_j - <2|phi_b><phi_a|>(0)|, is
+    below weightTol*|<2|phi_b><phi_a|>(0)| and below the largest captured weight, so that no mode outside them can dominate
+    the signal. Otherwise k is doubled up to maxK, and a RuntimeError is raised if the modes still miss too much weight.
+
+    Parameters
+    ----------
+    target: shift of the Arnoldi iteration. Default: the Rayleigh quotient <<phi_a phi_b|L|phi_a phi_b>> of the Lindbladian on
+        the coherence |phi_a><phi_b|, i.e. i(<phi_b|H|phi_b>-<phi_a|H|phi_a>) plus the first order decay and shift of the noise.
+    k: # of eigenvalues first computed near the target. The one with the largest weight in the signal is returned.
+    liouvillian: precomputed Lindbladian, see utils.simulateSignal.
+    maxK: largest k tried.
+    weightTol: largest accepted missing weight, relative to the signal at t=0.
+    other parameters are the same as utils.simulateSignal.
+    '''
+    phiA=np.asarray(phiA,dtype=complex).reshape(-1)
+    phiB=np.asarray(phiB,dtype=complex).reshape(-1)
+    if liouvillian is None:
+        liouvillian=lindbladian(noisyHamiltonian,collapseOperators,n)
+    liouvillian=sp.csc_matrix(liouvillian)
+    if target is None:
+        coherence=np.kron(phiB.conj(),phiA)
+        target=coherence.conj()@(liouvillian@coherence)
+    # Every eigenvalue has a non-positive real part, so the small positive shift keeps L-sigma nonsingular.
+    sigma=target+1e-8*max(1,np.abs(target))
+    factorization=spla.splu((liouvillian-sigma*sp.identity(liouvillian.shape[0],dtype=complex,format='csc')).tocsc())
+    rho0=pureStateVector(1/np.sqrt(2)*(phiA+phiB))
+    functional=rankOneFunctional(phiA,phiB)
+    initialSignal=functional@rho0
+    while True:
+        eigenvalues,weights=shiftInvertModes(liouvillian,rho0,functional,sigma,k=k,factorization=factorization)
+        dominant=np.argmax(np.abs(weights))
+        missingWeight=np.abs(np.sum(weights)-initialSignal)
+        if missingWeight<=weightTol*np.abs(initialSignal) and missingWeight<np.abs(weights[dominant]):
+            return np.imag(eigenvalues[dominant]),eigenvalues[dominant]
+        if k>=min(maxK,liouvillian.shape[0]-2):
+            raise RuntimeError("The "+str(k)+" Lindbladian modes near the target miss a weight of "+str(missingWeight)+" of the signal, the dominant mode is not resolved.")
+        k=min(2*k,maxK)
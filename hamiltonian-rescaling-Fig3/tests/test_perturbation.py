@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from models import ringModel,localSumZ,errHamLocalSumZ
+from noise_model import noiseModel
+from exact_diagonalization import eigenSolver
+from propagator import pureStateVector,rankOneFunctional
+from spectral import LiouvillianSpectrum
+from perturbation import perturbativeGap
+from utils import rescaledEigenData
+
+'''
+perturbativeGap and its error estimate against the dominant mode of the dense Lindbladian spectrum, over the gamma sweep of
+main.py (kappa=gamma*|deltaE|, error strength beta*kappa).
+'''
+
+n=4
+beta=0.01
+gammaList=[1e-4,2e-4,5e-4,1e-3,2e-3,5e-3,1e-2,2e-2,3e-2,5e-2,1e-1]
+hamiltonian=ringModel(4,1,4,n)
+eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+noise=noiseModel(n)
+
+def exactEigenvalue(a,b,kappa):
+    liouvillian=noise.parametricLiouvillian(hamiltonian,localSumZ(n),beta).at(kappa)
+    rho0=pureStateVector(1/np.sqrt(2)*(eigenstates[a]+eigenstates[b]))
+    modes,weights=LiouvillianSpectrum(liouvillian).modes(rho0,rankOneFunctional(eigenstates[a],eigenstates[b]))
+    return modes[np.argmax(np.abs(weights))]
+
+@pytest.mark.parametrize('a,b',[(0,3),(1,6),(2,9),(0,15),(1,11)])
+def testErrorEstimateBoundsTheError(a,b):
+    for gamma in gammaList:
+        kappa=gamma*np.abs(eigenvalues[b]-eigenvalues[a])
+        exact=exactEigenvalue(a,b,kappa)
+        for order in (1,2):
+            energyGap,eigenvalue,errorEstimate=perturbativeGap(n,eigenvalues,eigenstates,a,b,noise.collapseOperators(kappa),localSumZ(n,beta*kappa),order=order)
+            assert np.abs(energyGap-np.imag(exact))<=errorEstimate
+
+def testRescaledPerturbativeGap(tmp_path,monkeypatch):
+    # cachedEigenSolver writes its cache into the working directory
+    monkeypatch.chdir(tmp_path)
+    a,b=1,6
+    deltaE=np.abs(eigenvalues[b]-eigenvalues[a])
+    gamma=1e-3
+    c=2
+    energyGaps,N_modes=rescaledEigenData(c,gamma*deltaE,gamma*beta*deltaE,n,hamiltonian,eigenstates[a],eigenstates[b],noise.collapseOperators,errHamLocalSumZ,None,1e-2,200,solver='perturbative')
+    # H/c with noise kappa and error e has the gaps of H with noise c*kappa and error c*e divided by c
+    kappa=c*gamma*deltaE
+    energyGap,eigenvalue,errorEstimate=perturbativeGap(n,eigenvalues,eigenstates,a,b,noise.collapseOperators(kappa),localSumZ(n,beta*kappa))
+    assert N_modes==1
+    assert errorEstimate<=1e-3
+    assert energyGaps[0]==pytest.approx(energyGap/c,rel=1e-12)
+    assert np.abs(energyGaps[0]-np.imag(exactEigenvalue(a,b,kappa))/c)<=errorEstimate/c
+
+def testRescaledPerturbativeGapNeedsEigenstates(tmp_path,monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    phiA=(eigenstates[0]+eigenstates[1])/np.sqrt(2)
+    with pytest.raises(ValueError):
+        rescaledEigenData(1,1e-3,1e-5,n,hamiltonian,phiA,eigenstates[6],noise.collapseOperators,errHamLocalSumZ,None,1e-2,200,solver='perturbative')
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from models import ringModel,errHamLocalSumZ
+from noise_model import noiseModel
+from exact_diagonalization import eigenSolver
+from utils import SignalCache,rescaledSignal,rescalingMitigation,noisyEigenData,secondOrderCorrection,simulateSignal
+
+'''
+The time-dilated, cached rescaling of rescalingMitigation against the construction of main.py before the cache: H/c with noise
+kappa and error e, sampled at t=k c deltaT.
+'''
+
+n=4
+beta=0.01
+gamma=1e-2
+deltaT=1e-2
+L=200
+a,b=1,6
+hamiltonian=ringModel(4,1,4,n)
+eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+noise=noiseModel(n)
+kappa=gamma*np.abs(eigenvalues[b]-eigenvalues[a])
+ham_err_strength=beta*kappa
+
+def baselineSignal(c):
+    rescaledHamiltonian={pauliString:coefficient/c for pauliString,coefficient in hamiltonian.items()}
+    return simulateSignal(n,errHamLocalSumZ(rescaledHamiltonian,n,ham_err_strength),eigenstates[a],eigenstates[b],noise.collapseOperators(kappa),None,c*deltaT,L,solver='propagator')[1]
+
+@pytest.mark.parametrize('c',[1.5,2])
+def testRescaledSignalMatchesBaseline(c):
+    signal=rescaledSignal(c,kappa,ham_err_strength,n,hamiltonian,eigenstates[a],eigenstates[b],noise.collapseOperators,errHamLocalSumZ,None,deltaT,L,solver='propagator')
+    assert np.max(np.abs(signal-baselineSignal(c)))<1e-10
+
+def testRescalingMitigationMatchesBaseline():
+    c_1,c_2=1.5,2
+    noisyResult,firstResult,secondResult=rescalingMitigation(kappa,ham_err_strength,n,hamiltonian,eigenstates[a],eigenstates[b],noise.collapseOperators,errHamLocalSumZ,None,deltaT,L,c_1,c_2,solver='propagator')
+
+    # main.py before the cache: the gaps of H/c from its own signal, sampled at c*deltaT
+    gaps={}
+    for c in (1,c_1,c_2):
+        rescaledHamiltonian={pauliString:coefficient/c for pauliString,coefficient in hamiltonian.items()}
+        gaps[c]=noisyEigenData(n,errHamLocalSumZ(rescaledHamiltonian,n,ham_err_strength),eigenstates[a],eigenstates[b],noise.collapseOperators(kappa),None,c*deltaT,L,solver='propagator')[0]
+    assert noisyResult==pytest.approx(gaps[1],rel=1e-8)
+    assert firstResult==pytest.approx((gaps[1]-gaps[c_1])/(1-1/c_1),rel=1e-8)
+    assert secondResult==pytest.approx(secondOrderCorrection(gaps[1],gaps[c_1],gaps[c_2],c_1,c_2),rel=1e-8)
+
+def testCacheHitsOnlyOnMatchingEffectiveParameters():
+    signalCache=SignalCache()
+    def mitigation(kappa,ham_err_strength,deltaT):
+        rescalingMitigation(kappa,ham_err_strength,n,hamiltonian,eigenstates[a],eigenstates[b],noise.collapseOperators,errHamLocalSumZ,None,deltaT,L,1.5,2,solver='propagator',signalCache=signalCache)
+        return signalCache.hits,signalCache.misses
+
+    # c in (1,1.5,2) stores (kappa,e), (1.5 kappa,1.5 e) and (2 kappa,2 e)
+    assert mitigation(kappa,ham_err_strength,deltaT)==(0,3)
+    # c=1 of 1.5 kappa is c=1.5 of kappa, but only with the error scaled along
+    assert mitigation(1.5*kappa,1.5*ham_err_strength,deltaT)==(1,5)
+    assert mitigation(2*kappa,ham_err_strength,deltaT)==(1,8)
+    assert mitigation(kappa,ham_err_strength,2*deltaT)==(1,11)
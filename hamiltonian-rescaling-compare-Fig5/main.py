@@ -1,7 +1,8 @@
 import numpy as np
-from models import ringModel,localSumCollapseList,errHamLocalSumZ
-from utils import rescalingMitigationCompare
-from exact_diagonalization import eigenSolver
+from models import ringModel,errHamLocalSumZ
+from noise_model import noiseModel
+from utils import rescalingMitigationCompare,SignalCache
+from exact_diagonalization import cachedEigenSolver
 from qutip.solver import Options
 import time
 
@@ -66,7 +67,7 @@ beta=0.01
 
 hamiltonian=ringModel(4,1,4,n)
 # print(hamiltonian)
-eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+eigenvalues,eigenstates=cachedEigenSolver(hamiltonian,n)
 # print(eigenvalues)
 
 it=1
@@ -84,9 +85,12 @@ for randomNums in randomStatesList[0:100]:
     f_RE=[]
     s_RE=[]
 
+    # Rescaled runs at c*gamma reuse the unrescaled runs at the same effective noise, see SignalCache.
+    signalCache=SignalCache()
+
     for gamma in gammaList:
         start_time = time.time()
-        energyGapsMitigation=rescalingMitigationCompare(kappa=gamma*np.abs(deltaE),ham_err_strength=gamma*beta*np.abs(deltaE),n=n,hamiltonian=hamiltonian,phiA=eigenstates[a],phiB=eigenstates[b],collapseOperatorsFunc=lambda kappa: [oper*np.sqrt(kappa) for oper in localSumCollapseList(n,np.pi/2)],hamSysErrorFunc=errHamLocalSumZ,options=options,deltaT=deltaT0,L=L,c_1=2,c_2=1.5,N_poles=100)
+        energyGapsMitigation=rescalingMitigationCompare(kappa=gamma*np.abs(deltaE),ham_err_strength=gamma*beta*np.abs(deltaE),n=n,hamiltonian=hamiltonian,phiA=eigenstates[a],phiB=eigenstates[b],collapseOperatorsFunc=lambda kappa: noiseModel(n,'localSum',np.pi/2).collapseOperators(kappa),hamSysErrorFunc=errHamLocalSumZ,options=options,deltaT=deltaT0,L=L,c_1=2,c_2=1.5,N_poles=100,signalCache=signalCache)
 
         print(f"Noisy rate gamma={gamma}","result:",energyGapsMitigation[0])
         noisy.append(energyGapsMitigation[0][0])
@@ -0,0 +1,93 @@
+import numpy as np
+from scipy import sparse as sp
+from scipy.linalg import expm
+from scipy.sparse.linalg import expm_multiply
+from qutip import Qobj
+from noise_model import hamiltonianSuperoperator,dissipatorSuperoperator
+
+'''
+Signals of a time-independent Lindbladian on the uniform grid t_k=k deltaT, k=0,1,...,L.
+
+The state is advanced by rho((k+1) deltaT)=exp(L deltaT) rho(k deltaT). For small n the propagator exp(L deltaT) is computed
+once as a dense matrix, for larger n its action is evaluated by scipy.sparse.linalg.expm_multiply on the uniform grid.
+Superoperators use the column-stacking convention of noise_model.py.
+'''
+
+def lindbladian(hamiltonian,collapseOperators:list,n):
+    '''
+    Return the sparse superoperator -i[H, . ] + sum_k D[C_k].
+
+    Parameters
+    ----------
+    hamiltonian: `dict`, `PauliSum` or (sparse) matrix.
+    collapseOperators: a list of (already scaled) collapse operators as `Qobj` or sparse matrices.
+    n: # of qubits.
+    '''
+    collapseMatrices=[sp.csr_matrix(C.data if isinstance(C,Qobj) else C) for C in collapseOperators]
+    liouvillian=hamiltonianSuperoperator(hamiltonian,n)
+    if len(collapseMatrices)>0:
+        liouvillian=liouvillian+dissipatorSuperoperator(collapseMatrices,n)
+    return liouvillian.tocsr()
+
+def pureStateVector(state):
+    '''
+    Return vec(|state><state|).
+    '''
+    state=np.asarray(state,dtype=complex).reshape(-1)
+    return np.kron(state.conj(),state)
+
+def rankOneFunctional(phiA,phiB,coefficient=2):
+    '''
+    Return the row vector w with w.vec(rho) = Tr(coefficient*|phi_b><phi_a| rho) = coefficient*<phi_a|rho|phi_b>.
+    '''
+    phiA=np.asarray(phiA,dtype=complex).reshape(-1)
+    phiB=np.asarray(phiB,dtype=complex).reshape(-1)
+    return coefficient*np.kron(phiB,phiA.conj())
+
+def propagate(liouvillian,rho0,functional,deltaT,L,method='auto',denseDimension=256,chunk=100):
+    '''
+    Return functional.vec(rho(k deltaT)) for k=0,1,...,L.
+
+    Parameters
+    ----------
+    liouvillian: sparse superoperator.
+    rho0: vec(rho(0)). A real rho0 with a real generator (e.g. a Pauli transfer matrix) is propagated in real arithmetic.
+    functional: row vector of the measured observable, see rankOneFunctional.
+    method: 'dense' to step with the dense propagator exp(L deltaT), 'krylov' to use expm_multiply, 'auto' to use 'dense'
+        when the superoperator dimension is at most denseDimension.
+    chunk: # of time steps per expm_multiply call, which bounds the memory of the intermediate states.
+    '''
+    if method=='auto':
+        method='dense' if liouvillian.shape[0]<=denseDimension else 'krylov'
+    signal=np.empty(L+1,dtype=complex)
+    rho=np.asarray(rho0,dtype=np.result_type(rho0,liouvillian.dtype,float)).reshape(-1)
+    signal[0]=functional@rho
+    if method=='dense':
+        propagator=expm(deltaT*liouvillian.toarray())
+        for k in range(1,L+1):
+            rho=propagator@rho
+            signal[k]=functional@rho
+    elif method=='krylov':
+        generator=sp.csr_matrix(liouvillian)
+        k=0
+        while k<L:
+            steps=min(chunk,L-k)
+            states=expm_multiply(generator,rho,start=0,stop=steps*deltaT,num=steps+1,endpoint=True)
+            signal[k+1:k+steps+1]=states[1:]@functional
+            rho=states[-1]
+            k+=steps
+    else:
+        raise ValueError("Unknown propagation method "+str(method)+", expected 'auto', 'dense' or 'krylov'.")
+    return signal
+
+def propagatorSignal(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,deltaT,L,method='auto',liouvillian=None):
+    '''
+    Return tlist and the signal <2|phi_b><phi_a|>(t) started from (|phi_a>+|phi_b>)/sqrt(2), computed by stepping with
+    exp(L deltaT). Same arguments as utils.simulateSignal.
+    '''
+    tlist=np.linspace(0,L*deltaT,L+1)
+    if liouvillian is None:
+        liouvillian=lindbladian(noisyHamiltonian,collapseOperators,n)
+    rho0=pureStateVector(1/np.sqrt(2)*(np.asarray(phiA)+np.asarray(phiB)))
+    signal=propagate(liouvillian,rho0,rankOneFunctional(phiA,phiB),deltaT,L,method=method)
+    return tlist,signal
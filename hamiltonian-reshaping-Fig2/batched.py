@@ -0,0 +1,179 @@
+import numpy as np
+from scipy import sparse as sp
+from qutip import Qobj
+from pauli_sum import PauliSum,popcount
+from exact_diagonalization import hamiltonianMatrix
+
+'''
+Batched Lindblad evolution of K independent problems that share the collapse operators, e.g. the identity and the Pauli
+frames P H P of the reshaping method.
+
+The K density matrices are stacked into one (K,d,d) array and every problem k follows
+d rho_k/dt = -i[H_k, rho_k] + rates[k] sum_j D[C_j](rho_k).
+With G_k = -i H_k - rates[k]/2 sum_j C_j^dagger C_j and rho_k Hermitian, the right hand side is
+G_k rho_k + (G_k rho_k)^dagger + rates[k] sum_j C_j (C_j rho_k)^dagger,
+so the Hamiltonian part is one batched product: np.matmul with the (K,d,d) stack of dense Hamiltonians for at most
+denseDimension amplitudes, otherwise the permuted diagonals of MatrixFreeLindbladian (see matrix_free.py) with a (K,d)
+diagonal per X mask. The sparse collapse operators act on all problems at once as one (d, K d) product, and diagonal ones
+(e.g. the 'localSum' noise) as one elementwise (d,d) mask.
+
+Every step is exp(h L) applied by its Taylor series, truncated when the last term of every problem is below tol, with
+h ||L|| <= stepNorm for the bound of BatchedLindbladian.normBound.
+'''
+
+def _leftMultiply(matrix,stack):
+    '''
+    Return matrix @ stack[k] for every k, for a sparse (d,d) matrix and a (K,d,m) stack.
+    '''
+    K,d,m=stack.shape
+    product=matrix@stack.transpose(1,0,2).reshape(d,K*m)
+    return np.asarray(product).reshape(d,K,m).transpose(1,0,2)
+
+def _dagger(stack):
+    return np.conj(stack.transpose(0,2,1))
+
+class BatchedLindbladian:
+    '''
+    Action of the K Lindbladians -i[H_k, . ] + rates[k] sum_j D[C_j] on a (K,d,d) stack of Hermitian density matrices.
+
+    Parameters
+    ----------
+    hamiltonians: list of K Hamiltonians as `dict` or `PauliSum`.
+    collapseOperators: a list of (unscaled) collapse operators as `Qobj` or sparse matrices, shared by all problems.
+    n: # of qubits.
+    rates: noise strength of every problem (or one for all), default 1.
+    denseDimension: largest 2^n for which the Hamiltonians are stored as a dense (K,d,d) stack.
+
+    Usage
+    ----------
+    lindbladian=BatchedLindbladian(hamiltonians,noiseModel(n,'localSum').collapseMatrices,n,rates)
+    lindbladian.apply(rhos)   # (K,d,d) array
+    '''
+    def __init__(self,hamiltonians:list,collapseOperators:list,n,rates=None,denseDimension=256):
+        hamiltonians=[(H if isinstance(H,PauliSum) else PauliSum.fromDict(H,n)).simplify() for H in hamiltonians]
+        self.n=n
+        self.K=len(hamiltonians)
+        d=2**n
+        self.rates=np.broadcast_to(np.asarray(1 if rates is None else rates,dtype=float),(self.K,)).copy()
+        self.pauliNorms=np.array([np.sum(np.abs(H.coefficients)) for H in hamiltonians])
+        self.dense=d<=denseDimension
+        if self.dense:
+            self.hamiltonians=np.array([hamiltonianMatrix(H,n) for H in hamiltonians],dtype=complex)
+        else:
+            rows=np.arange(d,dtype=np.uint64)
+            xMasks=np.unique(np.concatenate([H.xMasks for H in hamiltonians]))
+            self.permutations=[None if x==0 else (rows^x).astype(np.int64) for x in xMasks]
+            self.diagonals=[np.zeros((self.K,d),dtype=complex) for _ in xMasks]
+            for k,H in enumerate(hamiltonians):
+                for x,z,c in zip(H.xMasks,H.zMasks,H.coefficients):
+                    index=np.searchsorted(xMasks,x)
+                    self.diagonals[index][k]+=c*(1.j**(popcount(x&z)%4))*(1-2*(popcount(z&(rows^x))&1))
+        self.collapseMatrices=[sp.csr_matrix(C.data if isinstance(C,Qobj) else C) for C in collapseOperators]
+        self.anticommutator=sp.csr_matrix((d,d),dtype=complex)
+        for C in self.collapseMatrices:
+            self.anticommutator=self.anticommutator+0.5*(C.conj().T@C)
+        self.anticommutator=self.anticommutator.tocsr()
+        self.collapseNorm=sum(sp.linalg.norm(C,1)*sp.linalg.norm(C,np.inf) for C in self.collapseMatrices)
+        # diagonal C_j (e.g. the 'localSum' noise): sum_j D[C_j](rho) = W * rho elementwise with one (d,d) mask
+        self.dissipatorMask=None
+        if len(self.collapseMatrices)>0 and all((C-sp.diags(C.diagonal())).count_nonzero()==0 for C in self.collapseMatrices):
+            diagonals=np.array([C.diagonal() for C in self.collapseMatrices])
+            anticommutator=self.anticommutator.diagonal()
+            self.dissipatorMask=diagonals.T@diagonals.conj()-anticommutator[:,None]-anticommutator[None,:]
+
+    def hamiltonianAction(self,rhos):
+        '''
+        Return H_k rho_k for every k.
+        '''
+        if self.dense:
+            return np.matmul(self.hamiltonians,rhos)
+        result=np.zeros_like(rhos,dtype=complex)
+        for permutation,diagonal in zip(self.permutations,self.diagonals):
+            result+=diagonal[:,:,None]*(rhos if permutation is None else rhos[:,permutation,:])
+        return result
+
+    def apply(self,rhos):
+        '''
+        Return L_k[rho_k] for every k, for Hermitian rho_k.
+        '''
+        rates=self.rates[:,None,None]
+        X=-1.j*self.hamiltonianAction(rhos)
+        if self.dissipatorMask is not None:
+            return X+_dagger(X)+rates*self.dissipatorMask*rhos
+        if len(self.collapseMatrices)>0:
+            X-=rates*_leftMultiply(self.anticommutator,rhos)
+        drhos=X+_dagger(X)
+        for C in self.collapseMatrices:
+            drhos+=rates*_leftMultiply(C,_dagger(_leftMultiply(C,rhos)))
+        return drhos
+
+    def normBound(self):
+        '''
+        Return an upper bound of the norm of every L_k, max_k 2 sum_t |c_t| + 2 rates[k] sum_j ||C_j||^2.
+        '''
+        return np.max(2*self.pauliNorms+2*self.rates*self.collapseNorm)
+
+def taylorTerms(apply,rhos,h,tol=1e-14,maxOrder=60):
+    '''
+    Return the terms (hL)^k rho/k! of the Taylor series of exp(h L) rho for every problem, until the Frobenius norm of the
+    last term of every problem is below tol times the norm of its rho. exp(tau h L) rho = sum_k tau^k term_k for 0<=tau<=1.
+    '''
+    norms=np.linalg.norm(rhos,axis=(1,2))
+    terms=[rhos]
+    for order in range(1,maxOrder+1):
+        terms.append(h/order*apply(terms[-1]))
+        if np.all(np.linalg.norm(terms[-1],axis=(1,2))<=tol*norms):
+            return terms
+    raise RuntimeError("Taylor series of the batched step did not converge in "+str(maxOrder)+" terms, reduce the step.")
+
+def batchedSignals(n,hamiltonians:list,phiAs,phiBs,collapseOperators:list,deltaT,L,rates=None,tol=1e-14,stepNorm=4,denseDimension=256):
+    '''
+    Return tlist and the (K,L+1) array of the signals <2|phi_b><phi_a|>(t) of K problems, each started from
+    (|phi_a>+|phi_b>)/sqrt(2), evolved together as one (K,d,d) stack.
+
+    A step spans h = stepNorm/||L||, which for small deltaT holds many samples; the signal is linear in rho, so the samples
+    inside a step are sum_k tau^k <2|phi_b><phi_a|>(term_k) from the same Taylor terms (see taylorTerms).
+
+    Parameters
+    ----------
+    n: # of qubits.
+    hamiltonians: list of K noisy Hamiltonians (`dict` or `PauliSum`), e.g. pauliTransform(hamiltonian,P) plus the error.
+    phiAs, phiBs: (K,2^n) arrays of |phi_a> and |phi_b>, e.g. from exact_diagonalization.stateTransformBatch.
+    collapseOperators: unscaled collapse operators shared by all problems, e.g. noiseModel(n,'localSum').collapseMatrices.
+    deltaT: deltaT.
+    L: The signal is sampled at t=k dT, k=0,1,...,L.
+    rates: noise strength kappa of every problem (or one for all), default 1.
+    tol: truncation of the Taylor series of every step, see taylorTerms.
+    stepNorm: largest h ||L|| of a step for the bound of BatchedLindbladian.normBound. Longer steps need fewer terms per unit
+        time, at the cost of cancellation between terms of size up to stepNorm^k/k!.
+    denseDimension: see BatchedLindbladian.
+    '''
+    tlist=np.linspace(0,L*deltaT,L+1)
+    lindbladian=BatchedLindbladian(hamiltonians,collapseOperators,n,rates,denseDimension)
+    phiAs=np.asarray(phiAs,dtype=complex).reshape(lindbladian.K,-1)
+    phiBs=np.asarray(phiBs,dtype=complex).reshape(lindbladian.K,-1)
+    psis=(phiAs+phiBs)/np.sqrt(2)
+    rhos=psis[:,:,None]*np.conj(psis[:,None,:])
+    measure=lambda rhos: 2*np.einsum('ki,kij,kj->k',phiAs.conj(),rhos,phiBs)
+    # substeps per sample if deltaT ||L|| > stepNorm, otherwise samples per step
+    norm=lindbladian.normBound()/stepNorm
+    substeps=max(1,int(np.ceil(deltaT*norm)))
+    samples=1 if substeps>1 else max(1,int(1/(deltaT*norm)))
+    signals=np.empty((lindbladian.K,L+1),dtype=complex)
+    signals[:,0]=measure(rhos)
+    k=0
+    while k<L:
+        if substeps>1:
+            for _ in range(substeps):
+                rhos=sum(taylorTerms(lindbladian.apply,rhos,deltaT/substeps,tol))
+            signals[:,k+1]=measure(rhos)
+            k+=1
+            continue
+        block=min(samples,L-k)
+        terms=taylorTerms(lindbladian.apply,rhos,block*deltaT,tol)
+        values=np.array([measure(term) for term in terms])
+        powers=(np.arange(1,block+1)/block)[:,None]**np.arange(len(terms))[None,:]
+        signals[:,k+1:k+block+1]=(powers@values).T
+        rhos=sum(terms)
+        k+=block
+    return tlist,signals
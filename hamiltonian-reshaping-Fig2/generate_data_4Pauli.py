@@ -1,7 +1,7 @@
 import numpy as np
-from utils import pauliTransform,noisyEigenData
-from models import ringModel,errHamLocalSumZ,localSumCollapseList
-from exact_diagonalization import eigenSolver, stateTransform
+from utils import pauliTransform
+from models import ringModel,errHamLocalSumZ
+from exact_diagonalization import cachedEigenSolver
 from qutip import (Qobj, about, basis, coherent, coherent_dm, create, destroy, expect, fock, fock_dm, mesolve, qeye, sigmax, sigmay, sigmaz, tensor, thermal_dm)
 from qutip.solver import Options
 from matrix_pencil import mp_est
@@ -94,7 +94,7 @@ Generate data from the signals.
 n=6
 hamiltonian=ringModel(4,1,4,n)
 # print(hamiltonian)
-eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+eigenvalues,eigenstates=cachedEigenSolver(hamiltonian,n)
 # print(eigenvalues)
 
 idString='I'
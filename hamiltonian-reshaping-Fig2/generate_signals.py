@@ -1,8 +1,11 @@
 import numpy as np
-from qutip import (Qobj, about, basis, coherent, coherent_dm, create, destroy, expect, fock, fock_dm, mesolve, qeye, sigmax, sigmay, sigmaz, tensor, thermal_dm, Options)
-from utils import loadState,qutipHamiltonian,pauliTransform
-from exact_diagonalization import eigenSolver,stateTransform
-from models import ringModel,errHamLocalSumZ,localSumCollapseList
+from qutip import Options
+from utils import pauliTransform,simulateSignal,loadStates,pauliFrameClasses
+from exact_diagonalization import cachedEigenSolver,stateTransformBatch
+from models import ringModel,localSumZ
+from noise_model import noiseModel
+from pauli_sum import PauliSum
+from batched import batchedSignals
 import time
 
 import csv
@@ -60,7 +63,7 @@ def dataWritingWithHeader(path:str,zippedList):
         csv_writer.writerow(['t','signal','gamma'])
         csv_writer.writerows(zippedList)
 
-def generateNoisySignal(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,options,deltaT,L):
+def generateNoisySignal(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,options,deltaT,L,solver='mesolve',liouvillian=None,solverOptions=None,initState=None):
     '''
     Generate the noisy signal by numerical simulation.
 
@@ -74,18 +77,16 @@ def generateNoisySignal(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list
     deltaT: deltaT.
     options: qutip.solver.Option()
     L: The number of data points in the signal. We process the signal <O>(k dT), k=0,1,...,L-1.
+    solver: 'mesolve' or one of utils.SIGNAL_SOLVERS, see utils.simulateSignal.
+    liouvillian: precomputed Lindbladian, see utils.simulateSignal.
+    solverOptions: keyword arguments of the solver, see utils.simulateSignal.
+    initState: precomputed initial ket for mesolve, see utils.loadStates.
 
     Return
     ----------
     The noisy signal given the initial settings.
     '''
-    initState=loadState(1/np.sqrt(2)*(phiA+phiB),n)
-    measurement=2*loadState(phiB,n)*loadState(phiA,n).dag()
-
-    tlist=np.linspace(0,L*deltaT,L+1)
-    result=mesolve(qutipHamiltonian(noisyHamiltonian),initState,tlist,collapseOperators,[measurement],options=options)
-
-    return tlist,result.expect[0]
+    return simulateSignal(n,noisyHamiltonian,phiA,phiB,collapseOperators,options,deltaT,L,solver=solver,liouvillian=liouvillian,solverOptions=solverOptions,initState=initState)
 
 # Path: noisy_a_b_{PauliString}.csv
 def signalPath(a,b,randomPauli,label):
@@ -98,9 +99,14 @@ Generate data.
 n=6
 hamiltonian=ringModel(4,1,4,n)
 # print(hamiltonian)
-eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+eigenvalues,eigenstates=cachedEigenSolver(hamiltonian,n)
 # print(eigenvalues)
 
+# 'batched' evolves all frame classes of one gamma together (see batched.py). Any other value is passed to
+# utils.simulateSignal for one frame class at a time, e.g. solver='mesolve' to regenerate the published signals with the
+# reference integrator.
+solver='batched'
+
 options=Options()
 options.atol=1e-16
 options.rtol=1e-16
@@ -117,6 +123,22 @@ L=2000
 deltaT0=0.0001
 beta=0.01
 
+# kappa=s and ham_err_strength=beta*s with s=gamma*|deltaE|. The identity and the Pauli frames only differ in the signs of
+# the Hamiltonian terms and in the states, so the randomSampleNum+1 problems of one gamma are evolved together (see batched.py).
+randomSampleNum=100
+idString='I'
+for i in range(n-1):
+    idString+='I'
+pauliStrings=[idString]+randomPauliStrings[0][0:randomSampleNum]
+errorHamiltonian=PauliSum.fromDict(localSumZ(n),n)
+noise=noiseModel(n,'localSum',phi=np.pi/2)
+collapseMatrices=noise.collapseMatrices
+# Frames with the same error signs and X/Y flips give the same signal, so only one representative per class is simulated.
+frameClasses=pauliFrameClasses(pauliStrings,errorHamiltonian,noise.localOperator)
+representatives=list(frameClasses.keys())
+print("Pauli frames:",len(pauliStrings),"classes:",len(representatives))
+frameHamiltonians=[PauliSum.fromDict(pauliTransform(hamiltonian,pauliStrings[i]),n) for i in representatives]
+
 it=1
 for randomNums in randomStatesList[0:100]:
     print("Iteration ",it)
@@ -127,32 +149,36 @@ for randomNums in randomStatesList[0:100]:
     idealValue=eigenvalues[b]-eigenvalues[a]
     print("Exact diagonalization result:",idealValue)
 
+    # The transformed eigenstates do not depend on gamma, so transform them for all Pauli strings at once.
+    representativeStrings=[pauliStrings[i] for i in representatives]
+    transformedStatesA=stateTransformBatch(eigenstates[a],representativeStrings)
+    transformedStatesB=stateTransformBatch(eigenstates[b],representativeStrings)
+    # the mesolve initial kets (|a>+|b>)/sqrt(2) of all frames, reused for every gamma
+    initialStates=loadStates((transformedStatesA+transformedStatesB)/np.sqrt(2),n) if solver=='mesolve' else [None]*len(representatives)
+
     gammaLabel=0
     for gamma in gammaList:
-        
+        print("Iteration ",'(',it,')',f"gamma={gamma}")
         starttime=time.time()
 
-        noisySignal=generateNoisySignal(n,noisyHamiltonian=errHamLocalSumZ(hamiltonian,n,gamma*beta*np.abs(idealValue)),phiA=eigenstates[a],phiB=eigenstates[b],collapseOperators=[np.sqrt(gamma*np.abs(idealValue))*i for i in localSumCollapseList(n,phi=np.pi/2)],options=options,deltaT=deltaT0,L=L)
-
-        idString='I'
-        for i in range(n-1):
-            idString+='I'
-
-        combined_data=list(zip(noisySignal[0],noisySignal[1],[gamma for j in range(L+1)]))
-        dataWritingWithHeader(signalPath(a,b,idString,gammaLabel),combined_data)
-
-        randomSampleNum=100
-        for i in range(randomSampleNum):
-            print("Iteration ",'(',it,i+1,')',f"gamma={gamma}")
-            randomPauli=randomPauliStrings[0][i]
-            print("Random pauli: ", randomPauli)
-            # print(pauliTransform(hamiltonian,randomPauli))
-            transformedSignal=generateNoisySignal(n,noisyHamiltonian=errHamLocalSumZ(pauliTransform(hamiltonian,randomPauli),n,gamma*beta*np.abs(idealValue)),phiA=stateTransform(eigenstates[a],randomPauli),phiB=stateTransform(eigenstates[b],randomPauli),collapseOperators=[np.sqrt(gamma*np.abs(idealValue))*i for i in localSumCollapseList(n,phi=np.pi/2)],options=options,deltaT=deltaT0,L=L)
-            combined_data=list(zip(transformedSignal[0],transformedSignal[1],[gamma for j in range(L+1)]))
-            dataWritingWithHeader(signalPath(a,b,randomPauli,gammaLabel),combined_data)
+        s=gamma*np.abs(idealValue)
+        noisyHamiltonians=[frameHamiltonian+errorHamiltonian*(beta*s) for frameHamiltonian in frameHamiltonians]
+        if solver=='batched':
+            tlist,signals=batchedSignals(n,noisyHamiltonians,transformedStatesA,transformedStatesB,collapseMatrices,deltaT0,L,rates=s)
+        else:
+            collapseOperators=noise.collapseOperators(s)
+            signals=[]
+            for noisyHamiltonian,phiA,phiB,initState in zip(noisyHamiltonians,transformedStatesA,transformedStatesB,initialStates):
+                tlist,signal=generateNoisySignal(n,noisyHamiltonian.toDict(),phiA,phiB,collapseOperators,options,deltaT0,L,solver=solver,initState=initState)
+                signals.append(signal)
+
+        for representative,signal in zip(representatives,signals):
+            combined_data=list(zip(tlist,signal,[gamma for j in range(L+1)]))
+            for i in frameClasses[representative]:
+                dataWritingWithHeader(signalPath(a,b,pauliStrings[i],gammaLabel),combined_data)
             
         endtime=time.time()
         print(f"Total runtime for gamma={gamma}:",endtime-starttime)
         gammaLabel+=1
 
-    it+=1
\ No newline at end of file
+    it+=1
@@ -0,0 +1,71 @@
+import numpy as np
+from scipy import sparse as sp
+from scipy.integrate import solve_ivp
+from qutip import Qobj
+from pauli_sum import PauliSum
+from exact_diagonalization import hamiltonianMatrix
+from noise_model import dissipatorAction
+
+'''
+Lindblad dynamics in the interaction picture of the Hamiltonian.
+
+With H = V diag(E) V^dagger, rho is written in the eigenbasis and the free evolution is removed,
+rho_I(t)_jk = e^{i(E_j-E_k)t} (V^dagger rho(t) V)_jk. Only the dissipator is left in
+d rho_I/dt = e^{iHt} D[rho(t)] e^{-iHt},
+which changes rho_I on the slow time scale 1/kappa, so the adaptive integrator takes steps set by the noise instead of the
+Bohr frequencies of H. The Hamiltonian passed in is the noisy one, so the systematic error is removed exactly as well.
+'''
+
+def hamiltonianEigenbasis(hamiltonian,n):
+    '''
+    Return the eigenvalues E of the Hamiltonian and its eigenvectors V (as columns).
+    '''
+    if isinstance(hamiltonian,(dict,PauliSum)):
+        hamiltonian=hamiltonianMatrix(hamiltonian,n)
+    elif sp.issparse(hamiltonian):
+        hamiltonian=hamiltonian.toarray()
+    return np.linalg.eigh(hamiltonian)
+
+def interactionSignal(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,deltaT,L,rtol=1e-10,atol=1e-12,method='DOP853'):
+    '''
+    Return tlist and the signal <2|phi_b><phi_a|>(t) started from (|phi_a>+|phi_b>)/sqrt(2), integrated with
+    scipy.integrate.solve_ivp in the interaction picture of the noisy Hamiltonian. Same arguments as utils.simulateSignal
+    except liouvillian.
+
+    Parameters
+    ----------
+    rtol, atol: tolerances of solve_ivp.
+    method: integration method of solve_ivp.
+    '''
+    tlist=np.linspace(0,L*deltaT,L+1)
+    eigenvalues,eigenvectors=hamiltonianEigenbasis(noisyHamiltonian,n)
+    d=len(eigenvalues)
+    collapseMatrices=[sp.csr_matrix(C.data if isinstance(C,Qobj) else C) for C in collapseOperators]
+    anticommutator=sp.csr_matrix((d,d),dtype=complex)
+    for C in collapseMatrices:
+        anticommutator=anticommutator+0.5*(C.conj().T@C)
+    anticommutator=anticommutator.tocsr()
+
+    braA=eigenvectors.conj().T@np.asarray(phiA,dtype=complex).reshape(-1)
+    ketB=eigenvectors.conj().T@np.asarray(phiB,dtype=complex).reshape(-1)
+    psi0=(braA+ketB)/np.sqrt(2)
+    rho0=np.outer(psi0,psi0.conj())
+
+    def derivative(t,y):
+        # Back to the computational basis, where the collapse operators are sparse, and forth again: four dense products.
+        phases=np.exp(-1.j*eigenvalues*t)
+        rho=eigenvectors@(phases[:,None]*y.reshape(d,d)*phases.conj()[None,:])@eigenvectors.conj().T
+        drho=eigenvectors.conj().T@dissipatorAction(rho,collapseMatrices,anticommutator)@eigenvectors
+        return (phases.conj()[:,None]*drho*phases[None,:]).reshape(-1)
+
+    result=solve_ivp(derivative,(0,tlist[-1]),rho0.reshape(-1),method=method,t_eval=tlist,rtol=rtol,atol=atol)
+    if not result.success:
+        raise RuntimeError("Interaction picture integration failed: "+result.message)
+
+    # 2<phi_a|rho(t)|phi_b> = 2 sum_jk conj(a_j) e^{-i(E_j-E_k)t} rho_I(t)_jk b_k
+    weights=2*np.outer(braA.conj(),ketB)
+    signal=np.empty(L+1,dtype=complex)
+    for k,t in enumerate(tlist):
+        phases=np.exp(-1.j*eigenvalues*t)
+        signal[k]=np.sum(weights*phases[:,None]*result.y[:,k].reshape(d,d)*phases.conj()[None,:])
+    return tlist,signal
@@ -0,0 +1,127 @@
+import numpy as np
+from matrix_free import MatrixFreeLindbladian
+
+'''
+Rank-adaptive low-rank evolution of the density matrix for weak noise.
+
+rho = U S U^dagger with U a 2^n x r isometry and S a Hermitian r x r matrix. Every step is one step of the rank-adaptive
+basis-update & Galerkin (BUG) integrator of Ceruti, Kusch and Lubich:
+1. K-step: K = rho U0 solves dK/dt = L[K U0^dagger] U0 from K(0) = U0 S0 (RK4, d x r arrays only).
+2. The basis is augmented, U = orth([K(h), U0]), of rank at most 2r.
+3. S-step: dS/dt = U^dagger L[U S U^dagger] U from U^dagger U0 S0 U0^dagger U, a Lindblad equation on 2r x 2r matrices (RK4).
+4. S is diagonalized and truncated to the smallest rank whose discarded |eigenvalues| sum to at most tol*h.
+rho is Hermitian, so the L-step of the BUG integrator is the K-step again. The rank grows only when the discarded weight
+would exceed tol, so memory and cost are O(r 2^n) instead of O(4^n). The Hamiltonian acts matrix-free, see matrix_free.py.
+'''
+
+def _projectedGenerators(lindbladian:MatrixFreeLindbladian,U):
+    '''
+    Return U^dagger (-iH - 1/2 sum C^dagger C) U and [U^dagger C_k U] for an isometry U.
+    '''
+    A=-1.j*(U.conj().T@lindbladian.hamiltonianAction(U))-U.conj().T@(lindbladian.anticommutator@U)
+    return A,[U.conj().T@(C@U) for C in lindbladian.collapseMatrices]
+
+def kStepDerivative(lindbladian:MatrixFreeLindbladian,K,B,D):
+    '''
+    Return L[K U0^dagger] U0 = (-iH - 1/2 sum C^dagger C) K + K B + sum_k (C_k K) D_k with B and D_k projected on U0.
+    '''
+    dK=-1.j*lindbladian.hamiltonianAction(K)-lindbladian.anticommutator@K+K@B
+    for C,Dk in zip(lindbladian.collapseMatrices,D):
+        dK+=(C@K)@Dk
+    return dK
+
+def sStepDerivative(A,collapseProjections:list,S):
+    '''
+    Return A S + S A^dagger + sum_k C_k S C_k^dagger, the Lindbladian projected on U.
+    '''
+    dS=A@S
+    dS=dS+dS.conj().T
+    for C in collapseProjections:
+        dS+=C@S@C.conj().T
+    return dS
+
+def _rk4(derivative,X,h,steps):
+    step=h/steps
+    for _ in range(steps):
+        k1=derivative(X)
+        k2=derivative(X+0.5*step*k1)
+        k3=derivative(X+0.5*step*k2)
+        k4=derivative(X+step*k3)
+        X=X+step/6*(k1+2*k2+2*k3+k4)
+    return X
+
+def lowRankStep(lindbladian:MatrixFreeLindbladian,U,S,h,tol=1e-8,maxRank=None,rk4Steps=1):
+    '''
+    Return (U, S, discarded weight) after one rank-adaptive BUG step of size h.
+
+    Parameters
+    ----------
+    tol: largest sum of discarded |eigenvalues| of S.
+    maxRank: upper bound of the rank.
+    rk4Steps: # of RK4 steps of the K-step and of the S-step.
+    '''
+    A0,C0=_projectedGenerators(lindbladian,U)
+    # K U0^dagger (-iH - 1/2 sum C^dagger C)^dagger U0 = K A0^dagger, C_k^dagger projected: (U0^dagger C_k U0)^dagger
+    B=A0.conj().T
+    D=[C.conj().T for C in C0]
+    K=_rk4(lambda K: kStepDerivative(lindbladian,K,B,D),U@S,h,rk4Steps)
+    Uhat,_=np.linalg.qr(np.hstack([K,U]))
+    overlap=Uhat.conj().T@U
+    Shat=overlap@S@overlap.conj().T
+    A,C=_projectedGenerators(lindbladian,Uhat)
+    Shat=_rk4(lambda S: sStepDerivative(A,C,S),Shat,h,rk4Steps)
+    eigenvalues,eigenvectors=np.linalg.eigh(0.5*(Shat+Shat.conj().T))
+    order=np.argsort(-np.abs(eigenvalues))
+    eigenvalues=eigenvalues[order]
+    eigenvectors=eigenvectors[:,order]
+    # smallest rank with sum of the discarded |eigenvalues| <= tol
+    tail=np.concatenate([np.cumsum(np.abs(eigenvalues)[::-1])[::-1],[0]])
+    rank=max(1,int(np.argmax(tail<=tol)))
+    if maxRank is not None:
+        rank=min(rank,maxRank)
+    discarded=tail[rank]
+    return Uhat@eigenvectors[:,:rank],np.diag(eigenvalues[:rank]).astype(complex),discarded
+
+def lowRankEvolution(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,deltaT,L,tol=1e-8,maxRank=None,stepsPerDeltaT=4,rk4Steps=None):
+    '''
+    Return tlist, the signal 2<phi_a|rho(t)|phi_b> started from (|phi_a>+|phi_b>)/sqrt(2), the rank of rho(t) and the total
+    discarded weight.
+
+    Parameters
+    ----------
+    tol: discarded weight per unit time, i.e. every step of size h discards at most tol*h (see lowRankStep).
+    maxRank: upper bound of the rank.
+    stepsPerDeltaT: # of BUG steps per deltaT.
+    rk4Steps: # of RK4 steps of every K- and S-step. Default: such that h ||L|| <= 0.5 for the bound of MatrixFreeLindbladian.normBound.
+    other parameters are the same as utils.simulateSignal.
+    '''
+    tlist=np.linspace(0,L*deltaT,L+1)
+    lindbladian=MatrixFreeLindbladian(noisyHamiltonian,collapseOperators,n)
+    h=deltaT/stepsPerDeltaT
+    if rk4Steps is None:
+        rk4Steps=max(1,int(np.ceil(2*h*lindbladian.normBound())))
+    phiA=np.asarray(phiA,dtype=complex).reshape(-1)
+    phiB=np.asarray(phiB,dtype=complex).reshape(-1)
+    psi0=(phiA+phiB)/np.sqrt(2)
+    U=(psi0/np.linalg.norm(psi0)).reshape(-1,1)
+    S=np.array([[np.vdot(psi0,psi0)]],dtype=complex)
+    signal=np.empty(L+1,dtype=complex)
+    ranks=np.empty(L+1,dtype=int)
+    discarded=0
+    signal[0]=2*(phiA.conj()@U)@S@(U.conj().T@phiB)
+    ranks[0]=1
+    for k in range(1,L+1):
+        for _ in range(stepsPerDeltaT):
+            U,S,weight=lowRankStep(lindbladian,U,S,h,tol*h,maxRank,rk4Steps)
+            discarded+=weight
+        signal[k]=2*(phiA.conj()@U)@S@(U.conj().T@phiB)
+        ranks[k]=U.shape[1]
+    return tlist,signal,ranks,discarded
+
+def lowRankSignal(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,deltaT,L,tol=1e-8,maxRank=None,stepsPerDeltaT=4):
+    '''
+    Return tlist and the signal <2|phi_b><phi_a|>(t) from lowRankEvolution. Same arguments as utils.simulateSignal except
+    liouvillian.
+    '''
+    tlist,signal,ranks,discarded=lowRankEvolution(n,noisyHamiltonian,phiA,phiB,collapseOperators,deltaT,L,tol,maxRank,stepsPerDeltaT)
+    return tlist,signal
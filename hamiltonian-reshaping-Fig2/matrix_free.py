@@ -0,0 +1,180 @@
+import numpy as np
+from scipy import sparse as sp
+from scipy.linalg import expm
+from qutip import Qobj
+from pauli_sum import PauliSum,popcount
+from noise_model import dissipatorAction
+
+'''
+Matrix-free Lindbladian action on the 2^n x 2^n density matrix.
+
+No superoperator (4^n x 4^n) and no Hamiltonian matrix are built. A Pauli string with bitmasks (x,z) acts on rows as
+(P rho)[j,:] = i^{|x&z|} (-1)^{|z&(j^x)|} rho[j^x,:], a bit-permuted and phase-multiplied slice of rho. Terms with the same
+X mask share the permutation, so H rho = sum_x D_x * rho[j^x,:] with one diagonal D_x per distinct X mask. The local collapse
+operators are applied as sparse matrices (see noise_model.dissipatorAction).
+
+rho stays Hermitian, so -i[H,rho] = -i(H rho - (H rho)^dagger) only needs H rho. The integrators below (Krylov exponential and
+RK4) only call MatrixFreeLindbladian.apply, so the peak memory is a few copies of rho: krylovDimension+2 for 'krylov',
+about 6 for 'rk4'.
+'''
+
+class MatrixFreeLindbladian:
+    '''
+    Action of -i[H, . ] + sum_k D[C_k] on a Hermitian density matrix.
+
+    Parameters
+    ----------
+    hamiltonian: `dict` or `PauliSum`.
+    collapseOperators: a list of (already scaled) collapse operators as `Qobj` or sparse matrices.
+    n: # of qubits.
+
+    Usage
+    ----------
+    lindbladian=MatrixFreeLindbladian(noisyHamiltonian,collapseOperators,n)
+    lindbladian.apply(rho)   # L[rho] as a 2^n x 2^n array
+    '''
+    def __init__(self,hamiltonian,collapseOperators:list,n):
+        if not isinstance(hamiltonian,PauliSum):
+            hamiltonian=PauliSum.fromDict(hamiltonian,n)
+        hamiltonian=hamiltonian.simplify()
+        self.n=n
+        d=2**n
+        rows=np.arange(d,dtype=np.uint64)
+        self.permutations=[]
+        self.diagonals=[]
+        for x in np.unique(hamiltonian.xMasks):
+            terms=hamiltonian.xMasks==x
+            source=rows^x
+            diagonal=np.zeros(d,dtype=complex)
+            for z,c in zip(hamiltonian.zMasks[terms],hamiltonian.coefficients[terms]):
+                diagonal+=c*(1.j**(popcount(x&z)%4))*(1-2*(popcount(z&source)&1))
+            self.permutations.append(None if x==0 else source.astype(np.int64))
+            self.diagonals.append(diagonal)
+        self.pauliNorm=np.sum(np.abs(hamiltonian.coefficients))
+        self.collapseMatrices=[sp.csr_matrix(C.data if isinstance(C,Qobj) else C) for C in collapseOperators]
+        self.anticommutator=sp.csr_matrix((d,d),dtype=complex)
+        for C in self.collapseMatrices:
+            self.anticommutator=self.anticommutator+0.5*(C.conj().T@C)
+        self.anticommutator=self.anticommutator.tocsr()
+        self.collapseNorm=sum(sp.linalg.norm(C,1)*sp.linalg.norm(C,np.inf) for C in self.collapseMatrices)
+
+    def hamiltonianAction(self,rho):
+        '''
+        Return H rho.
+        '''
+        result=np.zeros_like(rho,dtype=complex)
+        for permutation,diagonal in zip(self.permutations,self.diagonals):
+            result+=diagonal[:,None]*(rho if permutation is None else rho[permutation,:])
+        return result
+
+    def apply(self,rho):
+        '''
+        Return L[rho] for a Hermitian rho.
+        '''
+        X=self.hamiltonianAction(rho)
+        drho=-1.j*(X-X.conj().T)
+        if len(self.collapseMatrices)>0:
+            drho+=dissipatorAction(rho,self.collapseMatrices,self.anticommutator)
+        return drho
+
+    def normBound(self):
+        '''
+        Return an upper bound of the norm of L, 2 sum_t |c_t| + 2 sum_k ||C_k||^2.
+        '''
+        return 2*self.pauliNorm+2*self.collapseNorm
+
+def krylovStep(apply,rho,tauMax,krylovDimension=20,tol=1e-10):
+    '''
+    Return (tau, exp(tau L) rho) with tau<=tauMax, computed in the Krylov space of L and rho (Arnoldi).
+
+    The basis does not depend on tau, so tau is halved until the error estimate
+    beta h_{m+1,m} |(exp(tau H_m))_{m,1}| is below tol*||rho||.
+    Hermitian matrices form a real vector space on which L is real, so the Arnoldi coefficients are real.
+    '''
+    beta=np.linalg.norm(rho)
+    if beta==0:
+        return tauMax,rho
+    basis=[rho/beta]
+    H=np.zeros((krylovDimension+1,krylovDimension))
+    m=krylovDimension
+    breakdown=False
+    for j in range(krylovDimension):
+        w=apply(basis[j])
+        for i in range(j+1):
+            H[i,j]=np.real(np.vdot(basis[i],w))
+            w-=H[i,j]*basis[i]
+        H[j+1,j]=np.linalg.norm(w)
+        if H[j+1,j]<=1e-12*max(1,np.abs(H[j,j])):
+            m=j+1
+            breakdown=True
+            break
+        basis.append(w/H[j+1,j])
+    tau=tauMax
+    while True:
+        coefficients=expm(tau*H[:m,:m])[:,0]
+        error=0 if breakdown else beta*H[m,m-1]*np.abs(coefficients[m-1])
+        if error<=tol*beta:
+            break
+        tau/=2
+    result=coefficients[0]*basis[0]
+    for i in range(1,m):
+        result+=coefficients[i]*basis[i]
+    return tau,beta*result
+
+def rk4Step(apply,rho,h):
+    '''
+    Return rho advanced by one classical Runge-Kutta step of size h.
+    '''
+    k1=apply(rho)
+    k2=apply(rho+0.5*h*k1)
+    k3=apply(rho+0.5*h*k2)
+    k4=apply(rho+h*k3)
+    return rho+h/6*(k1+2*k2+2*k3+k4)
+
+def matrixFreePropagate(lindbladian:MatrixFreeLindbladian,rho0,observable,deltaT,L,method='krylov',krylovDimension=20,tol=1e-10,stepsPerDeltaT=None):
+    '''
+    Return observable(rho(k deltaT)) for k=0,1,...,L.
+
+    Parameters
+    ----------
+    observable: function of rho.
+    method: 'krylov' for adaptive Krylov exponential steps (tol is the relative error per step), 'rk4' for fixed RK4 steps.
+    stepsPerDeltaT: # of RK4 steps per deltaT. Default: such that h ||L|| <= 0.5 for the bound of MatrixFreeLindbladian.normBound.
+    '''
+    signal=np.empty(L+1,dtype=complex)
+    rho=np.array(rho0,dtype=complex)
+    signal[0]=observable(rho)
+    if method=='krylov':
+        tau=deltaT
+        for k in range(1,L+1):
+            remaining=deltaT
+            while remaining>1e-14*deltaT:
+                tau,rho=krylovStep(lindbladian.apply,rho,min(2*tau,remaining),krylovDimension,tol)
+                remaining-=tau
+            signal[k]=observable(rho)
+    elif method=='rk4':
+        if stepsPerDeltaT is None:
+            stepsPerDeltaT=max(1,int(np.ceil(2*deltaT*lindbladian.normBound())))
+        h=deltaT/stepsPerDeltaT
+        for k in range(1,L+1):
+            for _ in range(stepsPerDeltaT):
+                rho=rk4Step(lindbladian.apply,rho,h)
+            signal[k]=observable(rho)
+    else:
+        raise ValueError("Unknown matrix-free method "+str(method)+", expected 'krylov' or 'rk4'.")
+    return signal
+
+def matrixFreeSignal(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,deltaT,L,method='krylov',krylovDimension=20,tol=1e-10):
+    '''
+    Return tlist and the signal <2|phi_b><phi_a|>(t) started from (|phi_a>+|phi_b>)/sqrt(2), integrated with the matrix-free
+    Lindbladian action. Same arguments as utils.simulateSignal; a precomputed Lindbladian is not supported, since building it
+    is what this solver avoids.
+    '''
+    tlist=np.linspace(0,L*deltaT,L+1)
+    lindbladian=MatrixFreeLindbladian(noisyHamiltonian,collapseOperators,n)
+    phiA=np.asarray(phiA,dtype=complex).reshape(-1)
+    phiB=np.asarray(phiB,dtype=complex).reshape(-1)
+    psi0=(phiA+phiB)/np.sqrt(2)
+    braA=2*phiA.conj()
+    signal=matrixFreePropagate(lindbladian,np.outer(psi0,psi0.conj()),lambda rho: braA@(rho@phiB),deltaT,L,method=method,krylovDimension=krylovDimension,tol=tol)
+    return tlist,signal
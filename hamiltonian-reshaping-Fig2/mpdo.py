@@ -0,0 +1,508 @@
+import warnings
+import numpy as np
+from scipy.linalg import expm,svd
+from scipy.sparse.linalg import LinearOperator,eigsh
+from qutip import Qobj
+from pauli_sum import PauliSum,masksToPauliString
+from models import compileModelDict
+
+'''
+Tensor network backend for nearest-neighbour Hamiltonians with local noise (e.g. models.ringModel, transversalXYZIsingModel).
+
+States are matrix product states (MPS), lists of tensors of shape (left bond, 2, right bond). The density matrix is kept as a
+matrix product density operator (MPDO): the MPS of vec(rho) with local dimension 4, local index s*2+s' for rho_{s s'}.
+It is evolved with second-order TEBD, exp(L dt) ~ prod_bonds exp(L_bond dt/2) prod_reversed exp(L_bond dt/2). Every site term
+(fields, dissipators) is attached to one bond. The ring bond (n-1,0) is applied after moving site n-1 next to site 0 with
+swap gates. After every gate the bond is truncated to maxBond singular values, dropping those below cutoff (relative).
+
+The eigenstates |phi_a>, |phi_b> are found with two-site DMRG on the matrix product operator (MPO) of the Pauli dict.
+Excited states use a penalty w|k><k| on the levels already found.
+'''
+
+PAULI_MATRICES={
+    'I':np.eye(2,dtype=complex),
+    'X':np.array([[0,1],[1,0]],dtype=complex),
+    'Y':np.array([[0,-1.j],[1.j,0]],dtype=complex),
+    'Z':np.array([[1,0],[0,-1]],dtype=complex),
+}
+
+def _pauliTerms(hamiltonian,n):
+    '''
+    Return the list of (Pauli string, coefficient) of a `dict`, a `PauliSum` or a model specification (see
+    models.compileModel), which is not limited to 64 qubits.
+    '''
+    if isinstance(hamiltonian,list):
+        return list(compileModelDict(hamiltonian,n).items())
+    if isinstance(hamiltonian,PauliSum):
+        hamiltonian=hamiltonian.simplify()
+        return [(masksToPauliString(x,z,n),c) for x,z,c in zip(hamiltonian.xMasks,hamiltonian.zMasks,hamiltonian.coefficients)]
+    return list(hamiltonian.items())
+
+def _truncatedSVD(theta,maxBond,cutoff):
+    '''
+    Return U, S, V^dagger of a matrix truncated to at most maxBond singular values above cutoff*S[0], and the discarded weight
+    sum(S_discarded^2)/sum(S^2).
+    '''
+    try:
+        U,S,Vh=svd(theta,full_matrices=False)
+    except np.linalg.LinAlgError:
+        U,S,Vh=svd(theta,full_matrices=False,lapack_driver='gesvd')
+    keep=max(1,min(maxBond,int(np.sum(S>cutoff*S[0])) if S[0]>0 else 1))
+    total=np.sum(S**2)
+    discarded=np.sum(S[keep:]**2)/total if total>0 else 0
+    return U[:,:keep],S[:keep],Vh[:keep],discarded
+
+# ---------------------------------------------------------------- MPS
+
+def vectorToMPS(state,n,maxBond=None,cutoff=1e-14):
+    '''
+    Return the MPS of a dense state vector by successive SVDs (left-normalized, norm in the last tensor).
+    '''
+    maxBond=2**n if maxBond is None else maxBond
+    tensors=[]
+    rest=np.asarray(state,dtype=complex).reshape(1,-1)
+    for i in range(n-1):
+        left=rest.shape[0]
+        U,S,Vh,_=_truncatedSVD(rest.reshape(left*2,-1),maxBond,cutoff)
+        tensors.append(U.reshape(left,2,-1))
+        rest=S[:,None]*Vh
+    tensors.append(rest.reshape(rest.shape[0],2,1))
+    return tensors
+
+def mpsToVector(tensors):
+    '''
+    Return the dense vector of an MPS (small n only).
+    '''
+    vector=tensors[0]
+    for A in tensors[1:]:
+        vector=np.tensordot(vector,A,axes=(-1,0))
+    return vector.reshape(-1)
+
+def mpsOverlap(bra,ket):
+    '''
+    Return <bra|ket>.
+    '''
+    environment=np.ones((1,1),dtype=complex)
+    for A,B in zip(bra,ket):
+        environment=np.einsum('ab,asc,bsd->cd',environment,A.conj(),B)
+    return environment[0,0]
+
+def mpsSum(first,second,coefficients=(1,1),maxBond=64,cutoff=1e-12):
+    '''
+    Return the compressed MPS of c1|first> + c2|second> (direct sum of the tensors, then an SVD sweep).
+    '''
+    n=len(first)
+    tensors=[]
+    for i,(A,B) in enumerate(zip(first,second)):
+        if i==0:
+            tensors.append(np.concatenate([coefficients[0]*A,coefficients[1]*B],axis=2))
+        elif i==n-1:
+            tensors.append(np.concatenate([A,B],axis=0))
+        else:
+            C=np.zeros((A.shape[0]+B.shape[0],A.shape[1],A.shape[2]+B.shape[2]),dtype=complex)
+            C[:A.shape[0],:,:A.shape[2]]=A
+            C[A.shape[0]:,:,A.shape[2]:]=B
+            tensors.append(C)
+    if n==1:
+        tensors=[coefficients[0]*first[0]+coefficients[1]*second[0]]
+    return compressMPS(tensors,maxBond,cutoff)[0]
+
+def rightCanonicalize(tensors):
+    '''
+    Bring an MPS (list of tensors, modified in place) to right-canonical form by a right-to-left QR sweep. The norm ends up in
+    the first tensor.
+    '''
+    for i in range(len(tensors)-1,0,-1):
+        left,d,right=tensors[i].shape
+        Q,R=np.linalg.qr(tensors[i].reshape(left,d*right).T)
+        tensors[i]=Q.T.reshape(-1,d,right)
+        tensors[i-1]=np.tensordot(tensors[i-1],R.T,axes=(2,0))
+    return tensors
+
+def compressMPS(tensors,maxBond,cutoff=1e-12,rightCanonical=False):
+    '''
+    Return the MPS truncated to maxBond (left-normalized, norm in the last tensor) and the total discarded weight.
+    A right-to-left QR sweep brings it to canonical form first (skipped if rightCanonical), so every truncation is optimal.
+    '''
+    tensors=[np.array(A,dtype=complex) for A in tensors]
+    n=len(tensors)
+    if not rightCanonical:
+        rightCanonicalize(tensors)
+    discarded=0
+    for i in range(n-1):
+        left,d,right=tensors[i].shape
+        U,S,Vh,weight=_truncatedSVD(tensors[i].reshape(left*d,right),maxBond,cutoff)
+        discarded+=weight
+        tensors[i]=U.reshape(left,d,-1)
+        tensors[i+1]=np.tensordot(S[:,None]*Vh,tensors[i+1],axes=(1,0))
+    return tensors,discarded
+
+# ---------------------------------------------------------------- MPO and DMRG
+
+def _termsMPO(terms,n):
+    '''
+    Return the uncompressed MPO of a list of (Pauli string, coefficient), one bond index per term, in the MPS form of pauliSumToMPO.
+    '''
+    tensors=[]
+    for i in range(n):
+        W=np.zeros((1 if i==0 else len(terms),4,1 if i==n-1 else len(terms)),dtype=complex)
+        for t,(pauliString,c) in enumerate(terms):
+            local=PAULI_MATRICES[pauliString[i]].reshape(4)*(c if i==0 else 1)
+            W[0 if i==0 else t,:,0 if i==n-1 else t]=local
+        tensors.append(W)
+    return tensors
+
+def pauliSumToMPO(hamiltonian,n,maxBond=256,cutoff=1e-13,chunk=32):
+    '''
+    Return the MPO of a Pauli dict, `PauliSum` or model specification as a list of tensors (left bond, out, in, right bond),
+    compressed by SVD.
+    The terms are added chunk at a time with mpsSum, so the uncompressed bonds stay at most chunk+maxBond wide for any number
+    of terms.
+    '''
+    terms=_pauliTerms(hamiltonian,n)
+    tensors=_termsMPO(terms[:chunk],n)
+    for start in range(chunk,len(terms),chunk):
+        tensors=mpsSum(tensors,_termsMPO(terms[start:start+chunk],n),maxBond=maxBond,cutoff=cutoff)
+    tensors,_=compressMPS(tensors,maxBond,cutoff)
+    return [W.reshape(W.shape[0],2,2,W.shape[2]) for W in tensors]
+
+def _randomMPS(n,bondDimension,rng):
+    dimensions=[min(bondDimension,2**i,2**(n-i)) for i in range(n+1)]
+    tensors=[rng.normal(size=(dimensions[i],2,dimensions[i+1]))+1.j*rng.normal(size=(dimensions[i],2,dimensions[i+1])) for i in range(n)]
+    tensors,_=compressMPS(tensors,bondDimension)
+    tensors[-1]/=np.linalg.norm(tensors[-1])
+    return tensors
+
+def dmrg(mpo,n,bondDimension=32,sweeps=8,penaltyStates=(),penalty=None,cutoff=1e-12,seed=None,tol=1e-10):
+    '''
+    Return the energy and the MPS of the lowest eigenstate of an MPO found by two-site DMRG.
+
+    Parameters
+    ----------
+    bondDimension: maximal bond dimension of the MPS.
+    sweeps: # of left-right sweeps.
+    penaltyStates: MPS of lower levels, projected out with the energy penalty w|k><k|.
+    penalty: w, larger than the spectral width of the MPO, see lowLyingStates.
+    '''
+    rng=np.random.default_rng(seed)
+    psi=_randomMPS(n,bondDimension,rng)
+    if penalty is None and len(penaltyStates)>0:
+        raise ValueError("The penalty must be given together with penaltyStates.")
+    rightCanonicalize(psi)
+    psi[0]/=np.linalg.norm(psi[0])
+
+    def leftEnvironment(E,A,W):
+        return np.einsum('awb,asc,wstx,btd->cxd',E,A.conj(),W,A,optimize=True)
+    def rightEnvironment(E,A,W):
+        return np.einsum('cxd,asc,wstx,btd->awb',E,A.conj(),W,A,optimize=True)
+    def leftOverlap(E,K,A):
+        return np.einsum('ab,asc,bsd->cd',E,K.conj(),A)
+    def rightOverlap(E,K,A):
+        return np.einsum('cd,asc,bsd->ab',E,K.conj(),A)
+
+    left=[None]*(n+1)
+    right=[None]*(n+1)
+    left[0]=np.ones((1,1,1),dtype=complex)
+    right[n]=np.ones((1,1,1),dtype=complex)
+    leftO=[[None]*(n+1) for _ in penaltyStates]
+    rightO=[[None]*(n+1) for _ in penaltyStates]
+    for k in range(len(penaltyStates)):
+        leftO[k][0]=np.ones((1,1),dtype=complex)
+        rightO[k][n]=np.ones((1,1),dtype=complex)
+    for i in range(n-1,0,-1):
+        right[i]=rightEnvironment(right[i+1],psi[i],mpo[i])
+        for k,K in enumerate(penaltyStates):
+            rightO[k][i]=rightOverlap(rightO[k][i+1],K[i],psi[i])
+
+    energy=None
+    def optimize(i,direction):
+        theta=np.tensordot(psi[i],psi[i+1],axes=(2,0))
+        shape=theta.shape
+        L,W1,W2,R=left[i],mpo[i],mpo[i+1],right[i+2]
+        projections=[np.einsum('ab,asc,ctd,de->bste',leftO[k][i],K[i].conj(),K[i+1].conj(),rightO[k][i+2],optimize=True).conj() for k,K in enumerate(penaltyStates)]
+        def matvec(v):
+            v=v.reshape(shape)
+            result=np.tensordot(L,v,axes=(2,0))                          # a w t v d
+            result=np.tensordot(result,W1,axes=([1,2],[0,2]))            # a v d s x
+            result=np.tensordot(result,W2,axes=([4,1],[0,2]))            # a d s u y
+            result=np.tensordot(result,R,axes=([4,1],[1,2]))             # a s u c
+            for p in projections:
+                result=result+penalty*p*np.vdot(p,v)
+            return result.reshape(-1)
+        dimension=theta.size
+        if dimension<=64:
+            matrix=np.array([matvec(e) for e in np.eye(dimension,dtype=complex)]).T
+            values,vectors=np.linalg.eigh(0.5*(matrix+matrix.conj().T))
+            value,vector=values[0],vectors[:,0]
+        else:
+            operator=LinearOperator((dimension,dimension),matvec=matvec,dtype=complex)
+            values,vectors=eigsh(operator,k=1,which='SA',v0=theta.reshape(-1),tol=tol)
+            value,vector=values[0],vectors[:,0]
+        U,S,Vh,_=_truncatedSVD(vector.reshape(shape[0]*2,2*shape[3]),bondDimension,cutoff)
+        S=S/np.linalg.norm(S)
+        if direction>0:
+            psi[i]=U.reshape(shape[0],2,-1)
+            psi[i+1]=(S[:,None]*Vh).reshape(-1,2,shape[3])
+            left[i+1]=leftEnvironment(left[i],psi[i],mpo[i])
+            for k,K in enumerate(penaltyStates):
+                leftO[k][i+1]=leftOverlap(leftO[k][i],K[i],psi[i])
+        else:
+            psi[i]=(U*S[None,:]).reshape(shape[0],2,-1)
+            psi[i+1]=Vh.reshape(-1,2,shape[3])
+            right[i+1]=rightEnvironment(right[i+2],psi[i+1],mpo[i+1])
+            for k,K in enumerate(penaltyStates):
+                rightO[k][i+1]=rightOverlap(rightO[k][i+2],K[i+1],psi[i+1])
+        return value
+
+    for _ in range(sweeps):
+        for i in range(n-1):
+            energy=optimize(i,1)
+        for i in range(n-2,-1,-1):
+            energy=optimize(i,-1)
+    return np.real(energy),psi
+
+def lowLyingStates(hamiltonian,n,levels=2,bondDimension=32,sweeps=8,seed=None):
+    '''
+    Return the energies and the MPS of the `levels` lowest eigenstates of a Pauli dict, by DMRG with penalties.
+    '''
+    mpo=pauliSumToMPO(hamiltonian,n)
+    # 2 sum_t |c_t| bounds the spectral width of H
+    penalty=2*sum(np.abs(c) for pauliString,c in _pauliTerms(hamiltonian,n))+1
+    energies=[]
+    states=[]
+    seeds=np.random.SeedSequence(seed).spawn(levels)
+    for level in range(levels):
+        energy,psi=dmrg(mpo,n,bondDimension,sweeps,penaltyStates=states,penalty=penalty,seed=seeds[level])
+        # the penalty shifts the found levels up, so evaluate <H> without it
+        energies.append(np.real(mpoExpectation(mpo,psi)))
+        states.append(psi)
+    return np.array(energies),states
+
+def mpoExpectation(mpo,psi):
+    '''
+    Return <psi|H|psi>/<psi|psi>.
+    '''
+    E=np.ones((1,1,1),dtype=complex)
+    for A,W in zip(psi,mpo):
+        E=np.einsum('awb,asc,wstx,btd->cxd',E,A.conj(),W,A,optimize=True)
+    return E[0,0,0]/mpsOverlap(psi,psi)
+
+# ---------------------------------------------------------------- MPDO and TEBD
+
+def localCollapseOperator(collapseOperator,n,atol=1e-12):
+    '''
+    Return (site, 2x2 operator) of a collapse operator acting on a single qubit. A (site, operator) pair is returned as is,
+    a `Qobj` or matrix (small n only) is checked to be of the form I x ... x C_local x ... x I.
+    '''
+    if isinstance(collapseOperator,tuple):
+        return int(collapseOperator[0]),np.asarray(collapseOperator[1],dtype=complex)
+    matrix=collapseOperator.full() if isinstance(collapseOperator,Qobj) else np.asarray(collapseOperator.toarray() if hasattr(collapseOperator,'toarray') else collapseOperator)
+    for i in range(n):
+        local=np.einsum('aibajb->ij',matrix.reshape(2**i,2,2**(n-1-i),2**i,2,2**(n-1-i)))/2**(n-1)
+        if np.allclose(np.kron(np.kron(np.eye(2**i),local),np.eye(2**(n-1-i))),matrix,atol=atol):
+            return i,local
+    raise ValueError("The MPDO solver only supports collapse operators acting on a single qubit.")
+
+def _localSuperoperator(hamiltonian,dissipators,dimension):
+    '''
+    Return the superoperator -i[h, . ] + sum D[c] on a (dimension x dimension) rho, row-major vec index (s,s').
+    '''
+    identity=np.eye(dimension)
+    superoperator=-1.j*(np.kron(hamiltonian,identity)-np.kron(identity,hamiltonian.T))
+    for c in dissipators:
+        cdagc=c.conj().T@c
+        superoperator=superoperator+np.kron(c,c.conj())-0.5*np.kron(cdagc,identity)-0.5*np.kron(identity,cdagc.T)
+    return superoperator
+
+def bondGenerators(hamiltonian,collapseOperators:list,n):
+    '''
+    Return {(i,j): 16x16 generator} of the two-site Lindbladian terms in the local basis (s_i s_i', s_j s_j').
+    hamiltonian is a Pauli dict, `PauliSum` or model specification (see models.compileModel, also above 64 qubits).
+    Site terms go to the bond (i,i+1) (the last site to (n-2,n-1)), and the ring bond is keyed (n-1,0).
+    '''
+    bondHamiltonians={}
+    siteHamiltonians=[np.zeros((2,2),dtype=complex) for _ in range(n)]
+    siteDissipators=[[] for _ in range(n)]
+    for pauliString,c in _pauliTerms(hamiltonian,n):
+        support=[k for k in range(n) if pauliString[k]!='I']
+        if len(support)==0:
+            continue
+        if len(support)==1:
+            siteHamiltonians[support[0]]=siteHamiltonians[support[0]]+c*PAULI_MATRICES[pauliString[support[0]]]
+            continue
+        if len(support)==2 and support[1]==support[0]+1:
+            bond=(support[0],support[1])
+        elif len(support)==2 and support==[0,n-1]:
+            bond=(n-1,0)
+        else:
+            raise ValueError("The MPDO solver only supports nearest-neighbour terms, got "+pauliString+".")
+        term=c*np.kron(PAULI_MATRICES[pauliString[bond[0]]],PAULI_MATRICES[pauliString[bond[1]]])
+        bondHamiltonians[bond]=bondHamiltonians.get(bond,0)+term
+    for C in collapseOperators:
+        site,local=localCollapseOperator(C,n)
+        siteDissipators[site].append(local)
+    for i in range(n-1):
+        bondHamiltonians.setdefault((i,i+1),np.zeros((4,4),dtype=complex))
+    identity=np.eye(2)
+    generators={}
+    for bond,h in bondHamiltonians.items():
+        h=np.array(h,dtype=complex)
+        dissipators=[]
+        for position,site in enumerate(bond):
+            if bond[1]==bond[0]+1 and (site==bond[0] or site==n-1):
+                h=h+(np.kron(siteHamiltonians[site],identity) if position==0 else np.kron(identity,siteHamiltonians[site]))
+                dissipators+=[np.kron(c,identity) if position==0 else np.kron(identity,c) for c in siteDissipators[site]]
+        superoperator=_localSuperoperator(h,dissipators,4)
+        # (s1 s2, s1' s2') -> (s1 s1', s2 s2')
+        generators[bond]=superoperator.reshape([2]*8).transpose(0,2,1,3,4,6,5,7).reshape(16,16)
+    return generators
+
+_SWAP=np.eye(16).reshape(4,4,4,4).transpose(1,0,2,3).reshape(16,16)
+
+class MPDO:
+    '''
+    Matrix product density operator, the MPS of vec(rho) with local dimension 4.
+
+    Parameters
+    ----------
+    tensors: list of (left bond, 4, right bond) tensors.
+    maxBond: maximal bond dimension kept after every gate.
+    cutoff: relative singular value cutoff.
+
+    Usage
+    ----------
+    rho=MPDO.fromPureState(psi,maxBond=64)
+    rho.applyGate(i,gate,direction)     # 16x16 gate on sites (i,i+1)
+    rho.matrixElement(bra,ket)          # <bra|rho|ket> for MPS bra, ket
+    rho.discardedWeight                 # total truncated weight
+    '''
+    def __init__(self,tensors,maxBond=64,cutoff=1e-10):
+        self.tensors=list(tensors)
+        self.maxBond=maxBond
+        self.cutoff=cutoff
+        self.discardedWeight=0
+
+    @classmethod
+    def fromPureState(cls,psi,maxBond=64,cutoff=1e-10):
+        '''
+        Return the MPDO of |psi><psi|, psi an MPS. The bond dimension is squared, then compressed to maxBond.
+        With psi right-canonical, the tensors A x conj(A) are right-canonical as well, so no QR sweep on the squared bonds is needed.
+        '''
+        psi=rightCanonicalize([np.array(A,dtype=complex) for A in psi])
+        tensors=[np.einsum('asb,ctd->acstbd',A,A.conj()).reshape(A.shape[0]**2,4,A.shape[2]**2) for A in psi]
+        tensors,discarded=compressMPS(tensors,maxBond,cutoff,rightCanonical=True)
+        rho=cls(tensors,maxBond,cutoff)
+        rho.discardedWeight=discarded
+        return rho
+
+    def applyGate(self,i,gate,direction=1):
+        '''
+        Apply a 16x16 gate on sites (i,i+1) and truncate the bond. direction=1 leaves the orthogonality center at i+1,
+        direction=-1 at i, which is where the next gate of a left-to-right or right-to-left sweep needs it.
+        '''
+        A,B=self.tensors[i],self.tensors[i+1]
+        theta=np.tensordot(A,B,axes=(2,0))
+        left,right=A.shape[0],B.shape[2]
+        theta=np.einsum('ij,ajb->aib',gate,theta.reshape(left,16,right))
+        U,S,Vh,weight=_truncatedSVD(theta.reshape(left*4,4*right),self.maxBond,self.cutoff)
+        self.discardedWeight+=weight
+        if direction>0:
+            self.tensors[i]=U.reshape(left,4,-1)
+            self.tensors[i+1]=(S[:,None]*Vh).reshape(-1,4,right)
+        else:
+            self.tensors[i]=(U*S[None,:]).reshape(left,4,-1)
+            self.tensors[i+1]=Vh.reshape(-1,4,right)
+
+    def canonicalize(self):
+        '''
+        Move the orthogonality center to the first site (right-to-left QR sweep).
+        '''
+        rightCanonicalize(self.tensors)
+
+    def matrixElement(self,bra,ket):
+        '''
+        Return <bra|rho|ket> for MPS bra and ket.
+        '''
+        environment=np.ones((1,1,1),dtype=complex)
+        for A,R,B in zip(bra,self.tensors,ket):
+            environment=np.tensordot(environment,A.conj(),axes=(0,0))                                    # w b s c
+            environment=np.tensordot(environment,R.reshape(R.shape[0],2,2,R.shape[2]),axes=([0,2],[0,1]))   # b c t y
+            environment=np.tensordot(environment,B,axes=([0,2],[0,1]))                                    # c y d
+        return environment[0,0,0]
+
+    def bondDimensions(self):
+        return [A.shape[2] for A in self.tensors[:-1]]
+
+def tebdStep(rho:MPDO,gates:dict,n):
+    '''
+    Apply one second-order TEBD step: the chain gates exp(L dt/2) from left to right, the ring gate exp(L dt), and the chain
+    gates exp(L dt/2) from right to left. The orthogonality center must be at site 0 and is returned there.
+    '''
+    for i in range(n-1):
+        rho.applyGate(i,gates[(i,i+1)],1)
+    if (n-1,0) in gates:
+        # bring site n-1 next to site 0, apply the ring gate on (0, n-1) and swap back
+        for i in range(n-2,0,-1):
+            rho.applyGate(i,_SWAP,-1)
+        rho.applyGate(0,gates[(n-1,0)],1)
+        for i in range(1,n-1):
+            rho.applyGate(i,_SWAP,1)
+    for i in range(n-2,-1,-1):
+        rho.applyGate(i,gates[(i,i+1)],-1)
+
+def mpdoEvolution(n,noisyHamiltonian,psiA,psiB,collapseOperators:list,deltaT,L,maxBond=64,cutoff=1e-10,stepsPerDeltaT=4):
+    '''
+    Return tlist, the signal 2<phi_a|rho(t)|phi_b> started from (|phi_a>+|phi_b>)/sqrt(2), and the discarded weight of the
+    MPDO after every time step.
+
+    Parameters
+    ----------
+    psiA, psiB: MPS of |phi_a> and |phi_b>, e.g. from lowLyingStates.
+    collapseOperators: single-qubit collapse operators, as `Qobj` or (site, 2x2 operator) pairs
+        (see noise_model.NoiseModel.localCollapseOperators).
+    maxBond: maximal bond dimension of the MPDO.
+    cutoff: relative singular value cutoff.
+    stepsPerDeltaT: # of TEBD steps per deltaT.
+    '''
+    tlist=np.linspace(0,L*deltaT,L+1)
+    dt=deltaT/stepsPerDeltaT
+    generators=bondGenerators(noisyHamiltonian,collapseOperators,n)
+    gates={bond:expm((dt if bond==(n-1,0) else dt/2)*generator) for bond,generator in generators.items()}
+    if (n-1,0) in gates:
+        # the ring generator acts on (s_{n-1}, s_0), the swapped sites are in the order (s_0, s_{n-1})
+        gates[(n-1,0)]=_SWAP@gates[(n-1,0)]@_SWAP
+    norm=np.sqrt(np.abs(mpsOverlap(psiA,psiA)))
+    psiA=[A/norm**(1/n) for A in psiA]
+    norm=np.sqrt(np.abs(mpsOverlap(psiB,psiB)))
+    psiB=[B/norm**(1/n) for B in psiB]
+    psi0=mpsSum(psiA,psiB,(1/np.sqrt(2),1/np.sqrt(2)),maxBond=max(maxBond,1))
+    rho=MPDO.fromPureState(psi0,maxBond,cutoff)
+    rho.canonicalize()
+    signal=np.empty(L+1,dtype=complex)
+    discardedWeights=np.empty(L+1)
+    signal[0]=2*rho.matrixElement(psiA,psiB)
+    discardedWeights[0]=rho.discardedWeight
+    for k in range(1,L+1):
+        for _ in range(stepsPerDeltaT):
+            tebdStep(rho,gates,n)
+        signal[k]=2*rho.matrixElement(psiA,psiB)
+        discardedWeights[k]=rho.discardedWeight
+    return tlist,signal,discardedWeights
+
+def mpdoSignal(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,deltaT,L,maxBond=64,cutoff=1e-10,stepsPerDeltaT=4,maxDiscardedWeight=1e-6):
+    '''
+    Return tlist and the signal <2|phi_b><phi_a|>(t) from mpdoEvolution. Same arguments as utils.simulateSignal except
+    liouvillian; phiA and phiB are MPS or dense vectors, which are converted to MPS.
+
+    Parameters
+    ----------
+    maxDiscardedWeight: a RuntimeWarning with the total discarded weight is issued if the truncation discards more than
+        this, e.g. when maxBond is too small for the evolution time. Use mpdoEvolution for the weight after every step.
+    other parameters are the same as mpdoEvolution.
+    '''
+    psiA=phiA if isinstance(phiA,list) else vectorToMPS(phiA,n)
+    psiB=phiB if isinstance(phiB,list) else vectorToMPS(phiB,n)
+    tlist,signal,discardedWeights=mpdoEvolution(n,noisyHamiltonian,psiA,psiB,collapseOperators,deltaT,L,maxBond,cutoff,stepsPerDeltaT)
+    if discardedWeights[-1]>maxDiscardedWeight:
+        warnings.warn("The MPDO truncation discarded a total weight of "+str(discardedWeights[-1])+" (maxBond="+str(maxBond)+"), the signal may be inaccurate.",RuntimeWarning)
+    return tlist,signal
@@ -0,0 +1,190 @@
+import numpy as np
+from scipy import sparse as sp
+from qutip import Qobj
+from pauli_sum import PauliSum,popcount,pauliStringToMasks
+from propagator import propagate
+
+'''
+Pauli transfer matrix (PTM) representation of Lindblad dynamics.
+
+A density matrix is expanded as rho = 1/2^n sum_P r_P P with real coefficients r_P = Tr(P rho), and a Hermiticity-preserving
+superoperator L becomes the real 4^n x 4^n matrix R_PQ = 1/2^n Tr(P L[Q]). The Pauli string with bitmasks (x,z) (see
+pauli_sum.py) has the index x*2^n+z.
+
+Every superoperator term of the form Q -> P_l Q P_r maps a Pauli string to a single Pauli string with a phase, so the PTM is
+assembled directly from the Pauli terms of the Hamiltonian and the Pauli decomposition of the collapse operators.
+For the reshaping method, conjugating the Hamiltonian by a Pauli string P is a sign flip of rows and columns,
+PTM(-i[PHP, . ]) = S PTM(-i[H, . ]) S with S = diag(+1 if Q commutes with P, -1 otherwise), see pauliConjugatePTM.
+'''
+
+def pauliIndices(n):
+    '''
+    Return the bitmasks (x,z) of all 4^n Pauli strings in index order.
+    '''
+    indices=np.arange(4**n,dtype=np.uint64)
+    return indices>>np.uint64(n),indices&np.uint64(2**n-1)
+
+def walshHadamard(v):
+    '''
+    Return the unnormalized Walsh-Hadamard transform along the last axis, w_z = sum_j (-1)^{|z&j|} v_j.
+    '''
+    v=np.array(v,dtype=np.result_type(v,float))
+    shape=v.shape[:-1]
+    d=v.shape[-1]
+    h=1
+    while h<d:
+        v=v.reshape(shape+(d//(2*h),2,h))
+        a=v[...,0,:].copy()
+        b=v[...,1,:].copy()
+        v[...,0,:]=a+b
+        v[...,1,:]=a-b
+        h*=2
+    return v.reshape(shape+(d,))
+
+def pauliExpectations(bra,ket,n):
+    '''
+    Return <bra|P|ket> for all 4^n Pauli strings P in index order.
+    P|j> = i^{|x&z|} (-1)^{|z&j|} |j^x>, so for every x the sum over j is a Walsh-Hadamard transform.
+    '''
+    d=2**n
+    bra=np.asarray(bra,dtype=complex).reshape(-1)
+    ket=np.asarray(ket,dtype=complex).reshape(-1)
+    columns=np.arange(d)
+    products=np.array([bra[columns^x].conj()*ket for x in range(d)])
+    x,z=pauliIndices(n)
+    return (1.j**(popcount(x&z)%4))*walshHadamard(products).reshape(-1)
+
+def pauliDecomposition(operator,n):
+    '''
+    Return the coefficients c_P = Tr(P C)/2^n of C = sum_P c_P P for all 4^n Pauli strings in index order.
+    '''
+    d=2**n
+    if isinstance(operator,Qobj):
+        operator=operator.full()
+    elif sp.issparse(operator):
+        operator=operator.toarray()
+    operator=np.asarray(operator,dtype=complex)
+    rows=np.arange(d)
+    # Tr(P C) = sum_k i^{|x&z|} (-1)^{|z&k|} C[k,k^x]
+    values=np.array([operator[rows,rows^x] for x in range(d)])
+    x,z=pauliIndices(n)
+    return (1.j**(popcount(x&z)%4))*walshHadamard(values).reshape(-1)/d
+
+def _multiply(x1,z1,x2,z2):
+    '''
+    Return (x,z,e) with P1 P2 = i^e P, P1=(x1,z1), P2=(x2,z2).
+    '''
+    x=x1^x2
+    z=z1^z2
+    e=popcount(x1&z1)+popcount(x2&z2)-popcount(x&z)+2*popcount(z1&x2)
+    return x,z,e%4
+
+def pauliSandwich(left,right,n):
+    '''
+    Return the target indices and the phases of Q -> P_l Q P_r for all 4^n Pauli strings Q in index order.
+
+    Parameters
+    ----------
+    left, right: (x,z) bitmasks of P_l and P_r.
+    '''
+    xq,zq=pauliIndices(n)
+    x1,z1,e1=_multiply(np.uint64(left[0]),np.uint64(left[1]),xq,zq)
+    x2,z2,e2=_multiply(x1,z1,np.uint64(right[0]),np.uint64(right[1]))
+    return (x2<<np.uint64(n)|z2).astype(np.int64),1.j**((e1+e2)%4)
+
+def _assemble(terms,n):
+    '''
+    Return the real PTM sum_k c_k (Q -> P_l Q P_r) from a list of terms (c_k, left, right).
+    '''
+    columns=np.arange(4**n,dtype=np.int64)
+    rows=[]
+    values=[]
+    for coefficient,left,right in terms:
+        target,phases=pauliSandwich(left,right,n)
+        rows.append(target)
+        values.append(coefficient*phases)
+    if len(rows)==0:
+        return sp.csr_matrix((4**n,4**n))
+    ptm=sp.coo_matrix((np.concatenate(values),(np.concatenate(rows),np.tile(columns,len(rows)))),shape=(4**n,4**n)).tocsr()
+    ptm.sum_duplicates()
+    if ptm.nnz>0 and np.max(np.abs(ptm.data.imag))>1e-10*max(1,np.max(np.abs(ptm.data))):
+        raise ValueError("The superoperator does not preserve Hermiticity, its PTM is not real.")
+    ptm=sp.csr_matrix(ptm.real)
+    ptm.eliminate_zeros()
+    return ptm
+
+def hamiltonianPTM(hamiltonian,n):
+    '''
+    Return the real PTM of -i[H, . ] for a Hamiltonian given as a `dict` or `PauliSum`.
+    '''
+    if not isinstance(hamiltonian,PauliSum):
+        hamiltonian=PauliSum.fromDict(hamiltonian,n)
+    hamiltonian=hamiltonian.simplify()
+    terms=[]
+    for x,z,c in zip(hamiltonian.xMasks,hamiltonian.zMasks,hamiltonian.coefficients):
+        terms.append((-1.j*c,(x,z),(0,0)))
+        terms.append((1.j*c,(0,0),(x,z)))
+    return _assemble(terms,n)
+
+def dissipatorPTM(collapseOperators:list,n,atol=1e-14):
+    '''
+    Return the real PTM of sum_k D[C_k] for collapse operators given as `Qobj` or (sparse) matrices.
+
+    With C = sum_a c_a P_a, D[C]Q = sum_ab c_a c_b^* (P_a Q P_b - 1/2 P_b P_a Q - 1/2 Q P_b P_a). Local collapse operators
+    have at most 4 Pauli components, i.e. 16 terms each.
+    '''
+    xs,zs=pauliIndices(n)
+    terms=[]
+    for C in collapseOperators:
+        coefficients=pauliDecomposition(C,n)
+        support=np.nonzero(np.abs(coefficients)>atol)[0]
+        for a in support:
+            for b in support:
+                c=coefficients[a]*np.conj(coefficients[b])
+                terms.append((c,(xs[a],zs[a]),(xs[b],zs[b])))
+                x,z,e=_multiply(xs[b],zs[b],xs[a],zs[a])
+                terms.append((-0.5*c*1.j**e,(x,z),(0,0)))
+                terms.append((-0.5*c*1.j**e,(0,0),(x,z)))
+    return _assemble(terms,n)
+
+def lindbladianPTM(hamiltonian,collapseOperators:list,n):
+    '''
+    Return the real PTM of -i[H, . ] + sum_k D[C_k].
+    '''
+    return (hamiltonianPTM(hamiltonian,n)+dissipatorPTM(collapseOperators,n)).tocsr()
+
+def pauliConjugateSigns(pauliString,n):
+    '''
+    Return s_Q = +1 if Q commutes with the Pauli string and -1 otherwise, for all 4^n Pauli strings Q in index order.
+    '''
+    x,z=pauliStringToMasks(pauliString)
+    xq,zq=pauliIndices(n)
+    return 1-2*((popcount(xq&np.uint64(z))+popcount(zq&np.uint64(x)))%2)
+
+def pauliConjugatePTM(ptm,pauliString,n):
+    '''
+    Return S R S, the PTM of P L[P . P] P. For the Hamiltonian part this is the PTM of the reshaped Hamiltonian P H P.
+    '''
+    signs=sp.diags(pauliConjugateSigns(pauliString,n).astype(float))
+    return (signs@ptm@signs).tocsr()
+
+def ptmSignal(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,deltaT,L,ptm=None,method='auto'):
+    '''
+    Return tlist and the signal <2|phi_b><phi_a|>(t) started from (|phi_a>+|phi_b>)/sqrt(2), evolved as a real Pauli vector
+    with the exponential of the real PTM (see propagator.propagate). Same arguments as utils.simulateSignal except
+    liouvillian.
+
+    Parameters
+    ----------
+    ptm: precomputed PTM of the Lindbladian (e.g. from lindbladianPTM), used in place of noisyHamiltonian and collapseOperators.
+    '''
+    tlist=np.linspace(0,L*deltaT,L+1)
+    if ptm is None:
+        ptm=lindbladianPTM(noisyHamiltonian,collapseOperators,n)
+    phiA=np.asarray(phiA,dtype=complex).reshape(-1)
+    phiB=np.asarray(phiB,dtype=complex).reshape(-1)
+    psi0=(phiA+phiB)/np.sqrt(2)
+    r0=pauliExpectations(psi0,psi0,n).real
+    # Tr(O rho) = 1/2^n sum_Q r_Q Tr(O Q) with Tr(2|phi_b><phi_a| Q) = 2<phi_a|Q|phi_b>
+    functional=2*pauliExpectations(phiA,phiB,n)/2**n
+    return tlist,propagate(ptm,r0,functional,deltaT,L,method=method)
@@ -1,13 +1,13 @@
 from matplotlib import pyplot as plt
 import numpy as np
-from exact_diagonalization import eigenSolver
+from exact_diagonalization import cachedEigenSolver
 from models import ringModel
 import csv
 
 n=6
 hamiltonian=ringModel(4,1,4,n)
 # print(hamiltonian)
-eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+eigenvalues,eigenstates=cachedEigenSolver(hamiltonian,n)
 
 '''
 Load random numbers.
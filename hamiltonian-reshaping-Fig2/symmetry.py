@@ -0,0 +1,344 @@
+import numpy as np
+from scipy import sparse as sp
+from qutip import Qobj
+from pauli_sum import PauliSum,masksToPauliString
+from exact_diagonalization import hamiltonianMatrix,pauliPermutationPhases
+from propagator import propagate,rankOneFunctional
+
+'''
+Symmetry sectors of the model Hamiltonians and Lindbladians.
+
+A symmetry U (a Pauli string or a reflection of the sites) of H is
+    strong: U commutes with H and with every collapse operator. rho(0)=|psi><psi| with psi in one eigenspace of U stays in that eigenspace.
+    weak: U commutes with H and maps the set of collapse operators onto itself (up to phases). The Lindbladian commutes with
+          rho -> U rho U^dagger, so a block-diagonal rho(0) stays block-diagonal in the eigenspaces of U.
+Both the ED and the master-equation solve can therefore be restricted to symmetry sectors.
+
+Pauli strings and site permutations are monomial, U|j> = phase[j]|image[j]>, and the symmetries are commuting involutions, so
+the sector bases follow from the orbits of the basis states under the group they generate (see symmetrySectors) and are
+sparse. The signal <2|phi_b><phi_a|>(t) only needs the blocks V_p^dagger rho V_q which the Lindbladian couples to the block of
+(phi_a, phi_b) (see sectorLiouvillian), and the reduced Lindbladian is assembled from the sector blocks of H and C_k without
+the (4^n,4^n) superoperator.
+'''
+
+def _nullSpaceGF2(rows,numBits):
+    '''
+    Return a basis (list of int) of {p : parity(r&p)=0 for all r in rows} over GF(2).
+    '''
+    pivots={}
+    for row in rows:
+        for bit,pivotRow in pivots.items():
+            if row>>bit&1:
+                row^=pivotRow
+        if row==0:
+            continue
+        bit=row.bit_length()-1
+        for otherBit in list(pivots.keys()):
+            if pivots[otherBit]>>bit&1:
+                pivots[otherBit]^=row
+        pivots[bit]=row
+
+    basis=[]
+    for freeBit in range(numBits):
+        if freeBit in pivots:
+            continue
+        vector=1<<freeBit
+        for bit,pivotRow in pivots.items():
+            if pivotRow>>freeBit&1:
+                vector|=1<<bit
+        basis.append(vector)
+    return basis
+
+def pauliSymmetries(hamiltonian,n):
+    '''
+    Return the generators (Pauli strings) of the group of Pauli strings which commute with every (nonzero) term of the Hamiltonian.
+
+    A Pauli string (x,z) commutes with the term (x_t,z_t) iff |x_t&z|+|z_t&x| is even, so the generators are a basis of the
+    null space of the (terms, 2n) binary symplectic matrix.
+    '''
+    if not isinstance(hamiltonian,PauliSum):
+        hamiltonian=PauliSum.fromDict(hamiltonian,n)
+    rows=[(int(z)<<n)|int(x) for x,z,c in zip(hamiltonian.xMasks,hamiltonian.zMasks,hamiltonian.coefficients) if c!=0]
+    mask=(1<<n)-1
+    return [masksToPauliString(vector>>n,vector&mask,n) for vector in _nullSpaceGF2(rows,2*n)]
+
+def permuteSites(pauliString,permutation):
+    '''
+    Return the Pauli string after moving the local Pauli on site k to site permutation[k].
+    '''
+    permuted=['I']*len(pauliString)
+    for k in range(len(pauliString)):
+        permuted[permutation[k]]=pauliString[k]
+    return ''.join(permuted)
+
+def reflectionSymmetries(hamiltonian:dict,n):
+    '''
+    Return the site reflections k -> (r-k) mod n (as tuples) which leave the Hamiltonian invariant, the identity excluded.
+    '''
+    reflections=[]
+    for r in range(n):
+        permutation=tuple((r-k)%n for k in range(n))
+        if permutation==tuple(range(n)):
+            continue
+        permuted={permuteSites(key,permutation):value for key,value in hamiltonian.items()}
+        if permuted.keys()==hamiltonian.keys() and all(np.isclose(permuted[key],hamiltonian[key],rtol=1e-12,atol=1e-14) for key in hamiltonian):
+            reflections.append(permutation)
+    return reflections
+
+def monomialAction(symmetry,n):
+    '''
+    Return (images, phases) with U|j> = phases[j]|images[j]> for a symmetry given as a Pauli string or a site permutation.
+    '''
+    columns=np.arange(2**n,dtype=np.int64)
+    if isinstance(symmetry,str):
+        xMasks,phases=pauliPermutationPhases([symmetry],n)
+        return columns^np.int64(xMasks[0]),phases[0].astype(complex)
+    images=np.zeros(2**n,dtype=np.int64)
+    for k in range(n):
+        images|=((columns>>(n-1-k))&1)<<(n-1-symmetry[k])
+    return images,np.ones(2**n,dtype=complex)
+
+def permutationMatrix(permutation,n):
+    '''
+    Return the sparse unitary which moves qubit k to qubit permutation[k].
+    Qubit k is the (n-1-k)th bit of the basis index, as in exact_diagonalization.py.
+    '''
+    images,phases=monomialAction(permutation,n)
+    return sp.csr_matrix((phases,(images,np.arange(2**n))),shape=(2**n,2**n))
+
+def symmetryOperator(symmetry,n):
+    '''
+    Return the sparse matrix of a symmetry given as a Pauli string or a site permutation.
+    '''
+    if isinstance(symmetry,str):
+        return hamiltonianMatrix({symmetry:1.0},n,sparse=True)
+    return permutationMatrix(symmetry,n)
+
+def _toSparse(operator):
+    return sp.csr_matrix(operator.data if isinstance(operator,Qobj) else operator)
+
+def _isClose(A,B,tol):
+    difference=A-B
+    return difference.nnz==0 or np.abs(difference.data).max()<=tol
+
+def classifySymmetry(U,hamMatrix,collapseMatrices,tol=1e-10):
+    '''
+    Return 'strong', 'weak' or None for a unitary U, given the Hamiltonian and the collapse operators as sparse matrices.
+    '''
+    U=_toSparse(U)
+    Udag=U.conj().T
+    if not _isClose(U@hamMatrix,hamMatrix@U,tol):
+        return None
+    if all(_isClose(U@C,C@U,tol) for C in collapseMatrices):
+        return 'strong'
+
+    # Weak symmetry: U C_k U^dagger = e^{i theta} C_pi(k) for a permutation pi of the collapse operators.
+    unmatched=list(range(len(collapseMatrices)))
+    for C in collapseMatrices:
+        transformed=sp.csr_matrix(U@C@Udag)
+        for j in unmatched:
+            candidate=collapseMatrices[j]
+            if candidate.nnz==0 or transformed.nnz==0:
+                continue
+            index=np.argmax(np.abs(candidate.data))
+            row=np.searchsorted(candidate.indptr,index,side='right')-1
+            phase=transformed[row,candidate.indices[index]]/candidate.data[index]
+            if np.isclose(np.abs(phase),1) and _isClose(transformed,phase*candidate,tol):
+                unmatched.remove(j)
+                break
+        else:
+            return None
+    return 'weak'
+
+def findSymmetries(hamiltonian:dict,n,collapseOperators:list,tol=1e-10):
+    '''
+    Return the Pauli-string and reflection symmetries of the Hamiltonian and collapse operators.
+
+    Returns
+    ----------
+    {'strong': [(symmetry, U), ...], 'weak': [(symmetry, U), ...]} where every list contains mutually commuting symmetries.
+    symmetry is the Pauli string or the site permutation and U its sparse matrix.
+    '''
+    hamMatrix=hamiltonianMatrix(hamiltonian,n,sparse=True)
+    collapseMatrices=[_toSparse(C) for C in collapseOperators]
+    found={'strong':[],'weak':[]}
+    chosen=[]
+
+    for symmetry in pauliSymmetries(hamiltonian,n)+reflectionSymmetries(hamiltonian,n):
+        U=symmetryOperator(symmetry,n)
+        if not all(_isClose(U@V,V@U,tol) for V in chosen):
+            continue
+        kind=classifySymmetry(U,hamMatrix,collapseMatrices,tol)
+        if kind is not None:
+            found[kind].append((symmetry,U))
+            chosen.append(U)
+
+    return found
+
+def symmetrySectors(symmetries:list,n,tol=1e-12):
+    '''
+    Return the joint eigenspaces of mutually commuting involutive symmetries (Pauli strings, reflections) as sparse isometries.
+
+    The group G generated by the m symmetries acts on the basis states by g|j> = phase_g[j]|image_g[j]>. The projector onto the
+    sector with eigenvalues s is P_s = 1/2^m sum_e chi_s(e) g_e over the exponents e in {0,1}^m, with chi_s(e) = prod_i s_i^e_i,
+    and P_s|j> only depends on the orbit of j up to a factor. One (normalized, nonzero) column P_s|r> per orbit representative
+    r = min_g image_g[j] is therefore an orthonormal basis of the sector, with one nonzero per element of the orbit.
+
+    Parameters
+    ----------
+    symmetries: list of Pauli strings or site permutations, e.g. the symmetries of findSymmetries.
+    n: # of qubits.
+    tol: columns with a smaller norm are dropped.
+
+    Returns
+    ----------
+    A list of (labels, V) where labels is the tuple of +-1 eigenvalues and V a sparse (2^n,d_q) isometry of the sector. Empty
+    sectors are left out.
+    '''
+    d=2**n
+    columns=np.arange(d,dtype=np.int64)
+    # group elements as (exponents, images, phases), the identity first
+    elements=[((),columns,np.ones(d,dtype=complex))]
+    for symmetry in symmetries:
+        images,phases=monomialAction(symmetry,n)
+        # (U g)|j> = phase_g[j] phase_U[image_g[j]] |image_U[image_g[j]]>
+        elements=[(e+(0,),gImages,gPhases) for e,gImages,gPhases in elements]+[(e+(1,),images[gImages],gPhases*phases[gImages]) for e,gImages,gPhases in elements]
+    representatives=np.min([gImages for e,gImages,gPhases in elements],axis=0)
+    orbitColumns=np.flatnonzero(representatives==columns)
+    exponents=np.array([e for e,gImages,gPhases in elements],dtype=int).reshape(len(elements),len(symmetries))
+
+    sectors=[]
+    for labels in np.ndindex(*(2,)*len(symmetries)):
+        labels=tuple(1-2*np.array(labels,dtype=int))
+        characters=np.prod(np.array(labels)[None,:]**exponents,axis=1)
+        rows=np.concatenate([gImages[orbitColumns] for e,gImages,gPhases in elements])
+        cols=np.tile(np.arange(len(orbitColumns)),len(elements))
+        data=np.concatenate([chi*gPhases[orbitColumns] for chi,(e,gImages,gPhases) in zip(characters,elements)])
+        P=sp.csc_matrix((data,(rows,cols)),shape=(d,len(orbitColumns)))
+        norms=np.sqrt(np.asarray(abs(P).power(2).sum(axis=0)).reshape(-1))
+        keep=np.flatnonzero(norms>tol*len(elements))
+        if len(keep)>0:
+            sectors.append((tuple(int(value) for value in labels),(P[:,keep]@sp.diags(1/norms[keep])).tocsc()))
+    return sectors
+
+def sectorOf(state,sectors,tol=1e-8):
+    '''
+    Return the index of the sector which contains the state, or None if the state has weight in several sectors.
+    '''
+    state=np.asarray(state).reshape(-1)
+    norm=np.linalg.norm(state)**2
+    for q,(labels,V) in enumerate(sectors):
+        if np.abs(np.linalg.norm(V.conj().T@state)**2-norm)<tol*max(norm,1):
+            return q
+    return None
+
+def sectorEigenSolver(hamiltonian,n,sectors):
+    '''
+    Return the eigenvalues and eigenstates of given hamiltonian by diagonalizing every symmetry sector separately, so that
+    every eigenstate lies in a single sector, also for degenerate levels.
+
+    Returns
+    ----------
+    sorted_eigenvalues, sorted_eigenvectors (one per row, as in eigenSolver) and the sector index of every eigenvalue.
+    '''
+    hamMatrix=hamiltonianMatrix(hamiltonian,n,sparse=True)
+    eigenvalues=[]
+    eigenvectors=[]
+    sectorIndex=[]
+    for q,(labels,V) in enumerate(sectors):
+        blockValues,blockVectors=np.linalg.eigh((V.conj().T@(hamMatrix@V)).toarray())
+        eigenvalues.append(blockValues)
+        eigenvectors.append(np.transpose(V@blockVectors))
+        sectorIndex.append(np.full(len(blockValues),q))
+
+    eigenvalues=np.concatenate(eigenvalues)
+    eigenvectors=np.concatenate(eigenvectors)
+    sectorIndex=np.concatenate(sectorIndex)
+    sorted_indices = np.argsort(eigenvalues,kind='stable')
+    return eigenvalues[sorted_indices],eigenvectors[sorted_indices],sectorIndex[sorted_indices]
+
+def sectorLiouvillian(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,symmetries=None,tol=1e-8):
+    '''
+    Return the Lindbladian restricted to the sector blocks of rho which reach the signal <2|phi_b><phi_a|>(t).
+
+    The blocks X_pq = V_p^dagger rho V_q are labelled by the sectors p, q of all symmetries. A strong symmetry commutes with
+    U . and . U^dagger separately, so p and q keep the labels of phi_a and phi_b. A weak symmetry only commutes with
+    U . U^dagger, so p_i q_i = s_a,i s_b,i is kept and the collapse operators move rho between these blocks. On every block
+        L(X_pq) = -i(H_p X_pq - X_pq H_q) - 1/2 (A_p X_pq + X_pq A_q) + sum_k sum_{p'q'} C^k_pp' X_p'q' (C^k_qq')^dagger,
+    with H_p = V_p^dagger H V_p, A = sum_k C_k^dagger C_k and C^k_pp' = V_p^dagger C_k V_p', so the reduced Lindbladian is
+    assembled from sparse sector blocks (column-stacked vec(X_pq), as in noise_model.py).
+
+    Parameters
+    ----------
+    symmetries: output of findSymmetries, found from noisyHamiltonian and collapseOperators if None.
+    tol: tolerance of sectorOf.
+
+    Returns
+    ----------
+    Lred: reduced Lindbladian (sparse), of dimension sum_pq d_p d_q over the blocks instead of 4^n.
+    rho0: reduced vec(rho(0)), rho(0)=|psi><psi| with psi=(|phi_a>+|phi_b>)/sqrt(2).
+    functional: reduced row vector of the observable 2|phi_b><phi_a|, see propagator.rankOneFunctional.
+    '''
+    if symmetries is None:
+        symmetries=findSymmetries(noisyHamiltonian,n,collapseOperators)
+    strong=[symmetry for symmetry,U in symmetries['strong']]
+    weak=[symmetry for symmetry,U in symmetries['weak']]
+    m=len(strong)
+    sectors=symmetrySectors(strong+weak,n)
+    phiA=np.asarray(phiA,dtype=complex).reshape(-1)
+    phiB=np.asarray(phiB,dtype=complex).reshape(-1)
+    a=sectorOf(phiA,sectors,tol)
+    b=sectorOf(phiB,sectors,tol)
+    if a is None or b is None:
+        raise ValueError("phi_a and phi_b must each lie in a single symmetry sector, e.g. eigenstates of sectorEigenSolver.")
+    labelsA,labelsB=sectors[a][0],sectors[b][0]
+    product=tuple(x*y for x,y in zip(labelsA[m:],labelsB[m:]))
+    blocks=[(p,q) for p,(labelsP,Vp) in enumerate(sectors) for q,(labelsQ,Vq) in enumerate(sectors)
+            if labelsP[:m]==labelsA[:m] and labelsQ[:m]==labelsB[:m] and tuple(x*y for x,y in zip(labelsP[m:],labelsQ[m:]))==product]
+
+    V=[Vq for labels,Vq in sectors]
+    hamMatrix=hamiltonianMatrix(noisyHamiltonian,n,sparse=True)
+    collapseMatrices=[_toSparse(C) for C in collapseOperators]
+    anticommutator=sp.csr_matrix((2**n,2**n),dtype=complex)
+    for C in collapseMatrices:
+        anticommutator=anticommutator+C.conj().T@C
+    sectorsUsed=sorted(set(p for p,q in blocks)|set(q for p,q in blocks))
+    restrict=lambda operator,p,q: (V[p].conj().T@(operator@V[q])).tocsr()
+    H={p:restrict(hamMatrix,p,p) for p in sectorsUsed}
+    A={p:restrict(anticommutator,p,p) for p in sectorsUsed}
+    C=[{(p,q):restrict(Ck,p,q) for p in sectorsUsed for q in sectorsUsed} for Ck in collapseMatrices]
+
+    grid=[[None]*len(blocks) for _ in blocks]
+    for row,(p,q) in enumerate(blocks):
+        Ip=sp.identity(V[p].shape[1],dtype=complex,format='csr')
+        Iq=sp.identity(V[q].shape[1],dtype=complex,format='csr')
+        for col,(pp,qq) in enumerate(blocks):
+            # vec(C_pp' X C_qq'^dagger) = (C_qq'^* kron C_pp') vec(X)
+            block=sp.csr_matrix((V[p].shape[1]*V[q].shape[1],V[pp].shape[1]*V[qq].shape[1]),dtype=complex)
+            for Ck in C:
+                if Ck[(p,pp)].nnz>0 and Ck[(q,qq)].nnz>0:
+                    block=block+sp.kron(Ck[(q,qq)].conj(),Ck[(p,pp)],format='csr')
+            if row==col:
+                block=block-1.j*(sp.kron(Iq,H[p])-sp.kron(H[q].T,Ip))-0.5*(sp.kron(Iq,A[p])+sp.kron(A[q].T,Ip))
+            if block.nnz>0:
+                grid[row][col]=block
+    Lred=sp.bmat(grid,format='csr')
+
+    psi=(phiA+phiB)/np.sqrt(2)
+    rho0=np.concatenate([np.kron((V[q].conj().T@psi).conj(),V[p].conj().T@psi) for p,q in blocks])
+    functional=np.concatenate([rankOneFunctional(V[p].conj().T@phiA,V[q].conj().T@phiB) if (p,q)==(a,b) else np.zeros(V[p].shape[1]*V[q].shape[1],dtype=complex) for p,q in blocks])
+    return Lred,rho0,functional
+
+def sectorSignal(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,deltaT,L,symmetries=None,method='auto'):
+    '''
+    Return tlist and the signal <2|phi_b><phi_a|>(t) started from (|phi_a>+|phi_b>)/sqrt(2), propagated with the reduced
+    Lindbladian of sectorLiouvillian. Same arguments as utils.simulateSignal; phi_a and phi_b must each lie in one sector.
+
+    Parameters
+    ----------
+    symmetries: output of findSymmetries, found from noisyHamiltonian and collapseOperators if None.
+    method: see propagator.propagate.
+    '''
+    Lred,rho0,functional=sectorLiouvillian(n,noisyHamiltonian,phiA,phiB,collapseOperators,symmetries)
+    tlist=np.linspace(0,L*deltaT,L+1)
+    return tlist,propagate(Lred,rho0,functional,deltaT,L,method=method)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from models import ringModel
+from exact_diagonalization import hamiltonianMatrix,eigenSolver,sparseEigenSolver,cachedEigenSolver
+
+'''
+The shift-invert levels and energyWindow modes against the dense spectrum, at n=8 with the dense fallback switched off.
+'''
+
+n=8
+hamiltonian=ringModel(4,1,4,n)
+eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+hamMatrix=hamiltonianMatrix(hamiltonian,n)
+
+def assertEigenpairs(values,vectors,levels):
+    assert sorted(values.keys())==sorted(levels)
+    for level in levels:
+        assert np.abs(values[level]-eigenvalues[level])<1e-10
+        assert np.linalg.norm(hamMatrix@vectors[level]-values[level]*vectors[level])<1e-8
+
+@pytest.mark.parametrize('levels',[(3,200),(0,255),(17,18,19)])
+def testLevelsKeepTheFullSpectrumIndex(levels):
+    values,vectors=sparseEigenSolver(hamiltonian,n,levels=levels,denseDimension=0)
+    assertEigenpairs(values,vectors,levels)
+
+def testEnergyWindowReturnsAbsoluteLevels():
+    energyWindow=(eigenvalues[40]-1e-6,eigenvalues[44]+1e-6)
+    values,vectors=sparseEigenSolver(hamiltonian,n,energyWindow=energyWindow,k=20,denseDimension=0)
+    assertEigenpairs(values,vectors,list(np.flatnonzero((eigenvalues>=energyWindow[0])&(eigenvalues<=energyWindow[1]))))
+
+    with pytest.raises(ValueError):
+        sparseEigenSolver(hamiltonian,n,energyWindow=energyWindow,k=2,denseDimension=0)
+
+def testCachedLevelsAreRebuilt(tmp_path):
+    first=cachedEigenSolver(hamiltonian,n,cacheDir=str(tmp_path),levels=(3,200))
+    second=cachedEigenSolver(hamiltonian,n,cacheDir=str(tmp_path),levels=(3,200))
+    for values,vectors in (first,second):
+        assertEigenpairs(values,vectors,(3,200))
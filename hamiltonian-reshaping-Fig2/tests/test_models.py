@@ -0,0 +1,31 @@
+import numpy as np
+from models import ringModel,ringModelSpec,compileModel,compileModelDict
+from exact_diagonalization import hamiltonianMatrix
+from mpdo import pauliSumToMPO,bondGenerators,mpsToVector
+
+'''
+Model specifications passed to the tensor network backend directly, which also works above the 64 qubits of PauliSum.
+'''
+
+def mpoMatrix(mpo,n):
+    vector=mpsToVector([W.reshape(W.shape[0],4,W.shape[3]) for W in mpo])
+    return vector.reshape([2,2]*n).transpose(list(range(0,2*n,2))+list(range(1,2*n,2))).reshape(2**n,2**n)
+
+def testCompileModelDictMatchesCompileModel():
+    spec=ringModelSpec(4,1,4,6)
+    assert compileModelDict(spec,6)==compileModel(spec,6).toDict()
+
+def testSpecMPOMatchesHamiltonian():
+    n=6
+    # a small chunk so that the MPO is summed from several pieces
+    mpo=pauliSumToMPO(ringModelSpec(4,1,4,n),n,chunk=5)
+    assert np.max(np.abs(mpoMatrix(mpo,n)-hamiltonianMatrix(ringModel(4,1,4,n),n)))<1e-10
+
+def testSpecAbove64Qubits():
+    n=100
+    spec=ringModelSpec(4,1,4,n)
+    mpo=pauliSumToMPO(spec,n)
+    generators=bondGenerators(spec,[(i,np.diag([np.exp(1.j*np.pi/2),1])) for i in range(n)],n)
+
+    assert len(mpo)==n and max(W.shape[3] for W in mpo)<=8
+    assert set(generators.keys())=={(i,i+1) for i in range(n-1)}|{(n-1,0)}
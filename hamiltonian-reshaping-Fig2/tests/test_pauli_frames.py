@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from models import ringModel,localSumZ
+from noise_model import noiseModel
+from exact_diagonalization import eigenSolver,stateTransformBatch
+from pauli_sum import PauliSum
+from propagator import propagatorSignal
+from utils import pauliTransform,pauliFrameClasses
+
+'''
+Every Pauli frame of a pauliFrameClasses class against its representative, bit for bit, for 40 random Pauli strings of n=4
+and the systematic error and noise of the generate scripts.
+'''
+
+n=4
+beta=0.01
+deltaT=1e-2
+L=100
+a,b=0,3
+hamiltonian=ringModel(4,1,4,n)
+eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+errorHamiltonian=PauliSum.fromDict(localSumZ(n),n)
+
+rng=np.random.default_rng(7)
+# the first strings only X/Y-flip single qubits, which changes the non-diagonal 't1' noise |0><1| on that qubit
+pauliStrings=['IIII','XIII','YIII','ZIII','IXYI']+[''.join(rng.choice(list('IXYZ'),n)) for _ in range(35)]
+
+def frameSignal(pauliString,noise,s):
+    noisyHamiltonian=PauliSum.fromDict(pauliTransform(hamiltonian,pauliString),n)+errorHamiltonian*(beta*s)
+    phiA,phiB=stateTransformBatch(eigenstates[[a,b]],[pauliString])[0]
+    return propagatorSignal(n,noisyHamiltonian.toDict(),phiA,phiB,noise.collapseOperators(s),deltaT,L)[1]
+
+@pytest.mark.parametrize('noiseType',['localSum','t1'])
+def testClassMembersGiveTheRepresentativeSignal(noiseType):
+    noise=noiseModel(n,noiseType)
+    s=0.05*np.abs(eigenvalues[b]-eigenvalues[a])
+    frameClasses=pauliFrameClasses(pauliStrings,errorHamiltonian,noise.localOperator)
+    signals={representative:frameSignal(pauliStrings[representative],noise,s) for representative in frameClasses}
+
+    assert 1<len(frameClasses)<len(pauliStrings)
+    for representative,members in frameClasses.items():
+        for i in members:
+            assert np.array_equal(frameSignal(pauliStrings[i],noise,s),signals[representative])
+    # frames of different classes are told apart by the signal
+    representatives=list(frameClasses.keys())
+    assert all(np.max(np.abs(signals[i]-signals[j]))>1e-8 for i in representatives for j in representatives if i<j)
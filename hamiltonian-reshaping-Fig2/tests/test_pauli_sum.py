@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+from pauli_sum import PauliSum
+
+'''
+Scalar arithmetic of PauliSum.
+'''
+
+hamiltonian=PauliSum.fromDict({'XZ':1.0,'ZI':-0.5},2)
+
+def testScalarMultiplicationAndDivision():
+    assert np.allclose((2*hamiltonian).coefficients,[2.0,-1.0])
+    assert np.allclose((hamiltonian/2).coefficients,[0.5,-0.25])
+
+@pytest.mark.parametrize('operation',[lambda H: H*np.array([1.0,2.0]),lambda H: H/np.array([1.0,2.0])])
+def testArraysAreRejected(operation):
+    with pytest.raises(TypeError):
+        operation(hamiltonian)
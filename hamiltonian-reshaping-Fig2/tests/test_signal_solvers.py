@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from qutip import Options
+from models import ringModel,errHamLocalSumZ
+from noise_model import noiseModel
+from exact_diagonalization import eigenSolver
+from batched import batchedSignals
+from utils import simulateSignal,loadState,loadStates,signalSolver,SIGNAL_SOLVERS
+
+'''
+Every signal backend against the mesolve signal at n=4, for the ringModel with the 'localSum' noise and the systematic error
+of the generate scripts at gamma=1e-2 (kappa=gamma*|deltaE|, error strength beta*kappa).
+'''
+
+n=4
+beta=0.01
+gamma=1e-2
+deltaT=2e-3
+L=100
+hamiltonian=ringModel(4,1,4,n)
+eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+
+# largest deviation from mesolve of every solver: the exact backends agree to the mesolve tolerance, 'lowrank' and 'mpdo'
+# carry their truncation and Trotter errors, and 'trajectories' the statistical error of 400 trajectories.
+TOLERANCES={
+    'propagator':1e-9,
+    'spectral':1e-9,
+    'interaction':1e-9,
+    'ptm':1e-9,
+    'matrixfree':1e-9,
+    'symmetry':1e-9,
+    'lowrank':5e-5,
+    'mpdo':1e-3,
+    'trajectories':5e-2,
+}
+SOLVER_OPTIONS={'trajectories':{'seed':1,'minTrajectories':400,'maxTrajectories':400}}
+
+options=Options()
+options.atol=1e-14
+options.rtol=1e-12
+options.nsteps=10000000
+
+def sweepProblem(a,b):
+    s=gamma*np.abs(eigenvalues[b]-eigenvalues[a])
+    return s,errHamLocalSumZ(hamiltonian,n,beta*s)
+
+_references={}
+
+def referenceSignal(a,b):
+    if (a,b) not in _references:
+        s,noisyHamiltonian=sweepProblem(a,b)
+        _references[(a,b)]=simulateSignal(n,noisyHamiltonian,eigenstates[a],eigenstates[b],noiseModel(n).collapseOperators(s),options,deltaT,L)[1]
+    return _references[(a,b)]
+
+def testEverySolverHasAReference():
+    assert set(SIGNAL_SOLVERS)<=set(TOLERANCES)
+
+@pytest.mark.parametrize('solver',list(SIGNAL_SOLVERS.keys()))
+def testEverySolverIsShipped(solver):
+    assert callable(signalSolver(solver))
+
+@pytest.mark.parametrize('a,b',[(0,3),(1,6)])
+@pytest.mark.parametrize('solver',list(SIGNAL_SOLVERS.keys()))
+def testSolverMatchesMesolve(solver,a,b):
+    s,noisyHamiltonian=sweepProblem(a,b)
+    tlist,signal=simulateSignal(n,noisyHamiltonian,eigenstates[a],eigenstates[b],noiseModel(n).collapseOperators(s),options,deltaT,L,solver=solver,solverOptions=SOLVER_OPTIONS.get(solver))
+
+    assert np.allclose(tlist,np.linspace(0,L*deltaT,L+1))
+    assert np.max(np.abs(signal-referenceSignal(a,b)))<TOLERANCES[solver]
+
+@pytest.mark.parametrize('a,b',[(0,3),(1,6)])
+def testBatchedSignalsMatchMesolve(a,b):
+    s,noisyHamiltonian=sweepProblem(a,b)
+    tlist,signals=batchedSignals(n,[noisyHamiltonian],[eigenstates[a]],[eigenstates[b]],noiseModel(n).collapseMatrices,deltaT,L,rates=s)
+
+    assert np.max(np.abs(signals[0]-referenceSignal(a,b)))<1e-9
+
+def testLoadStatesMatchLoadState():
+    initialStates=loadStates((eigenstates[[0,1]]+eigenstates[[3,6]])/np.sqrt(2),n)
+    for initState,(a,b) in zip(initialStates,[(0,3),(1,6)]):
+        assert initState.dims==[[2]*n,[1]*n]
+        assert initState==loadState((eigenstates[a]+eigenstates[b])/np.sqrt(2),n)
+        s,noisyHamiltonian=sweepProblem(a,b)
+        tlist,signal=simulateSignal(n,noisyHamiltonian,eigenstates[a],eigenstates[b],noiseModel(n).collapseOperators(s),options,deltaT,L,initState=initState)
+        assert np.array_equal(signal,referenceSignal(a,b))
+
+@pytest.mark.parametrize('a,b',[(0,3),(1,6)])
+@pytest.mark.parametrize('phase',[1,1.j])
+def testEigenbasisMesolveMatchesMesolve(a,b,phase):
+    s,noisyHamiltonian=sweepProblem(a,b)
+    collapseOperators=noiseModel(n).collapseOperators(s)
+    tlist,signal=simulateSignal(n,noisyHamiltonian,eigenstates[a],phase*eigenstates[b],collapseOperators,options,deltaT,L,solverOptions={'eigenbasis':eigenstates})
+    tlist,reference=simulateSignal(n,noisyHamiltonian,eigenstates[a],phase*eigenstates[b],collapseOperators,options,deltaT,L)
+
+    assert np.max(np.abs(signal-reference))<1e-9
+    with pytest.raises(ValueError):
+        simulateSignal(n,noisyHamiltonian,(eigenstates[a]+eigenstates[b])/np.sqrt(2),eigenstates[b],collapseOperators,options,deltaT,L,solverOptions={'eigenbasis':eigenstates})
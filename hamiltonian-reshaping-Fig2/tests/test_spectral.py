@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from models import ringModel,localSumZ
+from noise_model import noiseModel
+from exact_diagonalization import eigenSolver
+from propagator import pureStateVector,rankOneFunctional
+from spectral import LiouvillianSpectrum,spectralGap
+from utils import noisyEigenData
+
+'''
+spectralGap against the dominant mode of the dense Lindbladian spectrum, with the noise of the gamma sweep of the generate
+scripts (kappa=gamma*|deltaE|, error strength beta*kappa).
+'''
+
+n=4
+beta=0.01
+hamiltonian=ringModel(4,1,4,n)
+eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+
+def sweepLiouvillian(a,b,gamma):
+    return noiseModel(n).parametricLiouvillian(hamiltonian,localSumZ(n),beta).at(gamma*np.abs(eigenvalues[b]-eigenvalues[a]))
+
+@pytest.mark.parametrize('a,b',[(0,3),(1,6),(2,9),(0,15)])
+@pytest.mark.parametrize('gamma',[1e-3,1e-2,1e-1])
+def testSpectralGapMatchesDenseSpectrum(a,b,gamma):
+    liouvillian=sweepLiouvillian(a,b,gamma)
+    rho0=pureStateVector(1/np.sqrt(2)*(eigenstates[a]+eigenstates[b]))
+    modes,weights=LiouvillianSpectrum(liouvillian).modes(rho0,rankOneFunctional(eigenstates[a],eigenstates[b]))
+    dominant=modes[np.argmax(np.abs(weights))]
+
+    energyGap,eigenvalue=spectralGap(n,None,eigenstates[a],eigenstates[b],None,liouvillian=liouvillian)
+
+    assert np.abs(eigenvalue-dominant)<1e-8
+    assert energyGap==pytest.approx(np.imag(dominant),abs=1e-8)
+
+def testSpectralGapRaisesWhenTheModesMissTheSignal():
+    liouvillian=sweepLiouvillian(1,6,1e-1)
+    # the modes next to the steady state carry no weight of the coherence |phi_a><phi_b|
+    with pytest.raises(RuntimeError):
+        spectralGap(n,None,eigenstates[1],eigenstates[6],None,liouvillian=liouvillian,target=0,k=2,maxK=4)
+
+@pytest.mark.parametrize('a,b',[(0,3),(1,6)])
+def testShortcutHasTheSignalShape(a,b):
+    liouvillian=sweepLiouvillian(a,b,1e-2)
+    shortcut=noisyEigenData(n,None,eigenstates[a],eigenstates[b],None,None,1e-2,200,solver='shortcut',liouvillian=liouvillian)
+    signal=noisyEigenData(n,None,eigenstates[a],eigenstates[b],None,None,1e-2,200,solver='propagator',liouvillian=liouvillian)
+
+    assert shortcut.shape==signal.shape==(1,)
+    # the matrix pencil fit of the signal is only accurate to ~1e-3 with the other modes present
+    assert shortcut[0]==pytest.approx(signal[0],rel=1e-3)
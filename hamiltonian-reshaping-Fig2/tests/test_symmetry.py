@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from models import ringModel,errHamLocalSumZ
+from noise_model import noiseModel
+from exact_diagonalization import eigenSolver
+from propagator import propagatorSignal
+from symmetry import findSymmetries,symmetrySectors,sectorLiouvillian,sectorSignal
+from utils import simulateSignal
+
+'''
+The sector-reduced signal against the full Lindbladian, for the ringModel of the generate scripts (a weak reflection) and for
+an XXZ chain with Z fields, which adds the strong parity ZZZZ.
+'''
+
+n=4
+deltaT=1e-2
+L=100
+
+def xxzChain(n):
+    hamiltonian={}
+    for i in range(n-1):
+        for pauli,c in (('ZZ',1.0),('XX',0.5),('YY',0.3)):
+            key=['I']*n
+            key[i]=pauli[0]
+            key[i+1]=pauli[1]
+            hamiltonian[''.join(key)]=c
+    for i in range(n):
+        key=['I']*n
+        key[i]='Z'
+        hamiltonian[''.join(key)]=0.2
+    return hamiltonian
+
+MODELS={'ring':errHamLocalSumZ(ringModel(4,1,4,n),n,0.05),'xxz':xxzChain(n)}
+
+@pytest.mark.parametrize('model',list(MODELS.keys()))
+@pytest.mark.parametrize('noiseType',['localSum','t1'])
+@pytest.mark.parametrize('a,b',[(0,3),(1,6),(2,9)])
+def testSectorSignalMatchesFullLindbladian(model,noiseType,a,b):
+    hamiltonian=MODELS[model]
+    collapseOperators=noiseModel(n,noiseType).collapseOperators(0.3)
+    symmetries=findSymmetries(hamiltonian,n,collapseOperators)
+    eigenvalues,eigenstates=eigenSolver(hamiltonian,n,symmetries=[symmetry for symmetry,U in symmetries['strong']+symmetries['weak']])
+
+    Lred,rho0,functional=sectorLiouvillian(n,hamiltonian,eigenstates[a],eigenstates[b],collapseOperators,symmetries)
+    tlist,signal=sectorSignal(n,hamiltonian,eigenstates[a],eigenstates[b],collapseOperators,deltaT,L,symmetries)
+    tlist,reference=propagatorSignal(n,hamiltonian,eigenstates[a],eigenstates[b],collapseOperators,deltaT,L)
+
+    assert Lred.shape[0]<4**n
+    assert np.max(np.abs(signal-reference))<1e-12
+
+def testSectorEigenSolverKeepsTheSpectrum():
+    hamiltonian=MODELS['xxz']
+    symmetries=findSymmetries(hamiltonian,n,[])
+    generators=[symmetry for symmetry,U in symmetries['strong']+symmetries['weak']]
+    eigenvalues,eigenstates=eigenSolver(hamiltonian,n,symmetries=generators)
+    sectors=symmetrySectors(generators,n)
+
+    assert np.allclose(eigenvalues,eigenSolver(hamiltonian,n)[0],atol=1e-12)
+    assert sum(V.shape[1] for labels,V in sectors)==2**n
+    for labels,V in sectors:
+        assert np.allclose((V.conj().T@V).toarray(),np.eye(V.shape[1]),atol=1e-12)
+
+def testSymmetrySolverRejectsMixedSectors():
+    hamiltonian=MODELS['ring']
+    collapseOperators=noiseModel(n).collapseOperators(0.3)
+    symmetries=findSymmetries(hamiltonian,n,collapseOperators)
+    eigenvalues,eigenstates=eigenSolver(hamiltonian,n,symmetries=[symmetry for symmetry,U in symmetries['weak']])
+    sectors=symmetrySectors([symmetry for symmetry,U in symmetries['weak']],n)
+    # a superposition of one level from each of two different sectors
+    V0=sectors[0][1]
+    V1=sectors[1][1]
+    first=next(j for j in range(2**n) if np.linalg.norm(V0.conj().T@eigenstates[j])>0.5)
+    second=next(j for j in range(2**n) if np.linalg.norm(V1.conj().T@eigenstates[j])>0.5)
+    phiA=(eigenstates[first]+eigenstates[second])/np.sqrt(2)
+    with pytest.raises(ValueError):
+        simulateSignal(n,hamiltonian,phiA,eigenstates[3],collapseOperators,None,deltaT,L,solver='symmetry')
@@ -0,0 +1,190 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy import sparse as sp
+from scipy.linalg import expm
+from scipy.sparse.linalg import expm_multiply
+from qutip import Qobj
+from pauli_sum import PauliSum
+from exact_diagonalization import hamiltonianMatrix
+from matrix_pencil import mp_est
+
+'''
+Quantum trajectories (Monte Carlo wavefunction method) for the signal <2|phi_b><phi_a|>(t).
+
+Every trajectory evolves a 2^n state vector with H_eff = H - i/2 sum_k C_k^dagger C_k. When the squared norm drops below a
+uniform random number, a jump C_k is applied with probability proportional to ||C_k psi||^2. The jump is applied at the end of the
+substep (deltaT/substeps) in which it occurs. The average of 2<phi_a|psi><psi|phi_b> over the normalized trajectories converges
+to 2<phi_a|rho|phi_b>.
+
+Trajectories run in batches in a process pool, so a worker holds a few state vectors and, for at most denseDimension
+amplitudes, the dense substep propagator. Batches are merged with the parallel form of Welford's algorithm. The run stops
+when the jackknife error of the matrix pencil gap over `groups` groups of batches is below gapTolerance.
+'''
+
+class RunningStatistics:
+    '''
+    Running mean and variance of complex vectors (Welford), with merging of independent accumulators (Chan et al.).
+
+    Usage
+    ----------
+    statistics=RunningStatistics(L+1)
+    statistics.update(signal)     # one trajectory
+    statistics.merge(other)       # another RunningStatistics, e.g. from a worker
+    statistics.mean, statistics.standardError()
+    '''
+    def __init__(self,size):
+        self.count=0
+        self.mean=np.zeros(size,dtype=complex)
+        self.m2=np.zeros(size)
+
+    def update(self,sample):
+        self.count+=1
+        delta=sample-self.mean
+        self.mean=self.mean+delta/self.count
+        self.m2=self.m2+np.real(np.conj(delta)*(sample-self.mean))
+
+    def merge(self,other):
+        if other.count==0:
+            return
+        count=self.count+other.count
+        delta=other.mean-self.mean
+        self.mean=self.mean+delta*other.count/count
+        self.m2=self.m2+other.m2+np.abs(delta)**2*self.count*other.count/count
+        self.count=count
+
+    def variance(self):
+        '''
+        Return the sample variance E|x-mean|^2 of every entry.
+        '''
+        return self.m2/max(self.count-1,1)
+
+    def standardError(self):
+        return np.sqrt(self.variance()/max(self.count,1))
+
+def effectiveHamiltonian(hamiltonian,collapseMatrices:list,n):
+    '''
+    Return the sparse non-Hermitian Hamiltonian H - i/2 sum_k C_k^dagger C_k.
+    '''
+    if isinstance(hamiltonian,(dict,PauliSum)):
+        hamiltonian=hamiltonianMatrix(hamiltonian,n,sparse=True)
+    hamiltonianEff=sp.csr_matrix(hamiltonian,dtype=complex)
+    for C in collapseMatrices:
+        hamiltonianEff=hamiltonianEff-0.5j*(C.conj().T@C)
+    return hamiltonianEff.tocsr()
+
+def _trajectoryBatch(hamiltonianEff,collapseMatrices,psi0,braA,ketB,deltaT,L,substeps,number,seed,denseDimension):
+    '''
+    Return the RunningStatistics of the signals of `number` trajectories.
+    '''
+    rng=np.random.default_rng(seed)
+    h=deltaT/substeps
+    if hamiltonianEff.shape[0]<=denseDimension:
+        stepPropagator=expm(-1.j*h*hamiltonianEff.toarray())
+        step=lambda psi: stepPropagator@psi
+    else:
+        generator=(-1.j*h*hamiltonianEff).tocsr()
+        step=lambda psi: expm_multiply(generator,psi)
+    statistics=RunningStatistics(L+1)
+    signal=np.empty(L+1,dtype=complex)
+    for _ in range(number):
+        psi=psi0.copy()
+        threshold=rng.random()
+        signal[0]=2*(braA@psi)*np.conj(ketB@psi)
+        for k in range(1,L+1):
+            for _ in range(substeps):
+                psi=step(psi)
+                normSquared=np.real(np.vdot(psi,psi))
+                if normSquared<threshold:
+                    jumped=[C@psi for C in collapseMatrices]
+                    weights=np.array([np.real(np.vdot(phi,phi)) for phi in jumped])
+                    psi=jumped[rng.choice(len(jumped),p=weights/np.sum(weights))]
+                    psi=psi/np.linalg.norm(psi)
+                    threshold=rng.random()
+            # <phi_a|psi><psi|phi_b> of the normalized state; braA=conj(phi_a), ketB=conj(phi_b)
+            signal[k]=2*(braA@psi)*np.conj(ketB@psi)/np.real(np.vdot(psi,psi))
+        statistics.update(signal)
+    return statistics
+
+def matrixPencilGap(signal,deltaT,L,N_poles=4):
+    '''
+    Return the dominant gap of a signal, as in utils.noisyEigenData.
+    '''
+    return mp_est(signal[0:L],1,N_poles=N_poles)[0][0]/deltaT
+
+def trajectoryStatistics(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,deltaT,L,gapTolerance=1e-3,batchSize=20,minTrajectories=100,maxTrajectories=10000,workers=1,groups=8,substeps=10,N_poles=4,seed=None,denseDimension=256):
+    '''
+    Run trajectories until the jackknife error of the matrix pencil gap is below gapTolerance, or maxTrajectories is reached.
+
+    Parameters
+    ----------
+    gapTolerance: target statistical error of the gap.
+    batchSize: # of trajectories per task of the process pool.
+    minTrajectories, maxTrajectories: bounds of the # of trajectories.
+    workers: # of worker processes, 1 runs the batches in this process.
+    groups: # of jackknife groups; batch k is accumulated into group k mod groups.
+    substeps: # of substeps per deltaT, which sets the time resolution of the jumps.
+    seed: seed of numpy.random.SeedSequence, which gives an independent stream to every batch.
+    other parameters are the same as utils.simulateSignal.
+
+    Return
+    ----------
+    tlist: time grid.
+    statistics: RunningStatistics of the signal over all trajectories.
+    gapError: jackknife error of the gap of statistics.mean.
+    '''
+    tlist=np.linspace(0,L*deltaT,L+1)
+    collapseMatrices=[sp.csr_matrix(C.data if isinstance(C,Qobj) else C) for C in collapseOperators]
+    hamiltonianEff=effectiveHamiltonian(noisyHamiltonian,collapseMatrices,n)
+    phiA=np.asarray(phiA,dtype=complex).reshape(-1)
+    phiB=np.asarray(phiB,dtype=complex).reshape(-1)
+    psi0=(phiA+phiB)/np.sqrt(2)
+    arguments=(hamiltonianEff,collapseMatrices,psi0,phiA.conj(),phiB.conj(),deltaT,L,substeps)
+    seeds=np.random.SeedSequence(seed)
+    groupStatistics=[RunningStatistics(L+1) for _ in range(groups)]
+    statistics=RunningStatistics(L+1)
+    gapError=np.inf
+    batches=0
+    pool=ProcessPoolExecutor(max_workers=workers) if workers>1 else None
+    try:
+        while statistics.count<maxTrajectories:
+            sizes=[min(batchSize,maxTrajectories-statistics.count-k*batchSize) for k in range(max(workers,1))]
+            sizes=[size for size in sizes if size>0]
+            if pool is None:
+                results=[_trajectoryBatch(*arguments,size,childSeed,denseDimension) for size,childSeed in zip(sizes,seeds.spawn(len(sizes)))]
+            else:
+                results=list(pool.map(_trajectoryBatch,*zip(*[arguments+(size,childSeed,denseDimension) for size,childSeed in zip(sizes,seeds.spawn(len(sizes)))])))
+            for result in results:
+                groupStatistics[batches%groups].merge(result)
+                statistics.merge(result)
+                batches+=1
+            if statistics.count>=minTrajectories and batches>=groups:
+                gapError=jackknifeGapError(statistics,groupStatistics,deltaT,L,N_poles)
+                if gapError<gapTolerance:
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return tlist,statistics,gapError
+
+def jackknifeGapError(statistics:RunningStatistics,groupStatistics:list,deltaT,L,N_poles=4):
+    '''
+    Return the jackknife error of the matrix pencil gap, leaving out one group of trajectories at a time.
+    '''
+    gaps=[]
+    for group in groupStatistics:
+        if group.count==0 or group.count==statistics.count:
+            continue
+        mean=(statistics.count*statistics.mean-group.count*group.mean)/(statistics.count-group.count)
+        gaps.append(matrixPencilGap(mean,deltaT,L,N_poles))
+    if len(gaps)<2:
+        return np.inf
+    gaps=np.array(gaps)
+    return np.sqrt((len(gaps)-1)/len(gaps)*np.sum((gaps-np.mean(gaps))**2))
+
+def trajectorySignal(n,noisyHamiltonian,phiA,phiB,collapseOperators:list,deltaT,L,**kwargs):
+    '''
+    Return tlist and the trajectory average of the signal <2|phi_b><phi_a|>(t). Same arguments as utils.simulateSignal except
+    liouvillian, keyword arguments are passed to trajectoryStatistics.
+    '''
+    tlist,statistics,gapError=trajectoryStatistics(n,noisyHamiltonian,phiA,phiB,collapseOperators,deltaT,L,**kwargs)
+    return tlist,statistics.mean
@@ -1,6 +1,12 @@
 import numpy as np
+import warnings
+import importlib
+from collections import OrderedDict
+from scipy import sparse as sp
 from qutip import (Qobj, about, basis, coherent, coherent_dm, create, destroy, expect, fock, fock_dm, mesolve, qeye, sigmax, sigmay, sigmaz, tensor, thermal_dm)
 from matrix_pencil import mp_est
+from pauli_sum import PauliSum,popcount,parity
+from noise_model import superoperatorToQobj
 
 '''
 Hamiltonian can be represented as weighted summation of Pauli strings and can be stored into python dictionary.
@@ -20,9 +26,125 @@ def localPauliToQobj(localPauli):
         print('Local Pauli to Qobj error.')
         quit(1)
 
+class PauliMatrixCache:
+    '''
+    Bounded LRU cache from Pauli bitmasks (x,z) to the sparse matrix of the Pauli string, and from a set of Pauli terms to the
+    CSR sparsity pattern of their sum.
+
+    A Pauli string has exactly one nonzero per column, P|j>=phase_j|j^x>, so an entry stores the row index and the phase of
+    every column. The least recently used entries are evicted once the stored arrays exceed maxBytes.
+    '''
+    def __init__(self,maxBytes=2**30):
+        self.maxBytes=maxBytes
+        self.currentBytes=0
+        self.hits=0
+        self.misses=0
+        self._entries=OrderedDict()
+
+    def _lookup(self,key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits+=1
+            return self._entries[key][0]
+        self.misses+=1
+        return None
+
+    def _store(self,key,value,nbytes):
+        self._entries[key]=(value,nbytes)
+        self.currentBytes+=nbytes
+        while self.currentBytes>self.maxBytes and len(self._entries)>1:
+            self.currentBytes-=self._entries.popitem(last=False)[1][1]
+        return value
+
+    def get(self,x,z,n):
+        '''
+        Return (rows, phases) of the Pauli string with bitmasks (x,z) on n qubits.
+        '''
+        key=(int(x),int(z),n)
+        entry=self._lookup(key)
+        if entry is not None:
+            return entry
+
+        columns=np.arange(2**n,dtype=np.uint64)
+        rows=(columns^np.uint64(x)).astype(np.int64)
+        phases=np.array([1,1.j,-1,-1.j])[popcount(np.uint64(x)&np.uint64(z))%4]*(1-2*parity(columns&np.uint64(z)))
+        return self._store(key,(rows,phases),rows.nbytes+phases.nbytes)
+
+    def pattern(self,xMasks,zMasks,n):
+        '''
+        Return the CSR pattern of sum_t c_t P_t for the Pauli terms with bitmasks (xMasks,zMasks) on n qubits.
+
+        Return
+        ----------
+        indptr, indices: CSR index arrays with sorted column indices.
+        groups: list of (positions, terms, phases), one per distinct X mask. The terms with that mask fill one permuted diagonal,
+            so the CSR data of column j is data[positions[j]] = coefficients[terms] @ phases[:,j].
+        '''
+        xMasks=np.asarray(xMasks,dtype=np.uint64)
+        zMasks=np.asarray(zMasks,dtype=np.uint64)
+        key=('pattern',n,xMasks.tobytes(),zMasks.tobytes())
+        entry=self._lookup(key)
+        if entry is not None:
+            return entry
+
+        columns=np.arange(2**n,dtype=np.uint64)
+        uniqueX,termGroups=np.unique(xMasks,return_inverse=True)
+        rows=np.concatenate([columns^x for x in uniqueX]).astype(np.int64)
+        # label the entries of the permuted diagonals to find where the CSR conversion puts them
+        labels=sp.csr_matrix((np.arange(1,len(rows)+1,dtype=float),(rows,np.tile(columns.astype(np.int64),len(uniqueX)))),shape=(2**n,2**n))
+        labels.sort_indices()
+        positions=np.empty(len(rows),dtype=np.int64)
+        positions[labels.data.astype(np.int64)-1]=np.arange(len(rows))
+        yPhases=np.array([1,1.j,-1,-1.j])[popcount(xMasks&zMasks)%4]
+        groups=[]
+        for u in range(len(uniqueX)):
+            terms=np.flatnonzero(termGroups==u)
+            phases=yPhases[terms,None]*(1-2*parity(columns[None,:]&zMasks[terms,None]))
+            groups.append((positions[u*2**n:(u+1)*2**n],terms,phases))
+        nbytes=labels.indptr.nbytes+labels.indices.nbytes+sum(p.nbytes+t.nbytes+ph.nbytes for p,t,ph in groups)
+        return self._store(key,(labels.indptr,labels.indices,groups),nbytes)
+
+    def matrix(self,x,z,n):
+        '''
+        Return the Pauli string with bitmasks (x,z) as a scipy CSR matrix.
+        '''
+        rows,phases=self.get(x,z,n)
+        return sp.csr_matrix((phases,(rows,np.arange(2**n))),shape=(2**n,2**n))
+
+    def clear(self):
+        self._entries.clear()
+        self.currentBytes=0
+
+pauliMatrixCache=PauliMatrixCache()
+
+def sparseHamiltonian(hamiltonian,n=None):
+    '''
+    Return the Hamiltonian as a scipy CSR matrix.
+
+    The CSR pattern of the term set comes from pauliMatrixCache.pattern, so a Hamiltonian which only differs from an earlier
+    one by its coefficients (pauliTransform signs, rescaling, systematic error strength) only fills the data array, without
+    a COO to CSR conversion.
+
+    Parameters
+    ---------
+    hamiltonian: `dict` or `PauliSum`.
+    n: # of qubits, read from the Pauli strings if not given.
+    '''
+    if not isinstance(hamiltonian,PauliSum):
+        hamiltonian=PauliSum.fromDict(hamiltonian,n)
+    n=hamiltonian.n
+    if len(hamiltonian.coefficients)==0:
+        return sp.csr_matrix((2**n,2**n),dtype=complex)
+    indptr,indices,groups=pauliMatrixCache.pattern(hamiltonian.xMasks,hamiltonian.zMasks,n)
+    data=np.zeros(len(indices),dtype=complex)
+    for positions,terms,phases in groups:
+        data[positions]=hamiltonian.coefficients[terms]@phases
+    return sp.csr_matrix((data,indices.copy(),indptr.copy()),shape=(2**n,2**n))
+
 def qutipHamiltonian(hamiltonian:dict):
     '''
     Return the Hamiltonian which can be passed into qutip's mesolve function.
+    The sparse matrix is assembled by sparseHamiltonian from the cached sparsity pattern of the Pauli terms.
 
     Parameters
     ---------
@@ -32,28 +154,10 @@ def qutipHamiltonian(hamiltonian:dict):
     ---------
     `Qobj` of correspond Hamiltonian.
     '''
-    ham=0
-
-    def pauliToQobj(pauliString):
-        n=len(pauliString)
-        qobjResult=localPauliToQobj(pauliString[0])
-        
-        for i in range(n-1):
-            qobjResult=tensor(qobjResult,localPauliToQobj(pauliString[i+1]))
-        
-        return qobjResult
-
-    for key in hamiltonian.keys():
-        ham+=hamiltonian[key]*pauliToQobj(key)
-
-    return ham
-
-def inttobin(number,n):
-    '''
-    Return length n binary string.
-    '''
-    form='0'+str(n)+'b'
-    return format(number,form)
+    if len(hamiltonian)==0:
+        return 0
+    n=len(next(iter(hamiltonian)))
+    return Qobj(sparseHamiltonian(hamiltonian,n),dims=[[2]*n,[2]*n])
 
 def loadState(quantumState,n)->Qobj:
     '''
@@ -63,19 +167,168 @@ def loadState(quantumState,n)->Qobj:
     n: number of qubits.
     ----------
     Return the quantum state in qutip.
+    The amplitude array is wrapped as a ket with dims [[2]*n,[1]*n]; the basis ordering i=2**(n-1)*i_0+... is the ordering of
+    tensor(basis(2,i_0),basis(2,i_1),...), so no per-basis-state work is needed.
+    This is not zero-copy: a qutip 4 `Qobj` always stores its data as a CSR matrix, so the amplitudes are copied once
+    (O(2**n)) into that format.
     '''
-    qutipState=0
+    return Qobj(np.asarray(quantumState,dtype=complex).reshape(2**n,1),dims=[[2]*n,[1]*n])
 
-    for i in range(2**n):
-        bitstring=inttobin(i,n)
-        qutipBasis=basis(2,int(bitstring[0]))
-        for j in range(1,n):
-            qutipBasis=tensor(qutipBasis,basis(2,int(bitstring[j])))
-        qutipState+=quantumState[i]*qutipBasis
+def loadStates(quantumStates,n)->list:
+    '''
+    Load many quantum states in qutip at once, e.g. the initial states of all Pauli frames of one pair (a,b).
+    ----------
+    quantumStates: (M,2**n) numpy array, one state per row.
+    n: number of qubits.
+    ----------
+    Return a list of M kets with dims [[2]*n,[1]*n], as loadState. All states are converted to CSR in one call and every ket
+    takes its column, so the conversion is not repeated per state (or per gamma, if the list is reused over a sweep).
+    '''
+    quantumStates=np.asarray(quantumStates,dtype=complex).reshape(-1,2**n)
+    columns=sp.csc_matrix(quantumStates.T)
+    dims=[[2]*n,[1]*n]
+    return [Qobj(columns[:,m],dims=dims) for m in range(quantumStates.shape[0])]
 
-    return Qobj(qutipState)
+def rankOneExpectation(phiA,phiB,coefficient=2):
+    '''
+    Return the expectation value of the rank-1 observable coefficient*|phi_b><phi_a| as an e_ops callback for mesolve.
+
+    Tr(coefficient*|phi_b><phi_a|rho) = coefficient*<phi_a|rho|phi_b> is a single bra-matrix-ket contraction, so neither the
+    dense outer product nor its superoperator spre(O) with d^3 nonzeros, which mesolve builds for a `Qobj` e_op, is formed.
+
+    Parameters
+    ----------
+    phiA: |\phi_a>
+    phiB: |\phi_b>
+    coefficient: prefactor of the observable.
+    '''
+    bra=np.asarray(phiA,dtype=complex).reshape(-1).conj()
+    ket=np.asarray(phiB,dtype=complex).reshape(-1)
+    def expectation(t,rho):
+        return coefficient*(bra@(rho.data@ket))
+    return expectation
+
+def eigenbasisIndex(eigenstates,state,atol=1e-8):
+    '''
+    Return the index k and the amplitude <phi_k|state> of the basis state (eigenstates[k], a row) which state is up to a phase.
+    Raise ValueError if state is not a single basis state.
+    '''
+    amplitudes=np.asarray(eigenstates).conj()@np.asarray(state,dtype=complex).reshape(-1)
+    k=int(np.argmax(np.abs(amplitudes)))
+    if np.abs(np.abs(amplitudes[k])-1)>atol or np.linalg.norm(amplitudes)-np.abs(amplitudes[k])>atol:
+        raise ValueError("The eigenbasis mode needs phiA and phiB to be states of the eigenbasis.")
+    return k,amplitudes[k]
 
-def noisyEigenData(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,options,deltaT,L,N_poles=4):
+def eigenbasisMesolve(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,options,tlist,eigenstates):
+    '''
+    Return the mesolve signal 2<phi_a|rho|phi_b>(t), solved in the basis of eigenstates (rows, e.g. of eigenSolver), in which
+    |phi_a> and |phi_b> are basis vectors and the signal is the single entry 2 rho[a,b].
+
+    The Hamiltonian and the collapse operators are rotated to W O W^dagger with W the rows eigenstates^*, which is dense, so
+    this is meant for the small n of the mesolve reference; the rotation makes the expectation value O(1) per time step.
+    '''
+    a,amplitudeA=eigenbasisIndex(eigenstates,phiA)
+    b,amplitudeB=eigenbasisIndex(eigenstates,phiB)
+    W=np.asarray(eigenstates,dtype=complex).conj()
+    dims=[[2]*n,[2]*n]
+    def rotate(operator):
+        return Qobj(W@(operator.data@W.conj().T),dims=dims)
+    initState=np.zeros(2**n,dtype=complex)
+    initState[a]+=amplitudeA/np.sqrt(2)
+    initState[b]+=amplitudeB/np.sqrt(2)
+    coefficient=2*np.conj(amplitudeA)*amplitudeB
+    def expectation(t,rho):
+        return coefficient*rho.data[a,b]
+    result=mesolve(rotate(qutipHamiltonian(noisyHamiltonian)),loadState(initState,n),tlist,[rotate(C) for C in collapseOperators],[expectation],options=options,progress_bar=None)
+    return result.expect[0]
+
+# solver name -> (module, signal function) of the backends shipped in this directory. A backend module is only imported
+# when its solver is used.
+SIGNAL_SOLVERS={
+    'propagator':('propagator','propagatorSignal'),
+    'spectral':('spectral','spectralSignal'),
+    'interaction':('interaction_picture','interactionSignal'),
+    'ptm':('pauli_transfer','ptmSignal'),
+    'matrixfree':('matrix_free','matrixFreeSignal'),
+    'trajectories':('trajectories','trajectorySignal'),
+    'mpdo':('mpdo','mpdoSignal'),
+    'lowrank':('low_rank','lowRankSignal'),
+    'symmetry':('symmetry','sectorSignal'),
+}
+
+# solvers which accept a precomputed Lindbladian; the other backends build their own representation of the dynamics
+LIOUVILLIAN_SOLVERS=('mesolve','propagator','spectral')
+
+def signalSolver(solver):
+    '''
+    Return the signal function of a solver of SIGNAL_SOLVERS, importing its module on first use.
+    '''
+    moduleName,functionName=SIGNAL_SOLVERS[solver]
+    return getattr(importlib.import_module(moduleName),functionName)
+
+def simulateSignal(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,options,deltaT,L,solver='mesolve',liouvillian=None,solverOptions=None,initState=None):
+    '''
+    Return tlist and the signal <2|phi_b><phi_a|>(t) of the noisy protocol started from (|phi_a>+|phi_b>)/sqrt(2).
+
+    Parameters
+    ----------
+    n: # of qubits
+    noisyHamiltonian: Hamiltonian with systematic error.
+    phiA: |\phi_a>
+    phiB: |\phi_b>
+    collapseOperators: a list which describe the collapse operators and each operator is in `Qobj` form.
+    options: qutip.solver.Option()
+    deltaT: deltaT.
+    L: The signal is sampled at t=k dT, k=0,1,...,L.
+    solver: 'mesolve' for the adaptive ODE solver of qutip (uses options), or one of SIGNAL_SOLVERS, i.e. the backends below
+        whose module is shipped in this directory:
+        'propagator' to step with exp(L dT) on the uniform grid (see propagator.py),
+        'spectral' to evaluate the signal in closed form from the Lindbladian spectrum (see spectral.py).
+        'interaction' to integrate only the dissipator in the interaction picture of the noisy Hamiltonian (see interaction_picture.py).
+        'ptm' to propagate the real Pauli-basis vector of rho with the Pauli transfer matrix (see pauli_transfer.py).
+        'matrixfree' to integrate rho without building any superoperator, for larger n (see matrix_free.py).
+        'trajectories' to average Monte Carlo wavefunction trajectories until the gap error is small enough (see trajectories.py).
+        'mpdo' to evolve a matrix product density operator with TEBD, for nearest-neighbour models (see mpdo.py).
+        'lowrank' to evolve a rank-adaptive factorization rho = U S U^dagger, for weak noise (see low_rank.py).
+        'symmetry' to propagate only the symmetry-sector blocks of rho which reach the signal (see symmetry.py).
+    liouvillian: precomputed sparse Lindbladian, e.g. noise_model.ParametricLiouvillian.at(s). If given, it is used in place of
+        noisyHamiltonian and collapseOperators. Only the solvers in LIOUVILLIAN_SOLVERS accept it, the others raise ValueError.
+    solverOptions: `dict` of keyword arguments passed to the signal function of the solver, e.g. {'workers':4,'gapTolerance':1e-2}
+        for 'trajectories' (see trajectories.trajectoryStatistics) or {'maxBond':32,'stepsPerDeltaT':8} for 'mpdo'.
+        mesolve only takes {'eigenbasis':eigenstates} (rows, e.g. of eigenSolver) to solve in the basis where phiA and phiB are
+        basis vectors, see eigenbasisMesolve.
+    initState: the ket (|phi_a>+|phi_b>)/sqrt(2) as a `Qobj`, e.g. from loadStates, for mesolve. Built by loadState if None.
+    '''
+    if solver!='mesolve' and solver not in SIGNAL_SOLVERS:
+        raise ValueError("Unknown solver "+str(solver)+", expected 'mesolve' or one of "+str(list(SIGNAL_SOLVERS.keys()))+".")
+    if liouvillian is not None and solver not in LIOUVILLIAN_SOLVERS:
+        raise ValueError("The "+str(solver)+" solver needs the Hamiltonian and the collapse operators, a precomputed Lindbladian is only supported by "+str(list(LIOUVILLIAN_SOLVERS))+".")
+    solverOptions={} if solverOptions is None else dict(solverOptions)
+    if solver in SIGNAL_SOLVERS:
+        if solver in LIOUVILLIAN_SOLVERS:
+            solverOptions['liouvillian']=liouvillian
+        return signalSolver(solver)(n,noisyHamiltonian,phiA,phiB,collapseOperators,deltaT,L,**solverOptions)
+    eigenbasis=solverOptions.pop('eigenbasis',None)
+    if len(solverOptions)>0:
+        raise ValueError("The mesolve solver is configured by options, solverOptions other than 'eigenbasis' are only passed to the SIGNAL_SOLVERS.")
+    if eigenbasis is not None:
+        if liouvillian is not None:
+            raise ValueError("The eigenbasis mode needs the Hamiltonian and the collapse operators, not a precomputed Lindbladian.")
+        tlist=np.linspace(0,L*deltaT,L+1)
+        return tlist,eigenbasisMesolve(n,noisyHamiltonian,phiA,phiB,collapseOperators,options,tlist,eigenbasis)
+
+    if initState is None:
+        initState=loadState(1/np.sqrt(2)*(phiA+phiB),n)
+
+    tlist=np.linspace(0,L*deltaT,L+1)
+    if liouvillian is None:
+        result=mesolve(qutipHamiltonian(noisyHamiltonian),initState,tlist,collapseOperators,[rankOneExpectation(phiA,phiB)],options=options,progress_bar=None)
+    else:
+        result=mesolve(superoperatorToQobj(liouvillian,n),initState,tlist,[],[rankOneExpectation(phiA,phiB)],options=options,progress_bar=None)
+
+    return tlist,result.expect[0]
+
+def noisyEigenData(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,options,deltaT,L,N_poles=4,solver='mesolve',liouvillian=None,solverOptions=None):
     '''
     Return the energy gap between phiA and phiB evaluated by the noisy protocol given by numerical simulation.
 
@@ -90,18 +343,29 @@ def noisyEigenData(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,opti
     options: qutip.solver.Option()
     L: The number of data points in the signal. We process the signal <O>(k dT), k=0,1,...,L-1.
     N_poles: The number of maximum possible poles the data can be decomposed into. Choosing this number too small will lead to bad fits so act with care.
+    solver: 'mesolve' or one of SIGNAL_SOLVERS to process the simulated signal (see simulateSignal), or 'shortcut' to skip
+        the signal and return the imaginary part of the dominant Lindbladian eigenvalue near i(E_b-E_a) (see spectral.spectralGap).
+        If spectralGap cannot resolve the dominant mode, the signal is simulated with 'propagator' instead.
+    liouvillian: precomputed Lindbladian, see simulateSignal.
+    solverOptions: keyword arguments of the solver, see simulateSignal. With 'shortcut' they are passed to spectral.spectralGap.
 
     Return
     ----------
-    The energy gap between phiA and phiB.
+    The energy gap between phiA and phiB, a (1,) array for every solver, 'shortcut' included.
     '''
-    initState=loadState(1/np.sqrt(2)*(phiA+phiB),n)
-    measurement=2*loadState(phiB,n)*loadState(phiA,n).dag()
+    if solver=='shortcut':
+        from spectral import spectralGap
+        try:
+            energyGap,eigenvalue=spectralGap(n,noisyHamiltonian,phiA,phiB,collapseOperators,liouvillian=liouvillian,**(solverOptions or {}))
+            energyGaps=np.array([energyGap])
+        except RuntimeError as error:
+            warnings.warn(str(error)+" The gap is estimated from the simulated 'propagator' signal instead.",RuntimeWarning)
+            solver='propagator'
+            solverOptions=None
 
-    tlist=np.linspace(0,L*deltaT,L+1)
-    result=mesolve(qutipHamiltonian(noisyHamiltonian),initState,tlist,collapseOperators,[measurement],options=options)
-
-    energyGaps=mp_est(result.expect[0][0:L],1,N_poles=N_poles)[0]/deltaT
+    if solver!='shortcut':
+        tlist,signal=simulateSignal(n,noisyHamiltonian,phiA,phiB,collapseOperators,options,deltaT,L,solver=solver,solverOptions=solverOptions,liouvillian=liouvillian)
+        energyGaps=mp_est(signal[0:L],1,N_poles=N_poles)[0]/deltaT
 
     return energyGaps
 
@@ -124,7 +388,7 @@ def secondOrderCorrection(omega0,omega1,omega2,c1,c2):
     coefficient=c1*c2/((c2-c1)*(c1-1)*(c2-1))
     return -coefficient*((c1-c2)*omega0+(c2-1)*omega1-(c1-1)*omega2)
 
-def rescalingMitigation(kappa,ham_err_strength,n,hamiltonian:dict,phiA,phiB,collapseOperatorsFunc,hamSysErrorFunc,options,deltaT,L,c_1,c_2,N_poles=4):
+def rescalingMitigation(kappa,ham_err_strength,n,hamiltonian:dict,phiA,phiB,collapseOperatorsFunc,hamSysErrorFunc,options,deltaT,L,c_1,c_2,N_poles=4,solver='mesolve',solverOptions=None):
     '''
     Return noisy result, first order mitigation result and second order mitigation result by Hamiltonian rescaling method.
     
@@ -134,6 +398,7 @@ def rescalingMitigation(kappa,ham_err_strength,n,hamiltonian:dict,phiA,phiB,coll
     c_2: rescaling factor c_2, correspond with H/c_2
     collapseOperatorsFunc: a function which can return the list of collapse operators given kappa.
     hamSysErrorFunc: a function which can return the hamiltonian with system error given hamiltonian, n and hamiltonian error strength.
+    solver: see noisyEigenData.
     other parameters are the same as noisyEigenData.
     The first order result is related to the no rescaling data and c_1 rescaling data.
 
@@ -141,7 +406,7 @@ def rescalingMitigation(kappa,ham_err_strength,n,hamiltonian:dict,phiA,phiB,coll
     ----------
     noisyResult, firstResult, secondResult
     '''
-    noisyResult=noisyEigenData(n,hamSysErrorFunc(hamiltonian,n,ham_err_strength),phiA,phiB,collapseOperatorsFunc(kappa),options=options,deltaT=deltaT,L=L,N_poles=N_poles)
+    noisyResult=noisyEigenData(n,hamSysErrorFunc(hamiltonian,n,ham_err_strength),phiA,phiB,collapseOperatorsFunc(kappa),options=options,deltaT=deltaT,L=L,N_poles=N_poles,solver=solver,solverOptions=solverOptions)
 
     c1rescaledHamiltonian=hamiltonian.copy()
     c2rescaledHamiltonian=hamiltonian.copy()
@@ -152,8 +417,8 @@ def rescalingMitigation(kappa,ham_err_strength,n,hamiltonian:dict,phiA,phiB,coll
     for key in c2rescaledHamiltonian.keys():
         c2rescaledHamiltonian[key]/=c_2
 
-    c1Result=noisyEigenData(n,hamSysErrorFunc(c1rescaledHamiltonian,n,ham_err_strength),phiA,phiB,collapseOperatorsFunc(kappa),options=options,deltaT=c_1*deltaT,L=L,N_poles=N_poles)
-    c2Result=noisyEigenData(n,hamSysErrorFunc(c2rescaledHamiltonian,n,ham_err_strength),phiA,phiB,collapseOperatorsFunc(kappa),options=options,deltaT=c_2*deltaT,L=L,N_poles=N_poles)
+    c1Result=noisyEigenData(n,hamSysErrorFunc(c1rescaledHamiltonian,n,ham_err_strength),phiA,phiB,collapseOperatorsFunc(kappa),options=options,deltaT=c_1*deltaT,L=L,N_poles=N_poles,solver=solver,solverOptions=solverOptions)
+    c2Result=noisyEigenData(n,hamSysErrorFunc(c2rescaledHamiltonian,n,ham_err_strength),phiA,phiB,collapseOperatorsFunc(kappa),options=options,deltaT=c_2*deltaT,L=L,N_poles=N_poles,solver=solver,solverOptions=solverOptions)
 
     print(noisyResult)
     print(c1Result)
@@ -195,12 +460,51 @@ def pauliTransform(hamiltonian:dict,pauliString):
     ----------
     transformed Hamiltonian: `dict`
     '''
-    n=len(pauliString)
-    transformedH=hamiltonian.copy()
+    return PauliSum.fromDict(hamiltonian,len(pauliString)).conjugate(pauliString).toDict()
 
-    for i in range(n):
-        for key in hamiltonian.keys():
-            transformedH[key]*=signLocalPauli(key[i],pauliString[i])
-        
-    return transformedH
+def _upToPhase(matrix,decimals=10):
+    '''
+    Return a hashable form of the matrix which is the same for all e^{i theta} matrix.
+    '''
+    flat=np.asarray(matrix,dtype=complex).reshape(-1)
+    nonzero=np.flatnonzero(np.abs(flat)>10.**(-decimals))
+    if len(nonzero)>0:
+        flat=flat*np.conj(flat[nonzero[0]])/np.abs(flat[nonzero[0]])
+    return tuple(np.round(flat,decimals).tolist())
 
+def pauliFrameSignature(pauliString,errorHamiltonian,localOperator):
+    '''
+    Return a hashable signature of the Pauli frame P of the reshaping method. Frames with the same signature give the same
+    signal, see pauliFrameClasses.
+
+    Conjugating the whole frame by P (rho -> P rho P) maps the transformed Hamiltonian PHP back to H and the transformed states
+    P|phi_a>, P|phi_b> back to |phi_a>, |phi_b>, while the systematic error and the noise, which are not transformed, become
+    P H_err P and P C_i P. So the signal only depends on the commutation signs of the error terms with P and, for every
+    qubit, on the local collapse operator sigma C sigma up to a phase, e.g. only on whether the qubit is X/Y-flipped for the
+    'localSum' and 't1' noise.
+
+    Parameters
+    ----------
+    pauliString: the Pauli string P.
+    errorHamiltonian: systematic error H_err as `dict` or `PauliSum`, e.g. models.localSumZ(n).
+    localOperator: 2x2 collapse operator acting on every qubit, e.g. noise_model.noiseModel(n,'localSum').localOperator.
+    '''
+    n=len(pauliString)
+    if not isinstance(errorHamiltonian,PauliSum):
+        errorHamiltonian=PauliSum.fromDict(errorHamiltonian,n)
+    # the noise on a qubit is labelled by the first local Pauli which conjugates C_local to the same operator
+    conjugated={pauli:_upToPhase(localPauliToQobj(pauli).full()@localOperator@localPauliToQobj(pauli).full()) for pauli in 'IXYZ'}
+    labels={pauli:next(other for other in 'IXYZ' if conjugated[other]==conjugated[pauli]) for pauli in 'IXYZ'}
+    noiseLabel=''.join(labels[pauli] for pauli in pauliString)
+    return tuple(errorHamiltonian.commutationSigns(pauliString).tolist()),noiseLabel
+
+def pauliFrameClasses(pauliStrings:list,errorHamiltonian,localOperator)->dict:
+    '''
+    Return {representative index: [indices of all Pauli strings with its signature]}, with the first string of every class as
+    representative. The signal of every string equals the signal of its representative (the global phase of P cancels between
+    P|phi_a> and P|phi_b>), so only the representatives need to be simulated.
+    '''
+    classes={}
+    for i,pauliString in enumerate(pauliStrings):
+        classes.setdefault(pauliFrameSignature(pauliString,errorHamiltonian,localOperator),[]).append(i)
+    return {members[0]:members for members in classes.values()}
@@ -1,122 +1,124 @@
 import numpy as np
-from qutip import (Qobj, about, basis, coherent, coherent_dm, create, destroy, expect, fock, fock_dm, mesolve, qeye, sigmax, sigmay, sigmaz, tensor, thermal_dm)
+from pauli_sum import PauliSum
+from noise_model import noiseModel
 
-def ringModel(nuz,nux,J,n)->dict:
+def chainSites(n):
     '''
-    Return the qubit ring model Hamiltonian in a dictionary.
+    Return the nearest-neighbour bonds (i,i+1) of an open chain of n sites as a (n-1,2) array.
+    '''
+    return np.array([(i,i+1) for i in range(n-1)],dtype=np.int64).reshape(-1,2)
 
-    H = 0.5 sum (2pi nuz Z_i + 2pi nux X_i) + 0.5 sum 2pi J (X_i X_j + Y_i Y_j)
+def ringSites(n):
     '''
-    hamiltonian={}
-    
-    # 0.5 sum (2pi nuz Z_i + 2pi nux X_i)
-    for i in range(n):
-        if i==0:
-            pauliString='Z'
-            for it in range(n-1):
-                pauliString=pauliString+'I'
-        else:
-            pauliString='I'
-            for it in range(n-1):
-                if it==i-1:
-                    pauliString=pauliString+'Z'
-                else:
-                    pauliString=pauliString+'I'
-        
-        hamiltonian[pauliString]=np.pi*nuz
-    
-    for i in range(n):
-        if i==0:
-            pauliString='X'
-            for it in range(n-1):
-                pauliString=pauliString+'I'
-        else:
-            pauliString='I'
-            for it in range(n-1):
-                if it==i-1:
-                    pauliString=pauliString+'X'
-                else:
-                    pauliString=pauliString+'I'
-        
-        hamiltonian[pauliString]=np.pi*nux
+    Return the nearest-neighbour bonds of a periodic ring of n sites, i.e. the chain bonds and (n-1,0).
+    '''
+    if n<3:
+        return chainSites(n)
+    return np.concatenate([chainSites(n),[(n-1,0)]])
+
+def singleSites(n):
+    '''
+    Return the sites of a chain as a (n,1) array, used for local terms.
+    '''
+    return np.arange(n,dtype=np.int64).reshape(-1,1)
 
-    # 0.5 sum 2pi J (X_i X_j + Y_i Y_j)
-    for i in range(n-1):
-        if i==0:
-            pauliString='X'
-            for it in range(n-1):
-                if it==0:
-                    pauliString=pauliString+'X'
-                else:
-                    pauliString=pauliString+'I'
-        elif i>0 and i<n-2:
-            pauliString='I'
-            for it in range(n-1):
-                if it==i-1 or it==i:
-                    pauliString=pauliString+'X'
-                else:
-                    pauliString=pauliString+'I'
-        else:
-            pauliString='X'
-            for it in range(n-1):
-                if it==n-2:
-                    pauliString=pauliString+'X'
-                else:
-                    pauliString=pauliString+'I'
-        
-        hamiltonian[pauliString]=np.pi*J
+def _patternSites(pattern,sites,n):
+    '''
+    Return the sites of one spec entry as a (m,len(pattern)) array, checked against n qubits.
+    '''
+    sites=np.asarray(sites,dtype=np.int64).reshape(-1,len(pattern))
+    if np.any(sites<0) or np.any(sites>=n):
+        raise ValueError("Sites of pattern "+pattern+" out of range for "+str(n)+" qubits.")
+    if len(pattern)>1 and np.any(np.diff(np.sort(sites,axis=1),axis=1)==0):
+        raise ValueError("Pattern "+pattern+" acts twice on the same site.")
+    return sites
+
+def compileModel(spec:list,n)->PauliSum:
+    '''
+    Compile a model specification into a PauliSum without building any Pauli string.
 
-    for i in range(n-1):
-        if i==0:
-            pauliString='Y'
-            for it in range(n-1):
-                if it==0:
-                    pauliString=pauliString+'Y'
-                else:
-                    pauliString=pauliString+'I'
-        elif i>0 and i<n-2:
-            pauliString='I'
-            for it in range(n-1):
-                if it==i-1 or it==i:
-                    pauliString=pauliString+'Y'
-                else:
-                    pauliString=pauliString+'I'
-        else:
-            pauliString='Y'
-            for it in range(n-1):
-                if it==n-2:
-                    pauliString=pauliString+'Y'
-                else:
-                    pauliString=pauliString+'I'
-        
-        hamiltonian[pauliString]=np.pi*J
+    Parameters
+    ----------
+    spec: list of (pattern, sites, coefficient). pattern is a string of local Paulis such as 'XX', sites is a (m,len(pattern))
+        array of the sites each copy of the pattern acts on, coefficient is a scalar or an array of length m.
+    n: # of qubits (at most 64 for PauliSum; the spec itself has no size limit, see compileModelDict).
+
+    Example
+    ----------
+    >>> compileModel([('XX',chainSites(3),1.0),('Z',singleSites(3),0.5)],3).toDict()
+    {'XXI': 1.0, 'IXX': 1.0, 'ZII': 0.5, 'IZI': 0.5, 'IIZ': 0.5}
+    '''
+    xMasks=[]
+    zMasks=[]
+    coefficients=[]
+    for pattern,sites,coefficient in spec:
+        sites=_patternSites(pattern,sites,n)
+        bits=np.left_shift(np.uint64(1),(n-1-sites).astype(np.uint64))
+        x=np.zeros(len(sites),dtype=np.uint64)
+        z=np.zeros(len(sites),dtype=np.uint64)
+        for p,localPauli in enumerate(pattern):
+            if localPauli in 'XY':
+                x|=bits[:,p]
+            if localPauli in 'YZ':
+                z|=bits[:,p]
+            if localPauli not in 'IXYZ':
+                raise ValueError("Unknown local Pauli '"+localPauli+"' in pattern "+pattern+".")
+        xMasks.append(x)
+        zMasks.append(z)
+        coefficients.append(np.broadcast_to(np.asarray(coefficient),(len(sites),)))
+
+    if len(xMasks)==0:
+        return PauliSum([],[],[],n)
+    return PauliSum(np.concatenate(xMasks),np.concatenate(zMasks),np.concatenate(coefficients),n).simplify()
+
+def compileModelDict(spec:list,n)->dict:
+    '''
+    Compile a model specification into a Pauli dict {pauliString: coefficient} for any n.
 
+    The result equals compileModel(spec,n).toDict() up to the order of the terms (zero terms are kept), but it does not go
+    through the 64-bit masks of PauliSum, so it also serves the tensor network backend (mpdo.py) above 64 qubits.
+    '''
+    hamiltonian={}
+    for pattern,sites,coefficient in spec:
+        sites=_patternSites(pattern,sites,n)
+        for localPauli in pattern:
+            if localPauli not in 'IXYZ':
+                raise ValueError("Unknown local Pauli '"+localPauli+"' in pattern "+pattern+".")
+        coefficients=np.broadcast_to(np.asarray(coefficient),(len(sites),))
+        for row,c in zip(sites,coefficients):
+            key=['I']*n
+            for site,localPauli in zip(row,pattern):
+                key[site]=localPauli
+            key=''.join(key)
+            hamiltonian[key]=hamiltonian.get(key,0)+c.item()
     return hamiltonian
 
-def localSumCollapseList(n:int,phi=np.pi/2):
+def ringModelSpec(nuz,nux,J,n)->list:
     '''
-    Return the list of collapse operators sum_i C_local_i
+    Return the model specification of ringModel, see compileModel.
+
+    The hopping bonds are (0,1),(1,2),...,(n-3,n-2) and (0,n-1), the same bonds as the original string construction of ringModel.
     '''
-    C_local=Qobj(np.array([[1.j*np.sin(phi)+np.cos(phi),0],[0,1]],dtype=complex))
+    if n<2:
+        bonds=chainSites(n)
+    else:
+        bonds=np.concatenate([chainSites(n-1),[(0,n-1)]])
+    return [('Z',singleSites(n),np.pi*nuz),('X',singleSites(n),np.pi*nux),('XX',bonds,np.pi*J),('YY',bonds,np.pi*J)]
 
-    collapseList=[]
+def ringModel(nuz,nux,J,n)->dict:
+    '''
+    Return the qubit ring model Hamiltonian in a dictionary.
 
-    for i in range(n):
-        if i == 0:
-            temp=C_local
-            for j in range(n-1):
-                temp=tensor(temp,qeye(2))
-            collapseList.append(temp)
-        else:
-            temp=qeye(2)
-            for j in range(n-1):
-                if j==i-1:
-                    temp=tensor(temp,C_local)
-                else:
-                    temp=tensor(temp,qeye(2))
-            collapseList.append(temp)
-    
-    return collapseList
+    H = 0.5 sum (2pi nuz Z_i + 2pi nux X_i) + 0.5 sum 2pi J (X_i X_j + Y_i Y_j)
+    '''
+    return compileModel(ringModelSpec(nuz,nux,J,n),n).toDict()
+
+def localSumCollapseList(n:int,phi=np.pi/2):
+    '''
+    Return the list of collapse operators sum_i C_local_i
+    C_local=diag(e^{i phi},1). The operators are built once per (n,phi) by noise_model.noiseModel.
+    '''
+    return noiseModel(n,'localSum',phi).collapseOperators()
 
 
 def errHamLocalSumZ(hamiltonian,n,error_strength):
@@ -134,26 +136,21 @@ def errHamLocalSumZ(hamiltonian,n,error_strength):
     -------
     errHamiltonian
     '''
-    errHamiltonian=hamiltonian.copy()
-    for i in range(n):
-        if i==0:
-            zString='Z'
-            for j in range(n-1):
-                zString+='I'
-        else:
-            zString='I'
-            for j in range(n-1):
-                if j==i-1:
-                    zString+='Z'
-                else:
-                    zString+='I'
-        
-        if zString in errHamiltonian:
-            errHamiltonian[zString]+=error_strength
-        else:
-            errHamiltonian[zString]=error_strength
-    
-    return errHamiltonian
+    errHamiltonian=PauliSum.fromDict(hamiltonian,n)+compileModel([('Z',singleSites(n),error_strength)],n)
+    return errHamiltonian.toDict()
+
+def localSumZ(n,strength=1)->dict:
+    '''
+    Return the systematic error term strength * \sum_j Z_j of errHamLocalSumZ on its own.
+    '''
+    return compileModel([('Z',singleSites(n),strength)],n).toDict()
+
+def transversalXYZIsingModelSpec(a,b,c,d,e,f,n)->list:
+    '''
+    Return the model specification of transversalXYZIsingModel, see compileModel.
+    '''
+    bonds=chainSites(n)
+    return [('XX',bonds,a),('YY',bonds,b),('ZZ',bonds,c),('X',singleSites(n),d),('Y',singleSites(n),e),('Z',singleSites(n),f)]
 
 def transversalXYZIsingModel(a,b,c,d,e,f,n)->dict:
     '''
@@ -161,136 +158,11 @@ def transversalXYZIsingModel(a,b,c,d,e,f,n)->dict:
 
     H = a sum X_i X_{i+1} + b sum Y_i Y_{i+1} + c sum Z_i Z_{i+1} + d sum X_i + e sum Y_i + f sum Z_i
     '''
-    hamiltonian={}
-
-    # a X_i X_{i+1}
-    for i in range(n-1):
-        if i==0:
-            pauliString='X'
-            for it in range(n-1):
-                if it==0:
-                    pauliString=pauliString+'X'
-                else:
-                    pauliString=pauliString+'I'
-        else:
-            pauliString='I'
-            for it in range(n-1):
-                if it==i-1 or it==i:
-                    pauliString=pauliString+'X'
-                else:
-                    pauliString=pauliString+'I'
-        
-        hamiltonian[pauliString]=a
-
-    # b Y_i Y_{i+1}
-    for i in range(n-1):
-        if i==0:
-            pauliString='Y'
-            for it in range(n-1):
-                if it==0:
-                    pauliString=pauliString+'Y'
-                else:
-                    pauliString=pauliString+'I'
-        else:
-            pauliString='I'
-            for it in range(n-1):
-                if it==i-1 or it==i:
-                    pauliString=pauliString+'Y'
-                else:
-                    pauliString=pauliString+'I'
-        
-        hamiltonian[pauliString]=b
-
-    # c Z_i Z_{i+1}
-    for i in range(n-1):
-        if i==0:
-            pauliString='Z'
-            for it in range(n-1):
-                if it==0:
-                    pauliString=pauliString+'Z'
-                else:
-                    pauliString=pauliString+'I'
-        else:
-            pauliString='I'
-            for it in range(n-1):
-                if it==i-1 or it==i:
-                    pauliString=pauliString+'Z'
-                else:
-                    pauliString=pauliString+'I'
-        
-        hamiltonian[pauliString]=c
-    
-    # d X_i
-    for i in range(n):
-        if i==0:
-            pauliString='X'
-            for it in range(n-1):
-                pauliString=pauliString+'I'
-        else:
-            pauliString='I'
-            for it in range(n-1):
-                if it==i-1:
-                    pauliString=pauliString+'X'
-                else:
-                    pauliString=pauliString+'I'
-        
-        hamiltonian[pauliString]=d
-
-    # e Y_i
-    for i in range(n):
-        if i==0:
-            pauliString='Y'
-            for it in range(n-1):
-                pauliString=pauliString+'I'
-        else:
-            pauliString='I'
-            for it in range(n-1):
-                if it==i-1:
-                    pauliString=pauliString+'Y'
-                else:
-                    pauliString=pauliString+'I'
-        
-        hamiltonian[pauliString]=e
-    
-    # f Z_i
-    for i in range(n):
-        if i==0:
-            pauliString='Z'
-            for it in range(n-1):
-                pauliString=pauliString+'I'
-        else:
-            pauliString='I'
-            for it in range(n-1):
-                if it==i-1:
-                    pauliString=pauliString+'Z'
-                else:
-                    pauliString=pauliString+'I'
-        
-        hamiltonian[pauliString]=f
-
-    return hamiltonian
+    return compileModel(transversalXYZIsingModelSpec(a,b,c,d,e,f,n),n).toDict()
 
 def t1LocalJumpList(n:int):
     '''
     Return the list of jump operators sum_i a_i.
+    The operators are built once per n by noise_model.noiseModel.
     '''
-    C_local=Qobj(np.array([[0,1],[0,0]],dtype=complex))
-
-    jumpList=[]
-
-    for i in range(n):
-        if i == 0:
-            temp=C_local
-            for j in range(n-1):
-                temp=tensor(temp,qeye(2))
-            jumpList.append(temp)
-        else:
-            temp=qeye(2)
-            for j in range(n-1):
-                if j==i-1:
-                    temp=tensor(temp,C_local)
-                else:
-                    temp=tensor(temp,qeye(2))
-            jumpList.append(temp)
-    
-    return jumpList
\ No newline at end of file
+    return noiseModel(n,'t1').collapseOperators()
@@ -0,0 +1,236 @@
+import numpy as np
+
+'''
+Bit-packed Pauli sum.
+
+A Pauli string P is stored as two bitmasks (x,z) with P = i^{|x&z|} X^x Z^z, so 'I'=(0,0), 'X'=(1,0), 'Z'=(0,1) and 'Y'=(1,1).
+The kth character of the Pauli string is stored in bit n-1-k, which matches the basis convention of exact_diagonalization.py:
+i=2**(n-1)*i_0+2**(n-2)*i_1+2**(n-3)*i_2+...
+
+Example: 'XZ' -> x=0b10, z=0b01
+'''
+
+_M1=np.uint64(0x5555555555555555)
+_M2=np.uint64(0x3333333333333333)
+_M4=np.uint64(0x0f0f0f0f0f0f0f0f)
+_H01=np.uint64(0x0101010101010101)
+
+def popcount(masks):
+    '''
+    Return the number of set bits of every entry of an integer array (vectorized SWAR popcount).
+    '''
+    v=np.asarray(masks,dtype=np.uint64)
+    v=v-((v>>np.uint64(1))&_M1)
+    v=(v&_M2)+((v>>np.uint64(2))&_M2)
+    v=(v+(v>>np.uint64(4)))&_M4
+    return ((v*_H01)>>np.uint64(56)).astype(np.int64)
+
+def parity(masks):
+    '''
+    Return popcount(masks) mod 2, i.e. 0 for even and 1 for odd number of set bits.
+    '''
+    return popcount(masks)&1
+
+def pauliStringToMasks(pauliString):
+    '''
+    Return the (x,z) bitmasks of a Pauli string.
+
+    Example
+    ----------
+    >>> pauliStringToMasks('XYZI')
+    (12, 6)
+    '''
+    n=len(pauliString)
+    x=0
+    z=0
+    for k in range(n):
+        bit=1<<(n-1-k)
+        if pauliString[k]=='X':
+            x|=bit
+        elif pauliString[k]=='Y':
+            x|=bit
+            z|=bit
+        elif pauliString[k]=='Z':
+            z|=bit
+        elif pauliString[k]!='I':
+            raise ValueError("Unknown local Pauli '"+pauliString[k]+"' in Pauli string "+pauliString+".")
+    return x,z
+
+def masksToPauliString(x,z,n):
+    '''
+    Return the Pauli string of the (x,z) bitmasks.
+    '''
+    x=int(x)
+    z=int(z)
+    pauliString=''
+    for k in range(n):
+        bit=1<<(n-1-k)
+        pauliString+='IZXY'[bool(x&bit)*2+bool(z&bit)]
+    return pauliString
+
+class PauliSum:
+    '''
+    Weighted sum of Pauli strings H = sum_t c_t P_t stored as NumPy arrays of X/Z bitmasks.
+
+    Parameters
+    ----------
+    xMasks, zMasks: integer arrays of the X and Z bitmasks of every term.
+    coefficients: coefficient of every term.
+    n: # of qubits (at most 64).
+
+    Example
+    ----------
+    >>> H=PauliSum.fromDict({'XI':0.5,'ZZ':1.0})
+    >>> H.conjugate('ZI').toDict()
+    {'XI': -0.5, 'ZZ': 1.0}
+    '''
+    # numpy operators defer to PauliSum, so arrays are rejected by __mul__/__truediv__ instead of being broadcast over
+    __array_ufunc__=None
+
+    def __init__(self,xMasks,zMasks,coefficients,n):
+        if n>64:
+            raise ValueError("PauliSum supports at most 64 qubits.")
+        self.n=n
+        self.xMasks=np.asarray(xMasks,dtype=np.uint64).reshape(-1)
+        self.zMasks=np.asarray(zMasks,dtype=np.uint64).reshape(-1)
+        self.coefficients=np.asarray(coefficients).reshape(-1)
+        if not (len(self.xMasks)==len(self.zMasks)==len(self.coefficients)):
+            raise ValueError("xMasks, zMasks and coefficients must have the same length.")
+
+    @classmethod
+    def fromDict(cls,hamiltonian:dict,n=None):
+        '''
+        Return the PauliSum of a Hamiltonian stored in a dictionary, e.g. {'XIIIII':-0.5,'IXIIII':-0.5,...}.
+        The order of the terms is kept.
+        '''
+        if n is None:
+            if len(hamiltonian)==0:
+                raise ValueError("n must be given for an empty Hamiltonian.")
+            n=len(next(iter(hamiltonian)))
+        xMasks=np.zeros(len(hamiltonian),dtype=np.uint64)
+        zMasks=np.zeros(len(hamiltonian),dtype=np.uint64)
+        for t,pauliString in enumerate(hamiltonian.keys()):
+            if len(pauliString)!=n:
+                raise ValueError("Pauli string "+pauliString+" does not act on "+str(n)+" qubits.")
+            xMasks[t],zMasks[t]=pauliStringToMasks(pauliString)
+        return cls(xMasks,zMasks,np.array(list(hamiltonian.values())),n)
+
+    @classmethod
+    def fromPauliStrings(cls,pauliStrings,coefficients=None):
+        '''
+        Return the PauliSum of a list of Pauli strings, with unit coefficients if none are given.
+        '''
+        n=len(pauliStrings[0])
+        if coefficients is None:
+            coefficients=np.ones(len(pauliStrings))
+        masks=np.array([pauliStringToMasks(pauliString) for pauliString in pauliStrings],dtype=np.uint64).reshape(-1,2)
+        return cls(masks[:,0],masks[:,1],coefficients,n)
+
+    def toDict(self)->dict:
+        '''
+        Return the Hamiltonian as a dictionary {pauliString: coefficient}. Duplicated terms are summed.
+        '''
+        hamiltonian={}
+        for x,z,c in zip(self.xMasks,self.zMasks,self.coefficients):
+            pauliString=masksToPauliString(x,z,self.n)
+            if pauliString in hamiltonian:
+                hamiltonian[pauliString]+=c.item()
+            else:
+                hamiltonian[pauliString]=c.item()
+        return hamiltonian
+
+    def pauliStrings(self):
+        '''
+        Return the list of Pauli strings of the terms.
+        '''
+        return [masksToPauliString(x,z,self.n) for x,z in zip(self.xMasks,self.zMasks)]
+
+    def __len__(self):
+        return len(self.coefficients)
+
+    def __repr__(self):
+        return "PauliSum("+repr(self.toDict())+")"
+
+    def copy(self):
+        return PauliSum(self.xMasks.copy(),self.zMasks.copy(),self.coefficients.copy(),self.n)
+
+    def simplify(self,atol=0):
+        '''
+        Return the PauliSum with duplicated Pauli strings merged (in the order of first appearance) and terms with |c|<=atol dropped.
+        '''
+        keys=(self.xMasks.astype(object)<<self.n)|self.zMasks.astype(object) if self.n>32 else (self.xMasks<<np.uint64(self.n))|self.zMasks
+        uniqueKeys,firstIndex,inverse=np.unique(keys,return_index=True,return_inverse=True)
+        order=np.argsort(firstIndex,kind='stable')
+        rank=np.empty_like(order)
+        rank[order]=np.arange(len(order))
+        coefficients=np.zeros(len(uniqueKeys),dtype=np.result_type(self.coefficients,float))
+        np.add.at(coefficients,rank[inverse.reshape(-1)],self.coefficients)
+        keep=np.abs(coefficients)>atol if atol>0 else np.ones(len(coefficients),dtype=bool)
+        first=firstIndex[order]
+        return PauliSum(self.xMasks[first][keep],self.zMasks[first][keep],coefficients[keep],self.n)
+
+    def _checkCompatible(self,other):
+        if not isinstance(other,PauliSum):
+            raise TypeError("Only a PauliSum can be added to a PauliSum.")
+        if other.n!=self.n:
+            raise ValueError("Pauli sums act on different numbers of qubits.")
+
+    def __add__(self,other):
+        self._checkCompatible(other)
+        return PauliSum(np.concatenate([self.xMasks,other.xMasks]),np.concatenate([self.zMasks,other.zMasks]),np.concatenate([self.coefficients,other.coefficients]),self.n).simplify()
+
+    def __sub__(self,other):
+        return self+(-1)*other
+
+    def __mul__(self,scalar):
+        if not np.isscalar(scalar):
+            return NotImplemented
+        return PauliSum(self.xMasks,self.zMasks,self.coefficients*scalar,self.n)
+
+    __rmul__=__mul__
+
+    def __truediv__(self,scalar):
+        if not np.isscalar(scalar):
+            return NotImplemented
+        return PauliSum(self.xMasks,self.zMasks,self.coefficients/scalar,self.n)
+
+    def __neg__(self):
+        return (-1)*self
+
+    def anticommutationMask(self,pauliString):
+        '''
+        Return a boolean array which is True for every term anticommuting with the Pauli string (or (x,z) masks).
+        '''
+        x,z=pauliStringToMasks(pauliString) if isinstance(pauliString,str) else pauliString
+        x=np.uint64(x)
+        z=np.uint64(z)
+        return (parity(self.xMasks&z)^parity(self.zMasks&x)).astype(bool)
+
+    def commutationSigns(self,pauliString):
+        '''
+        Return the sign s_t of P P_t P = s_t P_t for every term.
+        '''
+        return 1-2*self.anticommutationMask(pauliString).astype(np.int64)
+
+    def conjugate(self,pauliString):
+        '''
+        Return P H P. The transformation is determined by a Pauli string P.
+        '''
+        return PauliSum(self.xMasks,self.zMasks,self.coefficients*self.commutationSigns(pauliString),self.n)
+
+    def commutationMatrix(self,other=None):
+        '''
+        Return the boolean matrix C with C[s,t]=True if term s of self commutes with term t of other (default: self).
+        '''
+        if other is None:
+            other=self
+        symplectic=parity(self.xMasks[:,None]&other.zMasks[None,:])^parity(self.zMasks[:,None]&other.xMasks[None,:])
+        return symplectic==0
+
+    def commutesWith(self,other)->bool:
+        '''
+        Return True if every term commutes with a Pauli string, or with every term of another PauliSum.
+        '''
+        if isinstance(other,str):
+            return not np.any(self.anticommutationMask(other))
+        return bool(np.all(self.commutationMatrix(other)))
@@ -1,8 +1,9 @@
 import numpy as np
 from qutip import (Qobj, about, basis, coherent, coherent_dm, create, destroy, expect, fock, fock_dm, mesolve, qeye, sigmax, sigmay, sigmaz, tensor, thermal_dm, Options)
-from utils import loadState,qutipHamiltonian,pauliTransform
-from exact_diagonalization import eigenSolver,stateTransform
-from models import transversalXYZIsingModel,errHamLocalSumZ,t1LocalJumpList
+from utils import pauliTransform,simulateSignal,loadStates,pauliFrameClasses
+from exact_diagonalization import cachedEigenSolver,stateTransformBatch
+from models import transversalXYZIsingModel,localSumZ
+from noise_model import noiseModel
 import time
 
 import csv
@@ -60,7 +61,7 @@ def dataWritingWithHeader(path:str,zippedList):
         csv_writer.writerow(['t','signal','gamma'])
         csv_writer.writerows(zippedList)
 
-def generateNoisySignal(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,options,deltaT,L):
+def generateNoisySignal(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list,options,deltaT,L,solver='mesolve',liouvillian=None,solverOptions=None,initState=None):
     '''
     Generate the noisy signal by numerical simulation.
 
@@ -74,18 +75,16 @@ def generateNoisySignal(n,noisyHamiltonian:dict,phiA,phiB,collapseOperators:list
     deltaT: deltaT.
     options: qutip.solver.Option()
     L: The number of data points in the signal. We process the signal <O>(k dT), k=0,1,...,L-1.
+    solver: 'mesolve' or one of utils.SIGNAL_SOLVERS, see utils.simulateSignal.
+    liouvillian: precomputed Lindbladian, see utils.simulateSignal.
+    solverOptions: keyword arguments of the solver, see utils.simulateSignal.
+    initState: precomputed initial ket for mesolve, see utils.loadStates.
 
     Return
     ----------
     The noisy signal given the initial settings.
     '''
-    initState=loadState(1/np.sqrt(2)*(phiA+phiB),n)
-    measurement=2*loadState(phiB,n)*loadState(phiA,n).dag()
-
-    tlist=np.linspace(0,L*deltaT,L+1)
-    result=mesolve(qutipHamiltonian(noisyHamiltonian),initState,tlist,collapseOperators,[measurement],options=options)
-
-    return tlist,result.expect[0]
+    return simulateSignal(n,noisyHamiltonian,phiA,phiB,collapseOperators,options,deltaT,L,solver=solver,liouvillian=liouvillian,solverOptions=solverOptions,initState=initState)
 
 # Path: noisy_a_b_{PauliString}.csv
 def signalPath(a,b,randomPauli,label):
@@ -98,7 +97,7 @@ Generate data.
 n=6
 hamiltonian=transversalXYZIsingModel(-1.5,0,0,-1,-1,0,n)
 # print(hamiltonian)
-eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+eigenvalues,eigenstates=cachedEigenSolver(hamiltonian,n)
 # print(eigenvalues)
 
 options=Options()
@@ -116,6 +115,20 @@ L=2000
 deltaT0=0.0001
 beta=0.01
 
+# kappa=s and ham_err_strength=beta*s with s=gamma*|deltaE|, so every Lindbladian of the sweep is L0+s*L1.
+# L1 is shared by all Pauli frames and L0 is built once per frame.
+randomSampleNum=2
+idString='I'
+for i in range(n-1):
+    idString+='I'
+pauliStrings=[idString]+randomPauliStrings[0][0:randomSampleNum]
+noise=noiseModel(n,'t1')
+# Frames with the same error signs and X/Y flips give the same signal, so only one representative per class is simulated.
+frameClasses=pauliFrameClasses(pauliStrings,localSumZ(n),noise.localOperator)
+print("Pauli frames:",len(pauliStrings),"classes:",len(frameClasses))
+idLiouvillian=noise.parametricLiouvillian(hamiltonian,localSumZ(n),beta)
+frameLiouvillians={i:idLiouvillian.withHamiltonian(pauliTransform(hamiltonian,pauliStrings[i])) for i in frameClasses}
+
 it=1
 for randomNums in randomStatesList[0:10]:
     print("Iteration ",it)
@@ -126,29 +139,24 @@ for randomNums in randomStatesList[0:10]:
     idealValue=eigenvalues[b]-eigenvalues[a]
     print("Exact diagonalization result:",idealValue)
 
+    # The transformed eigenstates do not depend on gamma, so transform them for all Pauli strings at once.
+    transformedStatesA=stateTransformBatch(eigenstates[a],pauliStrings)
+    transformedStatesB=stateTransformBatch(eigenstates[b],pauliStrings)
+    # the mesolve initial kets (|a>+|b>)/sqrt(2) of all frames, reused for every gamma
+    initialStates=loadStates((transformedStatesA+transformedStatesB)/np.sqrt(2),n)
+
     gammaLabel=0
     for gamma in gammaList:
         
         starttime=time.time()
 
-        noisySignal=generateNoisySignal(n,noisyHamiltonian=errHamLocalSumZ(hamiltonian,n,gamma*beta*np.abs(idealValue)),phiA=eigenstates[a],phiB=eigenstates[b],collapseOperators=[np.sqrt(gamma*np.abs(idealValue))*i for i in t1LocalJumpList(n)],options=options,deltaT=deltaT0,L=L)
-
-        idString='I'
-        for i in range(n-1):
-            idString+='I'
-
-        combined_data=list(zip(noisySignal[0],noisySignal[1],[gamma for j in range(L+1)]))
-        dataWritingWithHeader(signalPath(a,b,idString,gammaLabel),combined_data)
-
-        randomSampleNum=2
-        for i in range(randomSampleNum):
-            print("Iteration ",'(',it,i+1,')',f"gamma={gamma}")
-            randomPauli=randomPauliStrings[0][i]
-            print("Random pauli: ", randomPauli)
-            # print(pauliTransform(hamiltonian,randomPauli))
-            transformedSignal=generateNoisySignal(n,noisyHamiltonian=errHamLocalSumZ(pauliTransform(hamiltonian,randomPauli),n,gamma*beta*np.abs(idealValue)),phiA=stateTransform(eigenstates[a],randomPauli),phiB=stateTransform(eigenstates[b],randomPauli),collapseOperators=[np.sqrt(gamma*np.abs(idealValue))*i for i in t1LocalJumpList(n)],options=options,deltaT=deltaT0,L=L)
+        for representative,members in frameClasses.items():
+            print("Iteration ",'(',it,representative,')',f"gamma={gamma}")
+            print("Pauli frame: ",pauliStrings[representative],"class size:",len(members))
+            transformedSignal=generateNoisySignal(n,noisyHamiltonian=None,phiA=transformedStatesA[representative],phiB=transformedStatesB[representative],collapseOperators=None,options=options,deltaT=deltaT0,L=L,liouvillian=frameLiouvillians[representative].at(gamma*np.abs(idealValue)),initState=initialStates[representative])
             combined_data=list(zip(transformedSignal[0],transformedSignal[1],[gamma for j in range(L+1)]))
-            dataWritingWithHeader(signalPath(a,b,randomPauli,gammaLabel),combined_data)
+            for i in members:
+                dataWritingWithHeader(signalPath(a,b,pauliStrings[i],gammaLabel),combined_data)
             
         endtime=time.time()
         print(f"Total runtime for gamma={gamma}:",endtime-starttime)
@@ -1,13 +1,13 @@
 from matplotlib import pyplot as plt
 import numpy as np
-from exact_diagonalization import eigenSolver
+from exact_diagonalization import cachedEigenSolver
 from models import transversalXYZIsingModel
 import csv
 
 n=6
 hamiltonian=transversalXYZIsingModel(-1.5,0,0,-1,-1,0,n)
 # print(hamiltonian)
-eigenvalues,eigenstates=eigenSolver(hamiltonian,n)
+eigenvalues,eigenstates=cachedEigenSolver(hamiltonian,n)
 
 '''
 Load random numbers.